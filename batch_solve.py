@@ -0,0 +1,190 @@
+"""Streaming batch solver: scrambles in, solutions out, over a process pool.
+
+Reads one scramble per line from a file or stdin and writes one JSON result
+per line, in input order:
+
+    R U R' U' F2            move notation, applied to a solved cube
+    UUUUUUUUURRR...         54-character URFDLB facelet string
+    {"id": 7, "scramble": "R U R'"}        JSONL, with an optional id
+    {"id": 8, "facelets": "UUUU..."}
+
+    {"index": 0, "input": "R U R' U' F2", "solution": "F2 U R U' R'", "length": 5, "seconds": 0.004}
+    {"index": 1, "input": "UUUX...", "error": "Expected 54 characters ..."}
+
+Lines are sent to the workers in chunks, and at most ``in_flight`` chunks
+are outstanding at any time, so memory stays constant however long the
+input is. A bad line produces an error record instead of stopping the run.
+The solver tables are mapped from the on-disk cache (see table_cache), so
+every worker shares one copy. Each worker keeps a solution_cache, so a
+scramble repeated in the input, or equal to another up to symmetry, is
+searched once per worker.
+
+    python batch_solve.py scrambles.txt -o solutions.jsonl --processes 8
+"""
+import collections
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import cube_state
+import two_phase
+from solution_cache import SolutionCache
+
+
+def parse_scramble(line: str) -> Tuple[Optional[object], np.ndarray]:
+    """(id, facelet state) for one input line; raises ValueError if it is malformed"""
+    line = line.strip()
+    item_id = None
+    if line.startswith('{'):
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}") from None
+        item_id = record.get('id')
+        if 'facelets' in record:
+            return item_id, cube_state.from_facelet_string(record['facelets'])
+        if 'scramble' in record:
+            line = record['scramble']
+        else:
+            raise ValueError("JSON input needs a 'scramble' or 'facelets' field")
+    if len(line) == 54 and ' ' not in line:
+        return item_id, cube_state.from_facelet_string(line)
+    return item_id, cube_state.apply_moves(cube_state.solved_state(), cube_state.parse_moves(line))
+
+
+# Solve settings, set once per worker process
+_MAX_LENGTH = 21
+_TIMEOUT: Optional[float] = None
+# Per-process cache, so repeated and symmetric scrambles are solved once per worker
+_CACHE: Optional[SolutionCache] = None
+
+
+def _init_worker(max_length: int, timeout: Optional[float]):
+    global _MAX_LENGTH, _TIMEOUT, _CACHE
+    _MAX_LENGTH, _TIMEOUT = max_length, timeout
+    _CACHE = SolutionCache(solver=two_phase.get_solver().solve)
+
+
+def _solve_chunk(chunk: List[Tuple[int, str]]) -> List[Dict]:
+    """Solve (index, line) pairs, turning any failure into an error record"""
+    results = []
+    for index, line in chunk:
+        result = {'index': index}
+        start = time.perf_counter()
+        try:
+            item_id, state = parse_scramble(line)
+            if item_id is not None:
+                result['id'] = item_id
+            result['input'] = line.strip()
+            moves = _CACHE.solve(state, _MAX_LENGTH, _TIMEOUT)
+            result['solution'] = cube_state.format_moves(moves)
+            result['length'] = len(moves)
+        except Exception as e:
+            result['input'] = line.strip()
+            result['error'] = str(e) or type(e).__name__
+        result['seconds'] = round(time.perf_counter() - start, 6)
+        results.append(result)
+    return results
+
+
+class Throughput:
+    """Running totals for a batch run"""
+    def __init__(self, processes: int):
+        self.processes = processes
+        self.solved = 0
+        self.errors = 0
+        self.start = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add(self, result: Dict):
+        if 'error' in result:
+            self.errors += 1
+        else:
+            self.solved += 1
+        self.elapsed = time.perf_counter() - self.start
+
+    @property
+    def per_second(self) -> float:
+        return self.solved / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.solved} solved, {self.errors} errors in {self.elapsed:.1f} s: "
+                f"{self.per_second:.1f} solves/s, {self.per_second / self.processes:.1f} solves/s per core "
+                f"({self.processes} processes)")
+
+
+def solve_stream(lines: Iterable[str], processes: Optional[int] = None, max_length: int = 21,
+                 timeout: Optional[float] = None, chunk_size: int = 8, in_flight: Optional[int] = None,
+                 stats: Optional[Throughput] = None) -> Iterator[Dict]:
+    """Solve every non-blank line of ``lines``, yielding result dicts in input order
+
+    ``processes=1`` solves in this process. Otherwise at most ``in_flight``
+    chunks of ``chunk_size`` lines (default: four per worker) are queued at
+    once, and ``lines`` is only read as fast as results are consumed.
+    """
+    processes = processes or os.cpu_count() or 1
+    stats = stats if stats is not None else Throughput(processes)
+    numbered = ((i, line) for i, line in enumerate(line for line in lines if line.strip()))
+    chunks = iter(lambda: list(itertools.islice(numbered, chunk_size)), [])
+    # Build or map the tables once here, so workers never race to generate them
+    two_phase.load_tables()
+
+    if processes == 1:
+        _init_worker(max_length, timeout)
+        for chunk in chunks:
+            for result in _solve_chunk(chunk):
+                stats.add(result)
+                yield result
+        return
+
+    in_flight = in_flight or 4 * processes
+    with multiprocessing.Pool(processes, _init_worker, (max_length, timeout)) as pool:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(_solve_chunk, (chunk,)))
+            if len(pending) >= in_flight:
+                for result in pending.popleft().get():
+                    stats.add(result)
+                    yield result
+        while pending:
+            for result in pending.popleft().get():
+                stats.add(result)
+                yield result
+
+
+def main(argv: Optional[List[str]] = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Solve a stream of scrambles (one per line) in parallel")
+    parser.add_argument('input', nargs='?', default='-', help="text or JSONL file, '-' for stdin (default)")
+    parser.add_argument('-o', '--output', default='-', help="JSONL output file, '-' for stdout (default)")
+    parser.add_argument('--processes', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--max-length', type=int, default=21, help="stop at a solution this short (default: 21)")
+    parser.add_argument('--timeout', type=float, default=None, help="seconds per solve before settling for the best")
+    parser.add_argument('--chunk-size', type=int, default=8, help="lines per task sent to a worker (default: 8)")
+    parser.add_argument('--in-flight', type=int, default=None, help="max queued chunks (default: 4 per worker)")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == '-' else open(args.input)
+    sink = sys.stdout if args.output == '-' else open(args.output, 'w')
+    stats = Throughput(args.processes or os.cpu_count() or 1)
+    try:
+        for result in solve_stream(source, args.processes, args.max_length, args.timeout, args.chunk_size,
+                                   args.in_flight, stats):
+            sink.write(json.dumps(result) + '\n')
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    print(stats.summary(), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+"""Reproducible performance benchmarks, saved as JSON for comparing commits.
+
+    python benchmark.py -o before.json
+    ... change something ...
+    python benchmark.py -o after.json --compare before.json
+
+Benchmarks (all inputs come from fixed seeds):
+
+    move_latency      one CubeState.apply_move / RubiksCube.rotate_face
+    replay            a 10**6-move log through cube_state.apply_moves
+    batch_move        one move on a CubeBatch of 10**6 cubes
+    scramble          20-move scrambles per second
+    frame             draw time per frame in an offscreen software GL context
+    solver            two-phase latency percentiles over a seeded corpus
+    optimal           IDA* nodes per second on seeded 16-move scrambles
+
+Each result has a ``primary`` metric (lower is better) that --compare uses.
+The frame benchmark creates its context with SDL's offscreen video driver
+and EGL, so it runs on headless Linux; it is recorded as skipped where no
+GL context can be created. Select a subset with ``--only replay,solver``.
+"""
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+import cube_state
+
+SEED = 2024
+
+
+def _per_call(fn: Callable[[], object], number: int, repeat: int = 5) -> List[float]:
+    """Seconds per call of ``fn`` for each of ``repeat`` runs of ``number`` calls"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    return times
+
+
+def _stats(samples: List[float], scale: float = 1.0) -> Dict[str, float]:
+    samples = sorted(s * scale for s in samples)
+    return {
+        'min': samples[0],
+        'median': statistics.median(samples),
+        'p90': float(np.percentile(samples, 90)),
+        'p99': float(np.percentile(samples, 99)),
+        'max': samples[-1],
+    }
+
+
+def bench_move_latency() -> Dict:
+    from rubiks_cube import RubiksCube
+
+    state = cube_state.CubeState()
+    moves = iter(random.Random(SEED).choices(range(18), k=500000))
+    apply_move = state.apply_move
+    raw = _per_call(lambda: apply_move(next(moves)), 100000)
+    cube = RubiksCube()
+    rotate = _per_call(lambda: cube.rotate_face('R'), 100000)
+    return {
+        'unit': 'ns',
+        'apply_move': _stats(raw, 1e9),
+        'rotate_face': _stats(rotate, 1e9),
+        'primary': statistics.median(raw) * 1e9,
+    }
+
+
+def bench_replay(n: int = 10 ** 6) -> Dict:
+    moves = np.random.default_rng(SEED).integers(0, 18, n)
+    state = cube_state.solved_state()
+    times = _per_call(lambda: cube_state.apply_moves(state, moves), 1, repeat=3)
+    best = min(times)
+    return {'unit': 's', 'moves': n, 'seconds': _stats(times), 'moves_per_second': n / best, 'primary': best}
+
+
+def bench_batch_move(n: int = 10 ** 6) -> Dict:
+    from cube_batch import CubeBatch
+
+    batch = CubeBatch.solved(n)
+    times = _per_call(lambda: batch.apply(0), 1, repeat=5)
+    best = min(times)
+    return {'unit': 's', 'cubes': n, 'seconds': _stats(times), 'cubes_per_second': n / best, 'primary': best}
+
+
+def bench_scramble(number: int = 20000) -> Dict:
+    rng = random.Random(SEED)
+    state = cube_state.CubeState()
+    times = _per_call(lambda: state.scramble(20, rng), number)
+    best = min(times)
+    return {'unit': 'us', 'per_scramble': _stats(times, 1e6), 'scrambles_per_second': 1 / best,
+            'primary': best * 1e6}
+
+
+def bench_frame(frames: int = 200) -> Dict:
+    """Offscreen draw time; must run before anything else imports pygame or OpenGL"""
+    os.environ.setdefault('SDL_VIDEODRIVER', 'offscreen')
+    os.environ.setdefault('PYOPENGL_PLATFORM', 'egl')
+    import rubiks_cube
+    renderer = rubiks_cube._renderer()
+    try:
+        renderer.init_pygame_and_gl()
+    except SystemExit:
+        return {'skipped': 'no OpenGL context available'}
+    from OpenGL.GL import GL_RENDERER, glFinish, glGetString
+
+    cube = rubiks_cube.RubiksCube()
+    cube.scramble(20, random.Random(SEED))
+
+    def frame(turn=None):
+        renderer.begin_frame(20, -45)
+        cube.draw(turn)
+        glFinish()
+
+    frame()
+    static = [_per_call(frame, 1, 1)[0] for _ in range(frames)]
+    turning = [_per_call(lambda: frame((1, -30.0)), 1, 1)[0] for _ in range(frames)]
+    moves = iter(random.Random(SEED).choices(range(18), k=frames))
+
+    def after_move():
+        cube.apply_move(next(moves))
+        frame()
+    moved = [_per_call(after_move, 1, 1)[0] for _ in range(frames)]
+    return {
+        'unit': 'ms',
+        'renderer': glGetString(GL_RENDERER).decode(),
+        'static': _stats(static, 1e3),
+        'turning_layer': _stats(turning, 1e3),
+        'after_move': _stats(moved, 1e3),
+        'primary': statistics.median(static) * 1e3,
+    }
+
+
+def bench_solver(count: int = 50, max_length: int = 21) -> Dict:
+    import two_phase
+
+    start = time.perf_counter()
+    solver = two_phase.TwoPhaseSolver()
+    load = time.perf_counter() - start
+    rng = random.Random(SEED)
+    corpus = []
+    for _ in range(count):
+        state = cube_state.CubeState()
+        state.scramble(30, rng)
+        corpus.append(state.facelets)
+    times, lengths = [], []
+    for facelets in corpus:
+        start = time.perf_counter()
+        lengths.append(len(solver.solve(facelets, max_length)))
+        times.append(time.perf_counter() - start)
+    return {
+        'unit': 'ms',
+        'scrambles': count,
+        'max_length': max_length,
+        'table_load_ms': load * 1e3,
+        'solve': _stats(times, 1e3),
+        'mean_length': statistics.mean(lengths),
+        'primary': statistics.median(times) * 1e3,
+    }
+
+
+def bench_optimal(count: int = 3, length: int = 16) -> Dict:
+    import optimal_solver
+
+    start = time.perf_counter()
+    solver = optimal_solver.OptimalSolver()
+    load = time.perf_counter() - start
+    rng = random.Random(SEED)
+    nodes, seconds, lengths = 0, 0.0, []
+    for _ in range(count):
+        state = cube_state.apply_moves(cube_state.solved_state(), cube_state.scramble_moves(length, rng))
+        lengths.append(len(solver.solve(state)))
+        nodes += solver.stats['nodes']
+        seconds += solver.stats['seconds']
+    return {
+        'unit': 'ns/node',
+        'scrambles': count,
+        'table_load_ms': load * 1e3,
+        'lengths': lengths,
+        'nodes': nodes,
+        'seconds': seconds,
+        'nodes_per_second': nodes / seconds,
+        'primary': seconds / nodes * 1e9,
+    }
+
+
+# frame goes first: it sets SDL/PyOpenGL environment variables that only
+# take effect before pygame and OpenGL are imported
+BENCHMARKS = {
+    'frame': bench_frame,
+    'move_latency': bench_move_latency,
+    'replay': bench_replay,
+    'batch_move': bench_batch_move,
+    'scramble': bench_scramble,
+    'solver': bench_solver,
+    'optimal': bench_optimal,
+}
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def run(names: Optional[List[str]] = None) -> Dict:
+    results = {}
+    for name, bench in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        print(f"{name}...", file=sys.stderr, flush=True)
+        results[name] = bench()
+    return {'environment': environment(), 'results': results}
+
+
+def compare(current: Dict, baseline: Dict) -> List[str]:
+    """One line per benchmark present in both: primary metric and change"""
+    lines = []
+    for name, result in current['results'].items():
+        old = baseline.get('results', {}).get(name, {})
+        if 'primary' not in result or 'primary' not in old:
+            continue
+        change = result['primary'] / old['primary'] - 1 if old['primary'] else 0.0
+        lines.append(f"{name:14} {old['primary']:12.4g} -> {result['primary']:12.4g} {result['unit']:3} "
+                     f"({change:+.1%})")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the performance benchmarks")
+    parser.add_argument('-o', '--output', default='-', help="JSON results file, '-' for stdout (default)")
+    parser.add_argument('--only', help=f"comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    names = args.only.split(',') if args.only else None
+    unknown = set(names or ()) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    report = run(names)
+    text = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print('\n'.join(compare(report, baseline)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Timed turn animation with a non-blocking move queue.
+
+Moves are pushed onto a queue and played one at a time, each as a turn of
+its layer over ``turn_time`` seconds of wall-clock time, independent of the
+frame rate. The cube's facelets are updated when a turn finishes, so the
+renderer draws the old state with the turning layer rotated by
+``current_turn()``.
+
+Pushing never blocks, and the queue keeps the frame loop responsive however
+many moves arrive:
+
+* consecutive turns of the same face merge as they are queued
+  (R R -> R2, R R' -> nothing)
+* turns get shorter as the backlog grows
+* beyond ``instant_backlog`` queued moves, the oldest ones are applied
+  without animation, at most ``max_instant`` per update
+
+This module does not import pygame or OpenGL.
+"""
+import collections
+import time
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+import cube_state
+
+
+def _ease(t: float) -> float:
+    """Smoothstep: starts and ends the turn gently"""
+    return t * t * (3 - 2 * t)
+
+
+class TurnAnimator:
+    """Plays queued moves on a cube (anything with ``facelets`` and ``apply_move``)"""
+    def __init__(self, cube, turn_time: float = 0.15, speedup_backlog: int = 4,
+                 instant_backlog: int = 24, max_instant: int = 10000):
+        self.cube = cube
+        self.turn_time = turn_time
+        self.speedup_backlog = speedup_backlog
+        self.instant_backlog = instant_backlog
+        self.max_instant = max_instant
+        self.pending = collections.deque()
+        self.current: Optional[int] = None
+        self.start = 0.0
+        self.duration = 0.0
+        self.progress = 0.0
+
+    def push(self, move: int):
+        """Queue one move (a cube_state.MOVE_TABLE index)"""
+        if self.pending and self.pending[-1] // 3 == move // 3:
+            # Same face twice: add the quarter turns (k + 1 each) modulo 4
+            face = move // 3
+            quarters = (self.pending.pop() % 3 + 1 + move % 3 + 1) % 4
+            if quarters:
+                self.pending.append(3 * face + quarters - 1)
+        else:
+            self.pending.append(move)
+
+    def extend(self, moves: Iterable[int]):
+        for move in moves:
+            self.push(move)
+
+    @property
+    def busy(self) -> bool:
+        """True while a turn is playing or moves are waiting"""
+        return self.current is not None or bool(self.pending)
+
+    def final_state(self) -> np.ndarray:
+        """Facelets once every queued move has been played"""
+        moves = ([] if self.current is None else [self.current]) + list(self.pending)
+        return cube_state.apply_moves(self.cube.facelets, moves)
+
+    def finish(self):
+        """Apply the current turn and everything queued immediately"""
+        moves = ([] if self.current is None else [self.current]) + list(self.pending)
+        self.cube.apply_moves(moves)
+        self.pending.clear()
+        self.current = None
+
+    def update(self, now: Optional[float] = None) -> bool:
+        """Advance the animation to ``now``; returns True if the picture changed"""
+        if not self.busy:
+            return False
+        now = time.perf_counter() if now is None else now
+        overflow = min(len(self.pending) - self.instant_backlog, self.max_instant)
+        if overflow > 0:
+            if self.current is not None:
+                self.cube.apply_move(self.current)
+                self.current = None
+            self.cube.apply_moves([self.pending.popleft() for _ in range(overflow)])
+        start = now
+        while True:
+            if self.current is None:
+                if not self.pending:
+                    return True
+                self.current = self.pending.popleft()
+                self.start = start
+                self.duration = self.turn_time / (1 + len(self.pending) / self.speedup_backlog)
+            self.progress = (now - self.start) / self.duration if self.duration > 0 else 1.0
+            if self.progress < 1.0:
+                return True
+            # Turn finished: commit it and start the next one where this one ended
+            self.cube.apply_move(self.current)
+            self.current = None
+            start = self.start + self.duration
+
+    def current_turn(self) -> Optional[Tuple[int, float]]:
+        """(face, angle in degrees about the face's outward normal) of the turn in progress"""
+        if self.current is None:
+            return None
+        face, power = divmod(self.current, 3)
+        # Clockwise seen from outside is a negative rotation about the outward normal
+        quarters = (-1, -2, 1)[power]
+        return face, 90.0 * quarters * _ease(min(max(self.progress, 0.0), 1.0))
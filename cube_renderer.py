@@ -0,0 +1,456 @@
+"""Pygame/OpenGL front end for the cube viewer.
+
+Everything that needs a display lives here, so the cube logic in cube_state
+and rubiks_cube can be imported by headless workers without pulling in
+pygame or PyOpenGL. rubiks_cube imports this module on first draw.
+
+The cube is drawn in retained mode from vertex buffer objects (CubeMesh);
+a move only re-uploads the sticker colors.
+
+PyOpenGL's per-call error checking (a glGetError after every GL call) is off
+unless RUBIKS_GL_DEBUG=1 is set in the environment before this module is
+imported, e.g. via ``python rubiks_cube.py --gl-debug``.
+"""
+import ctypes
+import logging
+import os
+import sys
+from typing import Optional, Tuple
+
+import numpy as np
+
+import cube_state
+import metrics
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', 'hide')
+
+import OpenGL
+
+GL_DEBUG = os.environ.get('RUBIKS_GL_DEBUG', '') not in ('', '0')
+# Must be set before OpenGL.GL is imported to take effect
+OpenGL.ERROR_CHECKING = GL_DEBUG
+OpenGL.ERROR_LOGGING = GL_DEBUG
+
+import pygame
+from pygame.locals import *
+from OpenGL.GL import *
+from OpenGL.GLU import *
+
+logger = logging.getLogger(__name__)
+
+BLACK = (0, 0, 0, 1)
+
+def init_pygame_and_gl():
+    """Initialize Pygame and OpenGL with error checking"""
+    logger.debug("Initializing Pygame")
+    pygame.init()
+    
+    display = (800, 600)
+    try:
+        screen = pygame.display.set_mode(display, DOUBLEBUF | OPENGL)
+        if not screen:
+            logger.error("Failed to create display surface")
+            sys.exit(1)
+        pygame.display.set_caption("Rubik's Cube")
+    except pygame.error as e:
+        logger.error("Failed to create display: %s", e)
+        sys.exit(1)
+    
+    try:
+        # Clear to black
+        glClearColor(0.0, 0.0, 0.0, 1.0)
+        
+        # Basic setup
+        glViewport(0, 0, display[0], display[1])
+        
+        # Enable features
+        glEnable(GL_DEPTH_TEST)
+        glEnable(GL_LIGHTING)
+        glEnable(GL_LIGHT0)
+        glEnable(GL_COLOR_MATERIAL)
+        glShadeModel(GL_SMOOTH)
+        
+        # Set up material properties
+        glColorMaterial(GL_FRONT_AND_BACK, GL_AMBIENT_AND_DIFFUSE)
+        
+        # Set up lighting
+        light_ambient = [0.6, 0.6, 0.6, 1.0]
+        light_diffuse = [0.8, 0.8, 0.8, 1.0]
+        light_position = [2.0, 4.0, 5.0, 0.0]
+        
+        glLightfv(GL_LIGHT0, GL_AMBIENT, light_ambient)
+        glLightfv(GL_LIGHT0, GL_DIFFUSE, light_diffuse)
+        glLightfv(GL_LIGHT0, GL_POSITION, light_position)
+        glLightModelfv(GL_LIGHT_MODEL_AMBIENT, [0.4, 0.4, 0.4, 1.0])
+        
+        # Set up perspective
+        glMatrixMode(GL_PROJECTION)
+        gluPerspective(45, (display[0]/display[1]), 0.1, 50.0)
+        glMatrixMode(GL_MODELVIEW)
+        
+        # Test if everything is working
+        error = glGetError()
+        if error != GL_NO_ERROR:
+            logger.error("OpenGL error during initialization: %s", error)
+            sys.exit(1)
+            
+        logger.info("OpenGL %s on %s", glGetString(GL_VERSION).decode(), glGetString(GL_RENDERER).decode())
+        
+        # Clear the screen
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        pygame.display.flip()
+        
+    except Exception:
+        logger.exception("Failed to initialize OpenGL")
+        sys.exit(1)
+
+# Corners of each unit-cube side in Cubie.colors order [right, left, top,
+# bottom, front, back], counter-clockwise seen from outside
+_SIDE_QUADS = np.array([
+    [(1, -1, -1), (1, 1, -1), (1, 1, 1), (1, -1, 1)],
+    [(-1, -1, -1), (-1, -1, 1), (-1, 1, 1), (-1, 1, -1)],
+    [(-1, 1, -1), (-1, 1, 1), (1, 1, 1), (1, 1, -1)],
+    [(-1, -1, -1), (1, -1, -1), (1, -1, 1), (-1, -1, 1)],
+    [(-1, -1, 1), (1, -1, 1), (1, 1, 1), (-1, 1, 1)],
+    [(-1, -1, -1), (-1, 1, -1), (1, 1, -1), (1, -1, -1)],
+], dtype=np.float32)
+_SIDE_NORMALS = np.array([(1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1)], dtype=np.float32)
+
+class CubeMesh:
+    """Cube geometry kept in GPU buffers
+
+    Positions, normals and the black sticker outlines are uploaded once.
+    Each side of each cubie is one quad whose four vertices share a color,
+    so after a move only the 10 KB color buffer is rewritten, and a frame is
+    two draw calls instead of over a thousand immediate-mode GL calls.
+    """
+    def __init__(self, cubies, face_colors, inner_color=BLACK):
+        half = cubies[0].size / 2
+        positions = np.array([c.position for c in cubies], dtype=np.float32)
+        vertices = positions[:, None, None, :] + half * _SIDE_QUADS[None]
+        normals = np.broadcast_to(_SIDE_NORMALS[None, :, None, :], vertices.shape)
+        # Facelet shown on each (cubie, side), or -1 for the black inner sides
+        self.side_facelets = np.array([[-1 if i is None else i for i in c.facelets] for c in cubies])
+        self.palette = np.array(list(face_colors) + [inner_color], dtype=np.float32)
+        self.vertex_count = vertices.shape[0] * vertices.shape[1] * 4
+        self.colors = np.empty(vertices.shape[:3] + (4,), dtype=np.float32)
+        # Outline every quad: (0, 1), (1, 2), (2, 3), (3, 0) from each quad's first vertex
+        corners = np.arange(0, self.vertex_count, 4, dtype=np.uint32)[:, None]
+        edges = (corners + np.array([0, 1, 1, 2, 2, 3, 3, 0], dtype=np.uint32)).ravel()
+        self.edge_count = len(edges)
+        self.state = None
+
+        self.vertex_buffer, self.normal_buffer, self.color_buffer, self.edge_buffer = glGenBuffers(4)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_buffer)
+        glBufferData(GL_ARRAY_BUFFER, np.ascontiguousarray(vertices), GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, self.normal_buffer)
+        glBufferData(GL_ARRAY_BUFFER, np.ascontiguousarray(normals), GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+        glBufferData(GL_ARRAY_BUFFER, self.colors.nbytes, None, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.edge_buffer)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, edges, GL_STATIC_DRAW)
+
+        # For each face, an index buffer listing the quads and border lines of
+        # the other cubies first and of the face's layer second, so a turn is
+        # drawn as two ranges with the layer's range rotated
+        quads = (corners + np.arange(4, dtype=np.uint32)).reshape(len(cubies), -1)
+        edges = edges.reshape(len(cubies), -1)
+        self.layer_buffers = glGenBuffers(6)
+        self.layer_counts = []
+        for face, normal in enumerate(cube_state.FACE_NORMALS):
+            in_layer = positions @ np.array(normal, dtype=np.float32) > 0.5
+            indices = np.concatenate([quads[~in_layer].ravel(), quads[in_layer].ravel(),
+                                      edges[~in_layer].ravel(), edges[in_layer].ravel()])
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.layer_buffers[face])
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices, GL_STATIC_DRAW)
+            self.layer_counts.append((quads[~in_layer].size, quads[in_layer].size,
+                                      edges[~in_layer].size, edges[in_layer].size))
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def update(self, facelets: np.ndarray):
+        """Rewrite the color buffer if the sticker colors changed"""
+        if self.state is not None and np.array_equal(self.state, facelets):
+            return
+        self.state = np.array(facelets)
+        metrics.counter('color_uploads').inc()
+        inner = len(self.palette) - 1
+        sides = np.where(self.side_facelets >= 0, self.state[self.side_facelets], inner)
+        self.colors[:] = self.palette[sides][:, :, None, :]
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, self.colors.nbytes, self.colors)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw(self, facelets: np.ndarray, turn: Optional[Tuple[int, float]] = None):
+        """Draw the cube showing ``facelets``
+
+        ``turn`` is (face, degrees) for a layer that is part way through a
+        turn, as returned by cube_animation.TurnAnimator.current_turn.
+        """
+        self.update(facelets)
+        glPushMatrix()
+        # Scale the entire cube to fit the view
+        glScalef(0.5, 0.5, 0.5)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_buffer)
+        glVertexPointer(3, GL_FLOAT, 0, None)
+        glBindBuffer(GL_ARRAY_BUFFER, self.normal_buffer)
+        glNormalPointer(GL_FLOAT, 0, None)
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+        glColorPointer(4, GL_FLOAT, 0, None)
+
+        if turn is None:
+            glEnableClientState(GL_COLOR_ARRAY)
+            glDrawArrays(GL_QUADS, 0, self.vertex_count)
+            glDisableClientState(GL_COLOR_ARRAY)
+
+            # Black sticker borders
+            glColor4fv(BLACK)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.edge_buffer)
+            glDrawElements(GL_LINES, self.edge_count, GL_UNSIGNED_INT, None)
+        else:
+            face, angle = turn
+            static_quads, layer_quads, static_edges, layer_edges = self.layer_counts[face]
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.layer_buffers[face])
+            offsets = np.cumsum([0, static_quads, layer_quads, static_edges]) * 4
+            for rotated in (False, True):
+                if rotated:
+                    glPushMatrix()
+                    glRotatef(angle, *cube_state.FACE_NORMALS[face])
+                quads, edges = (layer_quads, layer_edges) if rotated else (static_quads, static_edges)
+                glEnableClientState(GL_COLOR_ARRAY)
+                glDrawElements(GL_QUADS, quads, GL_UNSIGNED_INT, ctypes.c_void_p(int(offsets[1 if rotated else 0])))
+                glDisableClientState(GL_COLOR_ARRAY)
+                glColor4fv(BLACK)
+                glDrawElements(GL_LINES, edges, GL_UNSIGNED_INT, ctypes.c_void_p(int(offsets[3 if rotated else 2])))
+                if rotated:
+                    glPopMatrix()
+
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glDisableClientState(GL_NORMAL_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glPopMatrix()
+
+class StickerMesh:
+    """Sticker quads of an NxNCube in GPU buffers
+
+    Big cubes are drawn as their 6 * N * N stickers over a black core rather
+    than as N**3 cubies. Geometry is uploaded once; a move re-uploads only
+    the 4-byte-per-vertex color buffer, and turning the outer layer of a
+    face is two index ranges like CubeMesh. Sized to match the 3x3 cube.
+    """
+    STICKER = 0.9  # sticker width as a fraction of its cell
+
+    def __init__(self, cube, face_colors):
+        n = cube.n
+        cell = 3.0 / n
+        centers, quads, normals = [], [], []
+        for face, (start, col_step, row_step) in enumerate(cube.face_frames):
+            normal = np.array(cube_state.FACE_NORMALS[face], dtype=np.float32)
+            rows, cols = np.divmod(np.arange(n * n), n)
+            doubled = start + 2 * cols[:, None] * col_step + 2 * rows[:, None] * row_step
+            center = doubled * (cell / 2) + normal * (cell / 2)
+            half = self.STICKER * cell / 2
+            corners = [(-1, -1), (1, -1), (1, 1), (-1, 1)]  # counter-clockwise seen from outside
+            quads.append(np.stack([center + half * (a * col_step + b * -row_step) for a, b in corners], axis=1))
+            normals.append(np.broadcast_to(normal, (n * n, 4, 3)))
+            centers.append(center)
+        # Black core just under the stickers
+        core = 1.5 - 1e-3
+        core_quads = _SIDE_QUADS[[2, 0, 4, 3, 1, 5]] * core
+        quads.append(core_quads)
+        normals.append(np.broadcast_to(np.array(cube_state.FACE_NORMALS, dtype=np.float32)[:, None, :], (6, 4, 3)))
+        vertices = np.concatenate(quads).astype(np.float32)
+        normals = np.concatenate(normals).astype(np.float32)
+        self.sticker_count = 6 * n * n
+        self.vertex_count = len(vertices) * 4
+        self.palette = (np.array(face_colors, dtype=np.float32) * 255).round().astype(np.uint8)
+        self.colors = np.zeros((len(vertices), 4, 4), dtype=np.uint8)
+        self.colors[self.sticker_count:, :, 3] = 255
+        self.state = None
+
+        self.vertex_buffer, self.normal_buffer, self.color_buffer = glGenBuffers(3)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_buffer)
+        glBufferData(GL_ARRAY_BUFFER, np.ascontiguousarray(vertices), GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, self.normal_buffer)
+        glBufferData(GL_ARRAY_BUFFER, np.ascontiguousarray(normals), GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+        glBufferData(GL_ARRAY_BUFFER, self.colors, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        # Per face: vertex indices of everything else, then of the outer layer
+        corner = np.arange(4, dtype=np.uint32)
+        quad_ids = np.arange(len(vertices))
+        self.layer_buffers = glGenBuffers(6)
+        self.layer_counts = []
+        for face in range(6):
+            in_layer = np.zeros(len(vertices), dtype=bool)
+            in_layer[cube.layer_indices(face)] = True
+            indices = np.concatenate([(quad_ids[~in_layer, None] * 4 + corner).ravel(),
+                                      (quad_ids[in_layer, None] * 4 + corner).ravel()]).astype(np.uint32)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.layer_buffers[face])
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices, GL_STATIC_DRAW)
+            self.layer_counts.append((int((~in_layer).sum()) * 4, int(in_layer.sum()) * 4))
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def update(self, facelets: np.ndarray):
+        """Rewrite the color buffer if any sticker changed"""
+        if self.state is not None and np.array_equal(self.state, facelets):
+            return
+        self.state = np.array(facelets)
+        metrics.counter('color_uploads').inc()
+        self.colors[:self.sticker_count] = self.palette[self.state][:, None, :]
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, self.sticker_count * 16, self.colors[:self.sticker_count])
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw(self, facelets: np.ndarray, turn: Optional[Tuple[int, float]] = None):
+        """Draw the stickers; ``turn`` is (face, degrees) for the outer layer of a face"""
+        self.update(facelets)
+        glPushMatrix()
+        glScalef(0.5, 0.5, 0.5)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_buffer)
+        glVertexPointer(3, GL_FLOAT, 0, None)
+        glBindBuffer(GL_ARRAY_BUFFER, self.normal_buffer)
+        glNormalPointer(GL_FLOAT, 0, None)
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+        glColorPointer(4, GL_UNSIGNED_BYTE, 0, None)
+
+        if turn is None:
+            glDrawArrays(GL_QUADS, 0, self.vertex_count)
+        else:
+            face, angle = turn
+            static, layer = self.layer_counts[face]
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.layer_buffers[face])
+            glDrawElements(GL_QUADS, static, GL_UNSIGNED_INT, None)
+            glPushMatrix()
+            glRotatef(angle, *cube_state.FACE_NORMALS[face])
+            glDrawElements(GL_QUADS, layer, GL_UNSIGNED_INT, ctypes.c_void_p(static * 4))
+            glPopMatrix()
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_NORMAL_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glPopMatrix()
+
+def begin_frame(rotation_x: float, rotation_y: float):
+    """Clear the screen and set up camera, light and view rotation"""
+    # Clear the screen and depth buffer
+    glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+    glLoadIdentity()
+    
+    # Set up camera and lighting
+    glTranslatef(0.0, 0.0, -9.0)
+    glLightfv(GL_LIGHT0, GL_POSITION, [2.0, 4.0, 5.0, 0.0])
+    
+    # Apply rotations
+    glRotatef(rotation_x, 1, 0, 0)
+    glRotatef(rotation_y, 0, 1, 0)
+
+class TextOverlay:
+    """Lines of text drawn over the top-left corner of the frame
+
+    The text is rasterized by pygame.font only when it changes and blitted
+    with glDrawPixels, so an unchanged overlay costs one GL call per frame.
+    """
+    def __init__(self, size: int = 20):
+        pygame.font.init()
+        self.font = pygame.font.Font(None, size)
+        self.lines = None
+        self.pixels = None
+        self.width = self.height = 0
+
+    def set_lines(self, lines):
+        if lines == self.lines:
+            return
+        self.lines = list(lines)
+        rendered = [self.font.render(line, True, (255, 255, 255)) for line in self.lines]
+        self.width = max((r.get_width() for r in rendered), default=0)
+        self.height = sum(r.get_height() for r in rendered)
+        surface = pygame.Surface((max(self.width, 1), max(self.height, 1)), pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 160))
+        y = 0
+        for r in rendered:
+            surface.blit(r, (0, y))
+            y += r.get_height()
+        # Flipped, because glDrawPixels fills rows bottom-up
+        self.pixels = pygame.image.tostring(surface, 'RGBA', True)
+
+    def draw(self):
+        if not self.pixels:
+            return
+        viewport = glGetIntegerv(GL_VIEWPORT)
+        glPushAttrib(GL_ENABLE_BIT | GL_COLOR_BUFFER_BIT)
+        glDisable(GL_DEPTH_TEST)
+        glDisable(GL_LIGHTING)
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glWindowPos2i(4, int(viewport[3]) - self.height - 4)
+        glDrawPixels(max(self.width, 1), max(self.height, 1), GL_RGBA, GL_UNSIGNED_BYTE, self.pixels)
+        glPopAttrib()
+
+class ScrubSlider:
+    """Timeline bar along the bottom of the frame for seeking through the move history
+
+    Positions are in pygame window coordinates (origin top-left); ``fraction``
+    maps a click or drag on the bar to 0..1 of the history.
+    """
+    def __init__(self, margin: int = 12, height: int = 8, grab: int = 10):
+        self.margin = margin
+        self.height = height
+        self.grab = grab  # extra pixels above and below the bar that still hit it
+
+    def _bar(self) -> Tuple[int, int, int]:
+        """(left, width, bottom) of the bar in GL window coordinates"""
+        viewport = glGetIntegerv(GL_VIEWPORT)
+        return self.margin, max(int(viewport[2]) - 2 * self.margin, 1), self.margin
+
+    def hit(self, pos: Tuple[int, int]) -> bool:
+        """True if the window position ``pos`` is on the bar"""
+        left, width, bottom = self._bar()
+        window_height = int(glGetIntegerv(GL_VIEWPORT)[3])
+        y = window_height - pos[1]
+        return (left - self.grab <= pos[0] <= left + width + self.grab
+                and bottom - self.grab <= y <= bottom + self.height + self.grab)
+
+    def fraction(self, pos: Tuple[int, int]) -> float:
+        left, width, _ = self._bar()
+        return min(max((pos[0] - left) / width, 0.0), 1.0)
+
+    def draw(self, position: int, length: int):
+        """Draw the bar with the part up to ``position`` of ``length`` plies filled"""
+        left, width, bottom = self._bar()
+        viewport = glGetIntegerv(GL_VIEWPORT)
+        filled = left + (width * position // length if length else 0)
+        glPushAttrib(GL_ENABLE_BIT | GL_CURRENT_BIT)
+        glDisable(GL_DEPTH_TEST)
+        glDisable(GL_LIGHTING)
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadIdentity()
+        glOrtho(0, int(viewport[2]), 0, int(viewport[3]), -1, 1)
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadIdentity()
+        glColor3f(0.3, 0.3, 0.3)
+        glRecti(left, bottom, left + width, bottom + self.height)
+        glColor3f(0.8, 0.8, 0.8)
+        glRecti(left, bottom, filled, bottom + self.height)
+        glColor3f(1.0, 1.0, 1.0)
+        glRecti(filled - 2, bottom - 3, filled + 2, bottom + self.height + 3)
+        glPopMatrix()
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+        glPopAttrib()
+
+def end_frame():
+    """Show the finished frame"""
+    pygame.display.flip()
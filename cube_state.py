@@ -0,0 +1,343 @@
+"""Facelet state engine for the 3x3x3 cube.
+
+The cube state is a 54-entry uint8 array holding the color (face id) of every
+sticker, laid out in Kociemba's URFDLB facelet order, the same order the
+browser port hands to cubejs:
+
+             U1 U2 U3
+             U4 U5 U6
+             U7 U8 U9
+    L1 L2 L3 F1 F2 F3 R1 R2 R3 B1 B2 B3
+    L4 L5 L6 F4 F5 F6 R4 R5 R6 B4 B5 B6
+    L7 L8 L9 F7 F8 F9 R7 R8 R9 B7 B8 B9
+             D1 D2 D3
+             D4 D5 D6
+             D7 D8 D9
+
+Array index is ``9 * face + 3 * row + col`` with faces ordered U, R, F, D, L, B.
+Every turn is a precomputed permutation, so applying a move is a single
+gather: ``new_state = state[MOVE_TABLE[move]]``.
+"""
+import random
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import metrics
+
+FACES = 'URFDLB'
+U, R, F, D, L, B = range(6)
+
+# Outward normal of each face, indexed like FACES
+FACE_NORMALS = (
+    (0, 1, 0),   # U
+    (1, 0, 0),   # R
+    (0, 0, 1),   # F
+    (0, -1, 0),  # D
+    (-1, 0, 0),  # L
+    (0, 0, -1),  # B
+)
+
+# RGBA display colors, shared by the viewer and the offscreen renderer
+COLORS = {
+    'red': (1, 0, 0, 1),
+    'green': (0, 1, 0, 1),
+    'blue': (0, 0, 1, 1),
+    'yellow': (1, 1, 0.1, 1),  # Even brighter yellow with slight warmth
+    'orange': (1, 0.3, 0, 1),  # Darker and more reddish orange
+    'white': (1, 1, 1, 1),
+    'black': (0, 0, 0, 1)
+}
+
+# Sticker color for each face id of the facelet state, in FACES order (URFDLB)
+FACE_COLORS = (
+    COLORS['white'],   # U
+    COLORS['green'],   # R
+    COLORS['red'],     # F
+    COLORS['yellow'],  # D
+    COLORS['blue'],    # L
+    COLORS['orange'],  # B
+)
+
+# Position of facelet 1 and the steps to the next column / row on each face,
+# looking straight at that face with the net orientation shown above
+_FACE_LAYOUT = (
+    ((-1, 1, -1), (1, 0, 0), (0, 0, 1)),    # U: back row first
+    ((1, 1, 1), (0, 0, -1), (0, -1, 0)),    # R
+    ((-1, 1, 1), (1, 0, 0), (0, -1, 0)),    # F
+    ((-1, -1, 1), (1, 0, 0), (0, 0, -1)),   # D: front row first
+    ((-1, 1, -1), (0, 0, 1), (0, -1, 0)),   # L
+    ((1, 1, -1), (-1, 0, 0), (0, -1, 0)),   # B
+)
+
+Vec = Tuple[int, int, int]
+
+
+def _build_facelet_geometry() -> Tuple[np.ndarray, np.ndarray]:
+    """Cubie position and outward normal of every facelet"""
+    positions = np.zeros((54, 3), dtype=np.int8)
+    normals = np.zeros((54, 3), dtype=np.int8)
+    for face, (start, col_step, row_step) in enumerate(_FACE_LAYOUT):
+        for row in range(3):
+            for col in range(3):
+                index = 9 * face + 3 * row + col
+                positions[index] = [start[k] + col * col_step[k] + row * row_step[k] for k in range(3)]
+                normals[index] = FACE_NORMALS[face]
+    return positions, normals
+
+
+FACELET_POSITIONS, FACELET_NORMALS = _build_facelet_geometry()
+
+_FACELET_INDEX: Dict[Tuple[Vec, Vec], int] = {
+    (tuple(int(v) for v in p), tuple(int(v) for v in n)): i
+    for i, (p, n) in enumerate(zip(FACELET_POSITIONS, FACELET_NORMALS))
+}
+
+
+def facelet_index(position: Sequence[int], normal: Sequence[int]) -> int:
+    """Index of the sticker on the cubie at ``position`` facing ``normal``"""
+    return _FACELET_INDEX[(tuple(int(v) for v in position), tuple(int(v) for v in normal))]
+
+
+def _quarter_turn_matrix(axis: Vec) -> np.ndarray:
+    """Clockwise quarter turn seen from the tip of ``axis`` (v -> v x a + a(a.v))"""
+    a = np.array(axis)
+    basis = np.eye(3, dtype=int)
+    return np.array([np.cross(e, a) + a * np.dot(a, e) for e in basis]).T
+
+
+def layer_turn_permutation(axis: Vec, layers: Iterable[int]) -> np.ndarray:
+    """Gather permutation for a clockwise quarter turn of some layers
+
+    ``layers`` are the values of ``position . axis`` that turn together, so
+    ``(1,)`` is the outer face, ``(0,)`` the middle slice and ``(0, 1)`` a
+    wide turn.
+    """
+    layers = set(layers)
+    rotation = _quarter_turn_matrix(axis)
+    perm = np.arange(54)
+    depth = FACELET_POSITIONS @ np.array(axis)
+    for i in np.flatnonzero(np.isin(depth, list(layers))):
+        target = facelet_index(rotation @ FACELET_POSITIONS[i], rotation @ FACELET_NORMALS[i])
+        perm[target] = i
+    return perm
+
+
+def _build_move_table() -> Tuple[List[str], np.ndarray]:
+    """Permutations for the 18 face turns, ordered U U2 U' R R2 R' ..."""
+    names = []
+    table = np.zeros((18, 54), dtype=np.intp)
+    for face, letter in enumerate(FACES):
+        quarter = layer_turn_permutation(FACE_NORMALS[face], (1,))
+        perm = np.arange(54)
+        for power, suffix in enumerate(('', '2', "'")):
+            perm = perm[quarter]
+            names.append(letter + suffix)
+            table[3 * face + power] = perm
+    return names, table
+
+
+MOVE_NAMES, MOVE_TABLE = _build_move_table()
+MOVE_TABLE.flags.writeable = False
+MOVE_INDEX: Dict[str, int] = {name: i for i, name in enumerate(MOVE_NAMES)}
+# Inverse of move 3f + k is 3f + (2 - k): U <-> U', U2 <-> U2
+INVERSE_MOVE = np.array([3 * (m // 3) + 2 - m % 3 for m in range(18)], dtype=np.intp)
+
+
+def move_index(face: str, clockwise: bool = True) -> int:
+    """Move table index for a quarter turn of ``face``"""
+    if len(face) != 1 or face not in FACES:
+        raise ValueError(f"Invalid face: {face}")
+    return 3 * FACES.index(face) + (0 if clockwise else 2)
+
+
+def parse_moves(notation: str) -> List[int]:
+    """Turn a move string such as "R U R' U2" into move table indices"""
+    try:
+        return [MOVE_INDEX[token] for token in notation.split()]
+    except KeyError as e:
+        raise ValueError(f"Invalid move: {e.args[0]}") from None
+
+
+def format_moves(moves: Iterable[int]) -> str:
+    """Inverse of parse_moves"""
+    return ' '.join(MOVE_NAMES[m] for m in moves)
+
+
+def scramble_moves(num_moves: int = 20, rng: Optional[random.Random] = None,
+                   faces: Sequence[str] = 'FBRLUD') -> List[int]:
+    """Random quarter turns of ``faces``, as CubeState.scramble applies them"""
+    rng = rng or random
+    return [move_index(rng.choice(faces), rng.choice([True, False])) for _ in range(num_moves)]
+
+
+def solved_state() -> np.ndarray:
+    """Facelet array of a solved cube"""
+    return np.repeat(np.arange(6, dtype=np.uint8), 9)
+
+
+def apply_move(state: np.ndarray, move: int) -> np.ndarray:
+    """Return ``state`` after one move"""
+    return state[MOVE_TABLE[move]]
+
+
+_TRIPLE_TABLE = None
+
+
+def _triple_table() -> np.ndarray:
+    """Lazily built (18**3, 54) table of every three-move composition"""
+    global _TRIPLE_TABLE
+    if _TRIPLE_TABLE is None:
+        pairs = np.take(MOVE_TABLE, MOVE_TABLE, axis=1).reshape(18 * 18, 54)
+        _TRIPLE_TABLE = np.take(pairs, MOVE_TABLE, axis=1).reshape(18 ** 3, 54)
+    return _TRIPLE_TABLE
+
+
+def apply_moves(state: np.ndarray, moves: Iterable[int]) -> np.ndarray:
+    """Return ``state`` after a sequence of moves
+
+    Long sequences are applied three moves per gather using the triple
+    table, which roughly halves the per-move cost of replaying a move log.
+    """
+    if not isinstance(moves, np.ndarray):
+        moves = np.array(list(moves), dtype=np.intp)
+    head = 0
+    if len(moves) >= 64:
+        head = len(moves) - len(moves) % 3
+        codes = (moves[0:head:3] * 18 + moves[1:head:3]) * 18 + moves[2:head:3]
+        table = _triple_table()
+        for code in codes.tolist():
+            state = state[table[code]]
+    table = MOVE_TABLE
+    for move in moves[head:].tolist():
+        state = state[table[move]]
+    return state
+
+
+def compose_moves(moves: Iterable[int]) -> np.ndarray:
+    """Single gather permutation equivalent to a move sequence"""
+    return apply_moves(np.arange(54), moves)
+
+
+def is_solved(state: np.ndarray) -> bool:
+    """True if every face shows a single color"""
+    faces = state.reshape(6, 9)
+    return bool((faces == faces[:, 4:5]).all())
+
+
+def normalize_centers(state: np.ndarray) -> np.ndarray:
+    """Relabel colors so every center shows its own face id
+
+    Slice, wide and rotation moves (see move_compiler) carry the centers
+    with them; this gives the equivalent state in the fixed-center frame the
+    solvers work in. A solution for the result also solves ``state``.
+    States whose centers are not six distinct colors are returned unchanged.
+    """
+    centers = state[4::9]
+    if (np.sort(centers) != np.arange(6)).any():
+        return state
+    relabel = np.empty(6, dtype=np.uint8)
+    relabel[centers] = np.arange(6, dtype=np.uint8)
+    return relabel[state]
+
+
+def to_facelet_string(state: np.ndarray) -> str:
+    """54-character URFDLB string, e.g. 'UUUUUUUUURRR...'"""
+    return ''.join(FACES[c] for c in state)
+
+
+def from_facelet_string(facelets: str) -> np.ndarray:
+    """Parse a 54-character URFDLB facelet string"""
+    if len(facelets) != 54 or any(c not in FACES for c in facelets):
+        raise ValueError(f"Expected 54 characters from {FACES!r}, got {facelets!r}")
+    return np.array([FACES.index(c) for c in facelets], dtype=np.uint8)
+
+
+_MOVES_APPLIED = metrics.counter('moves_applied')
+_ALGORITHMS_APPLIED = metrics.counter('algorithms_applied')
+
+
+class CubeState:
+    """Renderer-free 3x3x3 cube: facelet state, face turns and scramble
+
+    This is everything a worker needs for cube logic; it imports only numpy.
+    RubiksCube in rubiks_cube.py adds the cubie views used for drawing.
+    """
+    moves = ['F', 'B', 'R', 'L', 'U', 'D']
+
+    def __init__(self, facelets: Optional[np.ndarray] = None):
+        self.facelets = solved_state() if facelets is None else np.array(facelets, dtype=np.uint8)
+
+    @classmethod
+    def from_facelet_string(cls, facelets: str) -> 'CubeState':
+        return cls(from_facelet_string(facelets))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'CubeState':
+        """State from the 9-byte packed encoding; see state_codec"""
+        import state_codec
+        return cls(state_codec.from_bytes(data))
+
+    def to_bytes(self) -> bytes:
+        """9-byte packed encoding of the state; see state_codec"""
+        import state_codec
+        return state_codec.to_bytes(self.facelets)
+
+    def copy(self) -> 'CubeState':
+        return CubeState(self.facelets)
+
+    def rotate_face(self, face: str, clockwise: bool = True):
+        """Rotate a face of the cube, clockwise as seen looking at that face"""
+        self.apply_move(move_index(face, clockwise))
+
+    def apply_move(self, move: int):
+        """Apply one of the 18 moves in MOVE_NAMES"""
+        self.facelets = self.facelets[MOVE_TABLE[move]]
+        _MOVES_APPLIED.inc()
+
+    def apply_moves(self, moves: Iterable[int]):
+        """Apply a sequence of move indices, e.g. a replayed move log"""
+        if not isinstance(moves, np.ndarray):
+            moves = np.array(list(moves), dtype=np.intp)
+        self.facelets = apply_moves(self.facelets, moves)
+        _MOVES_APPLIED.inc(len(moves))
+
+    def scramble(self, num_moves: int = 20, rng: Optional[random.Random] = None) -> List[int]:
+        """Scramble the cube with random face turns and return the moves applied"""
+        moves = scramble_moves(num_moves, rng, self.moves)
+        self.apply_moves(moves)
+        return moves
+
+    def apply_algorithm(self, algorithm):
+        """Apply an algorithm string such as "R U R' U' M2 (R U)3" in one step
+
+        ``algorithm`` may also be a compiled move_compiler.Algorithm; strings
+        are compiled once and cached, so repeating an algorithm costs a
+        single 54-element gather regardless of its length.
+        """
+        import move_compiler
+        if isinstance(algorithm, str):
+            algorithm = move_compiler.compile_algorithm(algorithm)
+        self.facelets = self.facelets[algorithm.permutation]
+        _ALGORITHMS_APPLIED.inc()
+
+    def is_solved(self) -> bool:
+        return is_solved(self.facelets)
+
+    def solution(self, max_length: int = 21, timeout: Optional[float] = None) -> List[int]:
+        """Two-phase solution for the current state; see two_phase.TwoPhaseSolver.solve"""
+        import two_phase  # builds its tables on first use, so keep it off the import path
+        return two_phase.solve(self.facelets, max_length, timeout)
+
+    def optimal_solution(self, timeout: Optional[float] = None) -> List[int]:
+        """Shortest solution for the current state; see optimal_solver.OptimalSolver.solve"""
+        import optimal_solver  # maps (or builds, once) ~135 MB of pattern databases
+        return optimal_solver.solve(self.facelets, timeout)
+
+    def facelet_string(self) -> str:
+        return to_facelet_string(self.facelets)
+
+    def canonical_key(self) -> int:
+        """Hashable key shared by every state equal to this one up to symmetry; see cube_symmetry"""
+        import cube_symmetry
+        return cube_symmetry.canonical_key(self.facelets)[0]
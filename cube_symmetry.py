@@ -0,0 +1,161 @@
+"""The 48 symmetries of the cube and a canonical key per symmetry class.
+
+A symmetry is one of the 48 signed permutation matrices: the 24 whole-cube
+rotations, each optionally combined with a mirror. Applied to a facelet
+state it moves every sticker to its image and relabels the colors so the
+centers keep their face ids, which turns a state into the same position
+seen from another side (or in a mirror). Two states that differ only by
+such a change of viewpoint, or by using a different color scheme, need the
+same number of moves and have solutions that map onto each other.
+
+``canonical_key`` computes all 48 images of a state with one gather, packs
+the 48 non-center stickers of each image into three 48-bit words (three bits
+per sticker) and returns the lexicographically smallest as one integer.
+States in the same class get the same key; ``canonical_keys`` does the same
+for an (N, 54) batch without a Python loop.
+
+    >>> key, sym = canonical_key(state)
+    >>> canonical = transform(state, sym)              # the class representative
+    >>> moves = [MOVE_MAP[sym][m] for m in solution]   # a solution of ``state``, for ``canonical``
+"""
+import itertools
+from typing import List, Tuple
+
+import numpy as np
+
+import cube_state
+
+NON_CENTERS = np.array([i for i in range(54) if i % 9 != 4], dtype=np.intp)
+_CENTER_IDS = np.arange(6)
+_WORD_WEIGHTS = 8.0 ** np.arange(15, -1, -1)
+
+
+def _symmetry_matrices() -> np.ndarray:
+    """All 48 signed 3x3 permutation matrices, the identity first and rotations before mirrors"""
+    matrices = []
+    for columns in itertools.permutations(range(3)):
+        for signs in itertools.product((1, -1), repeat=3):
+            m = np.zeros((3, 3), dtype=int)
+            m[range(3), columns] = signs
+            matrices.append(m)
+    matrices.sort(key=lambda m: (round(np.linalg.det(m)) < 0, not np.array_equal(m, np.eye(3))))
+    return np.array(matrices)
+
+
+def _build_tables() -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Facelet gather, color relabelling and move conjugation for every symmetry"""
+    matrices = _symmetry_matrices()
+    perms = np.zeros((48, 54), dtype=np.intp)
+    colors = np.zeros((48, 6), dtype=np.uint8)
+    # Facelets by position and normal, each coordinate in -1..1 as a base-3 digit
+    digits = 3 ** np.arange(6)
+    geometry = np.hstack([cube_state.FACELET_POSITIONS, cube_state.FACELET_NORMALS]).astype(int)
+    lookup = np.zeros(3 ** 6, dtype=np.intp)
+    lookup[(geometry + 1) @ digits] = np.arange(54)
+    for s, m in enumerate(matrices):
+        moved = np.hstack([cube_state.FACELET_POSITIONS @ m.T, cube_state.FACELET_NORMALS @ m.T])
+        perms[s, lookup[(moved + 1) @ digits]] = np.arange(54)
+        for face, normal in enumerate(cube_state.FACE_NORMALS):
+            colors[s, face] = cube_state.FACE_NORMALS.index(tuple(int(v) for v in m @ normal))
+    # transform(apply_move(x, m)) == apply_move(transform(x), move_map[s, m]); mirrors reverse turns
+    move_map = np.zeros((48, 18), dtype=np.intp)
+    table = cube_state.MOVE_TABLE
+    move_of = {perm.tobytes(): m for m, perm in enumerate(table)}
+    for s in range(48):
+        inverse = np.argsort(perms[s])
+        for m in range(18):
+            move_map[s, m] = move_of[inverse[table[m][perms[s]]].tobytes()]
+    return matrices, perms, colors, move_map
+
+
+MATRICES, SYMMETRY_PERMS, SYMMETRY_COLORS, MOVE_MAP = _build_tables()
+# INVERSE_MOVE_MAP[s, MOVE_MAP[s, m]] == m: maps moves for the transformed state back
+INVERSE_MOVE_MAP = np.argsort(MOVE_MAP, axis=1)
+# _COLOR_TABLE[color, s] is the color relabelled by symmetry s, and row
+# s of _IMAGE_GATHER indexes image s in a flattened _COLOR_TABLE[state]
+_COLOR_TABLE = np.ascontiguousarray(SYMMETRY_COLORS.T, dtype=np.float64)
+_IMAGE_GATHER = SYMMETRY_PERMS[:, NON_CENTERS] * 48 + np.arange(48)[:, None]
+for _table in (SYMMETRY_PERMS, SYMMETRY_COLORS, MOVE_MAP, INVERSE_MOVE_MAP):
+    _table.flags.writeable = False
+
+
+def transform(state: np.ndarray, sym: int) -> np.ndarray:
+    """``state`` seen through symmetry ``sym``, with the centers keeping their face ids"""
+    return SYMMETRY_COLORS[sym][cube_state.normalize_centers(state)[SYMMETRY_PERMS[sym]]]
+
+
+def _words(states: np.ndarray) -> np.ndarray:
+    """(N, 54) normalized states -> (N, 48, 3) packed words of every image, as exact float64"""
+    # Relabel each sticker's color for all 48 symmetries with one row gather,
+    # then pick every image's stickers from that (54 x 48) table
+    relabelled = _COLOR_TABLE[states].reshape(len(states), -1)
+    images = relabelled[:, _IMAGE_GATHER]
+    # Each word is below 2**48, so float64 BLAS sums are exact
+    return images.reshape(len(states), 48, 3, 16) @ _WORD_WEIGHTS
+
+
+def _keys(states: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(N, 54) normalized states -> (N, 3) uint64 minimum words and (N,) symmetry index"""
+    words = _words(states)
+    # Lexicographic minimum over the 48 images, one word at a time
+    candidates = np.ones(words.shape[:2], dtype=bool)
+    best = np.zeros((len(states), 3))
+    for w in range(3):
+        column = np.where(candidates, words[:, :, w], np.inf)
+        best[:, w] = column.min(axis=1)
+        candidates &= column == best[:, w:w + 1]
+    return best.astype(np.uint64), candidates.argmax(axis=1)
+
+
+def _normalize(states: np.ndarray) -> np.ndarray:
+    """Batch version of cube_state.normalize_centers"""
+    centers = states[:, 4::9]
+    if (np.sort(centers, axis=1) != np.arange(6)).any():
+        return np.array([cube_state.normalize_centers(s) for s in states])
+    relabel = np.empty_like(centers)
+    np.put_along_axis(relabel, centers.astype(np.intp), np.arange(6, dtype=states.dtype), axis=1)
+    return np.take_along_axis(relabel, states.astype(np.intp), axis=1)
+
+
+def canonical_key(state: np.ndarray) -> Tuple[int, int]:
+    """(key, sym): the smallest packed image of ``state`` and a symmetry that produces it
+
+    The key is a 144-bit integer, equal for every state that differs from
+    ``state`` by a rotation, a mirror or a relabelling of the colors.
+    """
+    state = np.asarray(state)
+    if (state[4::9] != _CENTER_IDS).any():
+        state = cube_state.normalize_centers(state)
+    images = _words(state[None])[0].tolist()
+    best = min(images)
+    a, b, c = (int(w) for w in best)
+    return (a << 96) | (b << 48) | c, images.index(best)
+
+
+def canonical_keys(states: np.ndarray, chunk: int = 64) -> Tuple[np.ndarray, np.ndarray]:
+    """Keys for an (N, 54) batch as (N, 3) uint64 words (compare rows), plus (N,) symmetries
+
+    Works through ``chunk`` states at a time so the 48 images stay in cache.
+    """
+    states = _normalize(np.asarray(states))
+    words = np.empty((len(states), 3), dtype=np.uint64)
+    syms = np.empty(len(states), dtype=np.intp)
+    for start in range(0, len(states), chunk):
+        words[start:start + chunk], syms[start:start + chunk] = _keys(states[start:start + chunk])
+    return words, syms
+
+
+def key_from_words(words: np.ndarray) -> int:
+    """canonical_key's integer for one row of canonical_keys"""
+    a, b, c = (int(w) for w in words)
+    return (a << 96) | (b << 48) | c
+
+
+def map_moves(moves: List[int], sym: int) -> List[int]:
+    """A solution of ``state`` as a solution of ``transform(state, sym)``"""
+    return [int(MOVE_MAP[sym, m]) for m in moves]
+
+
+def unmap_moves(moves: List[int], sym: int) -> List[int]:
+    """A solution of ``transform(state, sym)`` as a solution of ``state``"""
+    return [int(INVERSE_MOVE_MAP[sym, m]) for m in moves]
@@ -0,0 +1,267 @@
+"""Cubie-level cube representation and solver coordinates.
+
+A cube is described by which corner/edge cubie sits in each position and how
+it is twisted or flipped there (Kociemba's conventions and numbering):
+
+    corners: URF UFL ULB UBR DFR DLF DBL DRB
+    edges:   UR UF UL UB DR DF DL DB FR FL BL BR
+
+Every function works on a leading batch axis, so arrays are (N, 8) for
+corners and (N, 12) for edges; the move and pruning tables in two_phase are
+built by pushing every coordinate value through these at once.
+"""
+from itertools import combinations
+from math import comb, factorial
+from typing import Tuple
+
+import numpy as np
+
+import cube_state
+from cube_state import U, R, F, D, L, B
+
+# Facelet indices of each corner/edge position, first one on the U/D face
+# (or the F/B face for the four slice edges)
+CORNER_FACELETS = np.array([
+    [8, 9, 20], [6, 18, 38], [0, 36, 47], [2, 45, 11],
+    [29, 26, 15], [27, 44, 24], [33, 53, 42], [35, 17, 51],
+])
+EDGE_FACELETS = np.array([
+    [5, 10], [7, 19], [3, 37], [1, 46], [32, 16], [28, 25],
+    [30, 43], [34, 52], [23, 12], [21, 41], [50, 39], [48, 14],
+])
+CORNER_COLORS = np.array([
+    [U, R, F], [U, F, L], [U, L, B], [U, B, R],
+    [D, F, R], [D, L, F], [D, B, L], [D, R, B],
+])
+EDGE_COLORS = np.array([
+    [U, R], [U, F], [U, L], [U, B], [D, R], [D, F],
+    [D, L], [D, B], [F, R], [F, L], [B, L], [B, R],
+])
+
+N_TWIST = 3 ** 7
+N_FLIP = 2 ** 11
+N_SLICE = comb(12, 4)
+N_CORNER_PERM = factorial(8)
+N_UD_EDGE_PERM = factorial(8)
+N_SLICE_PERM = factorial(4)
+N_EDGE_PERM = factorial(12)
+
+_INVALID = 255
+
+
+def _build_lookups() -> Tuple[np.ndarray, np.ndarray]:
+    """Map the colors seen at a position to (cubie, orientation)
+
+    Corners are keyed by c0 * 36 + c1 * 6 + c2 and edges by c0 * 6 + c1, with
+    colors read in the position's facelet order.
+    """
+    corner_lookup = np.full((216, 2), _INVALID, dtype=np.uint8)
+    for cubie, colors in enumerate(CORNER_COLORS):
+        for ori in range(3):
+            seen = [colors[(k - ori) % 3] for k in range(3)]
+            corner_lookup[seen[0] * 36 + seen[1] * 6 + seen[2]] = (cubie, ori)
+    edge_lookup = np.full((36, 2), _INVALID, dtype=np.uint8)
+    for cubie, colors in enumerate(EDGE_COLORS):
+        for ori in range(2):
+            seen = [colors[(k - ori) % 2] for k in range(2)]
+            edge_lookup[seen[0] * 6 + seen[1]] = (cubie, ori)
+    return corner_lookup, edge_lookup
+
+
+_CORNER_LOOKUP, _EDGE_LOOKUP = _build_lookups()
+
+
+def from_facelets(states: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(N, 54) facelet states -> corner perm/orientation, edge perm/orientation
+
+    Raises ValueError if any position shows a color combination that no
+    cubie has.
+    """
+    states = np.asarray(states, dtype=np.intp).reshape(-1, 54)
+    seen = states[:, CORNER_FACELETS]
+    corners = _CORNER_LOOKUP[seen[..., 0] * 36 + seen[..., 1] * 6 + seen[..., 2]]
+    seen = states[:, EDGE_FACELETS]
+    edges = _EDGE_LOOKUP[seen[..., 0] * 6 + seen[..., 1]]
+    if (corners == _INVALID).any() or (edges == _INVALID).any():
+        raise ValueError("Facelets do not describe real corner and edge cubies")
+    return corners[..., 0], corners[..., 1], edges[..., 0], edges[..., 1]
+
+
+def to_facelets(cp: np.ndarray, co: np.ndarray, ep: np.ndarray, eo: np.ndarray) -> np.ndarray:
+    """Inverse of from_facelets, returning an (N, 54) uint8 matrix"""
+    cp, co, ep, eo = (np.atleast_2d(a).astype(np.intp) for a in (cp, co, ep, eo))
+    states = np.empty((len(cp), 54), dtype=np.uint8)
+    states[:, 4::9] = np.arange(6, dtype=np.uint8)  # centers never move
+    rows = np.arange(len(cp))[:, None]
+    for k in range(3):
+        states[rows, CORNER_FACELETS[np.arange(8), (k + co) % 3]] = CORNER_COLORS[cp, k]
+    for k in range(2):
+        states[rows, EDGE_FACELETS[np.arange(12), (k + eo) % 2]] = EDGE_COLORS[ep, k]
+    return states
+
+
+def multiply(a: Tuple[np.ndarray, ...], b: Tuple[np.ndarray, ...]) -> Tuple[np.ndarray, ...]:
+    """Cube a followed by cube b, both as (cp, co, ep, eo)"""
+    acp, aco, aep, aeo = a
+    bcp, bco, bep, beo = b
+    cp = np.take_along_axis(acp, bcp, axis=-1)
+    co = (np.take_along_axis(aco, bcp, axis=-1) + bco) % 3
+    ep = np.take_along_axis(aep, bep, axis=-1)
+    eo = (np.take_along_axis(aeo, bep, axis=-1) + beo) % 2
+    return cp, co, ep, eo
+
+
+def _move_cubies():
+    """Cubie form of the 18 moves, read off the facelet move table"""
+    return from_facelets(cube_state.solved_state()[cube_state.MOVE_TABLE])
+
+
+MOVE_CP, MOVE_CO, MOVE_EP, MOVE_EO = _move_cubies()
+
+
+def apply_move(cubies: Tuple[np.ndarray, ...], move: int) -> Tuple[np.ndarray, ...]:
+    """Apply one of the 18 moves to a batch of (cp, co, ep, eo) arrays"""
+    n = len(cubies[0])
+    move_cube = tuple(np.broadcast_to(t[move], (n,) + t[move].shape) for t in (MOVE_CP, MOVE_CO, MOVE_EP, MOVE_EO))
+    return multiply(cubies, move_cube)
+
+
+# -- coordinates -----------------------------------------------------------
+
+_TWIST_WEIGHTS = 3 ** np.arange(6, -1, -1)
+_FLIP_WEIGHTS = 2 ** np.arange(10, -1, -1)
+
+
+def twist(co: np.ndarray) -> np.ndarray:
+    """Corner orientation coordinate, 0..2186"""
+    return co[..., :7] @ _TWIST_WEIGHTS
+
+
+def twist_to_co(coord: np.ndarray) -> np.ndarray:
+    co = (np.asarray(coord)[..., None] // _TWIST_WEIGHTS) % 3
+    return np.concatenate([co, (-co.sum(axis=-1, keepdims=True)) % 3], axis=-1)
+
+
+def flip(eo: np.ndarray) -> np.ndarray:
+    """Edge orientation coordinate, 0..2047"""
+    return eo[..., :11] @ _FLIP_WEIGHTS
+
+
+def flip_to_eo(coord: np.ndarray) -> np.ndarray:
+    eo = (np.asarray(coord)[..., None] // _FLIP_WEIGHTS) % 2
+    return np.concatenate([eo, eo.sum(axis=-1, keepdims=True) % 2], axis=-1)
+
+
+def perm_rank(perm: np.ndarray) -> np.ndarray:
+    """Lexicographic rank of permutations of 0..n-1 along the last axis"""
+    n = perm.shape[-1]
+    smaller_after = np.triu(perm[..., :, None] > perm[..., None, :], k=1).sum(axis=-1)
+    weights = np.array([factorial(n - 1 - i) for i in range(n)])
+    return smaller_after @ weights
+
+
+def perm_unrank(rank: np.ndarray, n: int) -> np.ndarray:
+    """Inverse of perm_rank"""
+    rank = np.asarray(rank).copy()
+    shape = rank.shape
+    rank = rank.reshape(-1)
+    available = np.ones((len(rank), n), dtype=bool)
+    perm = np.zeros((len(rank), n), dtype=np.intp)
+    for i in range(n):
+        digit, rank = np.divmod(rank, factorial(n - 1 - i))
+        # Pick the digit-th still-available element
+        pick = np.argmax(available.cumsum(axis=1) > digit[:, None], axis=1)
+        perm[:, i] = pick
+        available[np.arange(len(rank)), pick] = False
+    return perm.reshape(shape + (n,))
+
+
+def partial_perm_rank(positions: np.ndarray, n: int) -> np.ndarray:
+    """Rank of k distinct values out of 0..n-1, in order, as 0..n!/(n-k)!-1"""
+    k = positions.shape[-1]
+    smaller_before = np.tril(positions[..., None, :] < positions[..., :, None], k=-1).sum(axis=-1)
+    weights = np.array([factorial(n - 1 - i) // factorial(n - k) for i in range(k)])
+    return (positions - smaller_before) @ weights
+
+
+def partial_perm_unrank(rank: np.ndarray, n: int, k: int) -> np.ndarray:
+    """Inverse of partial_perm_rank"""
+    rank = np.asarray(rank).reshape(-1).copy()
+    available = np.ones((len(rank), n), dtype=bool)
+    positions = np.zeros((len(rank), k), dtype=np.intp)
+    for i in range(k):
+        digit, rank = np.divmod(rank, factorial(n - 1 - i) // factorial(n - k))
+        pick = np.argmax(available.cumsum(axis=1) > digit[:, None], axis=1)
+        positions[:, i] = pick
+        available[np.arange(len(rank)), pick] = False
+    return positions
+
+
+_BINOM = np.array([[comb(p, k) for k in range(1, 5)] for p in range(12)])
+
+
+def combination_rank(mask: np.ndarray) -> np.ndarray:
+    """Rank of a set of 4 positions out of 12 (combinatorial number system)"""
+    # Stable argsort of ~mask lists the True positions first, in increasing order
+    positions = np.argsort(~mask, axis=-1, kind='stable')[..., :4]
+    return sum(_BINOM[positions[..., k], k] for k in range(4))
+
+
+SLICE_COMBINATIONS = np.array([
+    c for c in sorted(combinations(range(12), 4), key=lambda c: sum(comb(p, k + 1) for k, p in enumerate(c)))
+])
+
+
+def slice_coord(ep: np.ndarray) -> np.ndarray:
+    """Which 4 of the 12 edge positions hold the FR/FL/BL/BR slice edges, 0..494"""
+    return combination_rank(ep >= 8)
+
+
+def corner_perm(cp: np.ndarray) -> np.ndarray:
+    return perm_rank(cp)
+
+
+def ud_edge_perm(ep: np.ndarray) -> np.ndarray:
+    """Permutation of the 8 U/D edges, valid once the slice edges are in the slice"""
+    return perm_rank(ep[..., :8])
+
+
+def slice_perm(ep: np.ndarray) -> np.ndarray:
+    """Permutation of the 4 slice edges within the slice"""
+    return perm_rank(ep[..., 8:] - 8)
+
+
+def permutation_parity(perm: np.ndarray) -> np.ndarray:
+    """0 for even permutations, 1 for odd"""
+    return np.triu(perm[..., :, None] > perm[..., None, :], k=1).sum(axis=(-1, -2)) % 2
+
+
+def verify(cp, co, ep, eo) -> None:
+    """Raise ValueError unless (cp, co, ep, eo) is a reachable cube"""
+    cp, co, ep, eo = (np.atleast_2d(a) for a in (cp, co, ep, eo))
+    if (np.sort(cp, axis=-1) != np.arange(8)).any():
+        raise ValueError("Some corner appears twice")
+    if (np.sort(ep, axis=-1) != np.arange(12)).any():
+        raise ValueError("Some edge appears twice")
+    if (co.sum(axis=-1) % 3).any():
+        raise ValueError("Corner twist is not solvable (a corner is twisted)")
+    if (eo.sum(axis=-1) % 2).any():
+        raise ValueError("Edge flip is not solvable (an edge is flipped)")
+    if (permutation_parity(cp) != permutation_parity(ep)).any():
+        raise ValueError("Permutation parity mismatch (two pieces are swapped)")
+
+
+def random_cubies(n: int, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """n uniformly random reachable cubes as (cp, co, ep, eo)
+
+    Permutations, twist and flip are drawn independently; where the two
+    permutation parities differ, swapping two edges pairs the state with
+    exactly one reachable cube, so the result stays uniform.
+    """
+    cp = rng.random((n, 8)).argsort(axis=1)
+    ep = rng.random((n, 12)).argsort(axis=1)
+    odd = permutation_parity(cp) != permutation_parity(ep)
+    ep[odd, :2] = ep[odd, 1::-1]
+    co = twist_to_co(rng.integers(N_TWIST, size=n))
+    eo = flip_to_eo(rng.integers(N_FLIP, size=n))
+    return cp, co, ep, eo
@@ -0,0 +1,221 @@
+"""Sharded training data for learning-based solvers.
+
+Two kinds of samples, both as (facelets, depth) records:
+
+    uniform   uniformly random reachable states (cubie_cube.random_cubies);
+              their distance from solved is unknown, so depth is UNKNOWN_DEPTH
+    walk      random walks from the solved cube, every state labelled with
+              the number of moves that produced it (1..max_depth). A walk
+              never turns the same face twice in a row and turns opposite
+              faces only in U/R/F-before-D/L/B order, so it cannot undo or
+              merge a move even across an opposite-face turn (no R L R');
+              the label is an upper bound on the real distance, as in
+              DeepCubeA-style training
+
+Each shard is one ``.npy`` file of SAMPLE records, written by one pool
+worker in fixed-size chunks straight into a memmap, so memory per process
+is bounded by the chunk, not the shard. Shard ``i`` is generated from the
+seed sequence ``(seed, i)`` alone: the same seed reproduces the same files
+whatever the number of processes or the order the shards finish in, and
+shards that already exist are skipped, so an interrupted run can simply be
+started again.
+
+    python dataset.py walk data/ --shards 64 --shard-size 1000000 --max-depth 30
+    python dataset.py uniform data/ --shards 8 --seed 7
+
+    >>> samples = np.load('data/walk-00000.npy', mmap_mode='r')
+    >>> samples['facelets'].shape, samples['depth'][:5]
+    ((1000000, 54), memmap([17, 3, 29, 8, 12], dtype=uint8))
+"""
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import cube_state
+import cubie_cube
+
+logger = logging.getLogger(__name__)
+
+SAMPLE = np.dtype([('facelets', np.uint8, (54,)), ('depth', np.uint8)])
+UNKNOWN_DEPTH = 255
+KINDS = ('uniform', 'walk')
+CHUNK = 1 << 16
+# Recorded in the manifest; bump when the samples drawn for a given seed change
+DATASET_VERSION = 2
+
+# Moves of each face, and _NEXT_FACES[last_face, :_NEXT_FACE_COUNTS[last_face]]
+# the faces a walk may turn after last_face (row 6: first move), padded with -1
+_FACE_MOVES = np.arange(18).reshape(6, 3)
+_NEXT_FACES = np.full((7, 6), -1)
+for _last in range(6):
+    _next = [f for f in range(6) if f != _last and f != _last - 3]
+    _NEXT_FACES[_last, :len(_next)] = _next
+_NEXT_FACES[6] = np.arange(6)
+_NEXT_FACE_COUNTS = (_NEXT_FACES >= 0).sum(axis=1)
+
+
+def shard_rng(seed: int, shard: int) -> np.random.Generator:
+    """The generator for one shard, independent of every other shard"""
+    return np.random.default_rng([seed, shard])
+
+
+def uniform_states(n: int, rng: np.random.Generator) -> np.ndarray:
+    """(n, 54) facelets of uniformly random reachable cubes"""
+    return cubie_cube.to_facelets(*cubie_cube.random_cubies(n, rng))
+
+
+def random_walks(walks: int, max_depth: int, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+    """Every state along ``walks`` random walks of ``max_depth`` moves
+
+    Returns (walks * max_depth, 54) facelets and the depth of each, grouped
+    by depth: rows ``d * walks`` to ``(d + 1) * walks`` are at depth ``d + 1``.
+    """
+    states = np.tile(cube_state.solved_state(), (walks, 1))
+    facelets = np.empty((max_depth * walks, 54), dtype=np.uint8)
+    face = np.full(walks, 6)
+    for step in range(max_depth):
+        pick = (rng.random(walks) * _NEXT_FACE_COUNTS[face]).astype(np.intp)
+        face = _NEXT_FACES[face, pick]
+        moves = _FACE_MOVES[face, rng.integers(3, size=walks)]
+        states = np.take_along_axis(states, cube_state.MOVE_TABLE[moves], axis=1)
+        facelets[step * walks:(step + 1) * walks] = states
+    depths = np.repeat(np.arange(1, max_depth + 1, dtype=np.uint8), walks)
+    return facelets, depths
+
+
+def generate_chunks(kind: str, count: int, rng: np.random.Generator, max_depth: int = 30,
+                    chunk: int = CHUNK) -> Iterator[np.ndarray]:
+    """SAMPLE arrays of at most ``chunk`` records, ``count`` in total"""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown kind {kind!r}, expected one of {KINDS}")
+    if not 1 <= max_depth < UNKNOWN_DEPTH:
+        raise ValueError(f"max_depth must be 1..{UNKNOWN_DEPTH - 1}, got {max_depth}")
+    for start in range(0, count, chunk):
+        n = min(chunk, count - start)
+        samples = np.empty(n, dtype=SAMPLE)
+        if kind == 'uniform':
+            samples['facelets'] = uniform_states(n, rng)
+            samples['depth'] = UNKNOWN_DEPTH
+        else:
+            facelets, depths = random_walks(-(-n // max_depth), max_depth, rng)
+            # Mix the depths and drop the surplus of the last walk step
+            order = rng.permutation(len(facelets))[:n]
+            samples['facelets'] = facelets[order]
+            samples['depth'] = depths[order]
+        yield samples
+
+
+def shard_path(directory: str, kind: str, shard: int) -> str:
+    return os.path.join(directory, f"{kind}-{shard:05d}.npy")
+
+
+def write_shard(directory: str, kind: str, shard: int, shard_size: int, seed: int,
+                max_depth: int = 30) -> Tuple[int, str, bool]:
+    """Generate one shard file unless it already exists; returns (shard, path, written)"""
+    path = shard_path(directory, kind, shard)
+    if os.path.exists(path):
+        return shard, path, False
+    tmp = f"{path}.{os.getpid()}.tmp"
+    out = np.lib.format.open_memmap(tmp, mode='w+', dtype=SAMPLE, shape=(shard_size,))
+    try:
+        start = 0
+        for samples in generate_chunks(kind, shard_size, shard_rng(seed, shard), max_depth):
+            out[start:start + len(samples)] = samples
+            start += len(samples)
+        out.flush()
+        out = None  # unmap before the rename
+        os.replace(tmp, path)
+    except BaseException:
+        out = None
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return shard, path, True
+
+
+def _write_shard(args) -> Tuple[int, str, bool]:
+    return write_shard(*args)
+
+
+def generate(directory: str, kind: str = 'walk', shards: int = 1, shard_size: int = 1_000_000,
+             seed: int = 0, max_depth: int = 30, processes: Optional[int] = None) -> Iterator[Tuple[int, str, bool]]:
+    """Write ``shards`` shard files over a process pool, yielding (shard, path, written) as each finishes
+
+    A ``manifest.json`` records the settings; running again with different
+    settings in the same directory raises ValueError instead of mixing
+    incompatible shards.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown kind {kind!r}, expected one of {KINDS}")
+    os.makedirs(directory, exist_ok=True)
+    manifest = {'version': DATASET_VERSION, 'kind': kind, 'shard_size': shard_size, 'seed': seed,
+                'max_depth': max_depth if kind == 'walk' else None,
+                'dtype': SAMPLE.descr, 'unknown_depth': UNKNOWN_DEPTH}
+    _check_manifest(os.path.join(directory, f"{kind}-manifest.json"), manifest)
+    processes = processes or os.cpu_count() or 1
+    jobs = [(directory, kind, shard, shard_size, seed, max_depth) for shard in range(shards)]
+    if processes == 1:
+        yield from map(_write_shard, jobs)
+        return
+    with multiprocessing.Pool(min(processes, shards)) as pool:
+        yield from pool.imap_unordered(_write_shard, jobs)
+
+
+def _check_manifest(path: str, manifest: Dict):
+    manifest = json.loads(json.dumps(manifest))  # tuples to lists, as they come back from disk
+    if os.path.exists(path):
+        with open(path) as f:
+            existing = json.load(f)
+        if existing != manifest:
+            raise ValueError(f"{path} was written with different settings: {existing}")
+        return
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load(directory: str, kind: str = 'walk') -> List[np.ndarray]:
+    """Memory-mapped SAMPLE arrays of every shard in ``directory``, in shard order"""
+    names = sorted(name for name in os.listdir(directory)
+                   if name.startswith(f"{kind}-") and name.endswith('.npy'))
+    return [np.load(os.path.join(directory, name), mmap_mode='r') for name in names]
+
+
+def main(argv: Optional[List[str]] = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate sharded random cube states for training")
+    parser.add_argument('kind', choices=KINDS, help="uniform random states or depth-labelled random walks")
+    parser.add_argument('directory')
+    parser.add_argument('--shards', type=int, default=1)
+    parser.add_argument('--shard-size', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-depth', type=int, default=30, help="walk length (walk only)")
+    parser.add_argument('--processes', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    start = time.perf_counter()
+    written = 0
+    try:
+        for shard, path, new in generate(args.directory, args.kind, args.shards, args.shard_size,
+                                         args.seed, args.max_depth, args.processes):
+            written += new
+            logger.info("%s %s", path, 'written' if new else 'exists, skipped')
+    except ValueError as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - start
+    samples = written * args.shard_size
+    print(f"{written} shards written, {args.shards - written} skipped: {samples} samples in {elapsed:.1f} s "
+          f"({samples / elapsed * 60 / 1e6 if elapsed else 0:.1f}M samples/min)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Lightweight in-process counters and latency histograms.
+
+Cheap enough for hot paths: a counter increment is an integer add and a
+histogram observation is a bisect over fixed log-spaced buckets, so nothing
+allocates and memory does not grow with the number of samples.
+
+    import metrics
+    metrics.counter('moves_applied').inc()
+    with metrics.histogram('draw_time').time():
+        cube.draw()
+    metrics.snapshot()   # {'moves_applied': 1, 'draw_time': {'count': 1, 'p50': ..., ...}}
+
+Everything registers in the module-level REGISTRY; the viewer can show
+``report()`` as an on-screen overlay (F3). Imports only the standard library.
+"""
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Union
+
+# Histogram bucket upper bounds in seconds: 1 us to 10 s, four per decade
+BUCKETS = tuple(10 ** (e / 4) * 1e-6 for e in range(29))
+
+
+class Counter:
+    """Monotonic event count"""
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n: int = 1):
+        self.value += n
+
+    def reset(self):
+        self.value = 0
+
+
+class Histogram:
+    """Latency distribution over fixed buckets, plus exact count, sum, min and max"""
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the wall-clock time spent in the ``with`` block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile (0 < q <= 100), capped at max"""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS + (self.max,), self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'min': self.min if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+
+class Registry:
+    """Named counters and histograms, created on first use"""
+    def __init__(self):
+        self.counters: Dict[str, Counter] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def counter(self, name: str) -> Counter:
+        metric = self.counters.get(name)
+        if metric is None:
+            metric = self.counters[name] = Counter()
+        return metric
+
+    def histogram(self, name: str) -> Histogram:
+        metric = self.histograms.get(name)
+        if metric is None:
+            metric = self.histograms[name] = Histogram()
+        return metric
+
+    def snapshot(self) -> Dict[str, Union[int, Dict[str, float]]]:
+        """Current values: counters as ints, histograms as summary dicts"""
+        values: Dict[str, Union[int, Dict[str, float]]] = {n: c.value for n, c in sorted(self.counters.items())}
+        values.update((n, h.summary()) for n, h in sorted(self.histograms.items()))
+        return values
+
+    def report(self) -> List[str]:
+        """One human-readable line per metric, times in milliseconds"""
+        lines = [f"{name}: {c.value}" for name, c in sorted(self.counters.items())]
+        for name, h in sorted(self.histograms.items()):
+            lines.append(f"{name}: n={h.count} mean={h.mean * 1e3:.2f} p50={h.percentile(50) * 1e3:.2f} "
+                         f"p99={h.percentile(99) * 1e3:.2f} max={h.max * 1e3:.2f} ms")
+        return lines
+
+    def reset(self):
+        for metric in list(self.counters.values()) + list(self.histograms.values()):
+            metric.reset()
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+snapshot = REGISTRY.snapshot
+report = REGISTRY.report
+reset = REGISTRY.reset
@@ -0,0 +1,251 @@
+"""Compile move sequences into a single facelet permutation.
+
+An algorithm string in standard notation is parsed, simplified and fused:
+
+    face turns    U R F D L B          with ', 2 or any count: R3, U2'
+    wide turns    Uw Rw ... or u r ...  two outer layers
+    slice turns   M (as L), E (as D), S (as F)
+    rotations     x (as R), y (as U), z (as F)
+    groups        (R U R' U')3
+
+Turns about the same axis commute, so each run of them collapses to one
+quarter-turn count per layer. Runs that cancel completely disappear, and
+their neighbors can then cancel in turn: ``R L R' L'`` and ``R U U' R'``
+compile to nothing. The simplified run list is composed into one
+54-element gather permutation, so applying an algorithm of any length costs
+one ``state[permutation]``.
+
+    >>> alg = compile_algorithm("R U R' U'")
+    >>> alg.order
+    6
+    >>> state = alg.apply(cube_state.solved_state())
+
+Slice, wide and rotation moves also move the centers.
+"""
+import functools
+import math
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import cube_state
+
+AXES = ((1, 0, 0), (0, 1, 0), (0, 0, 1))  # x (R), y (U), z (F)
+LAYERS = (-1, 0, 1)
+
+# name -> (axis, layers, sign): a clockwise turn of ``name`` is ``sign``
+# quarter turns of ``layers`` about +axis, clockwise seen from the + side
+_MOVES: Dict[str, Tuple[int, Tuple[int, ...], int]] = {
+    'R': (0, (1,), 1), 'L': (0, (-1,), -1), 'M': (0, (0,), -1), 'x': (0, (-1, 0, 1), 1),
+    'U': (1, (1,), 1), 'D': (1, (-1,), -1), 'E': (1, (0,), -1), 'y': (1, (-1, 0, 1), 1),
+    'F': (2, (1,), 1), 'B': (2, (-1,), -1), 'S': (2, (0,), 1), 'z': (2, (-1, 0, 1), 1),
+    'Rw': (0, (0, 1), 1), 'Lw': (0, (-1, 0), -1),
+    'Uw': (1, (0, 1), 1), 'Dw': (1, (-1, 0), -1),
+    'Fw': (2, (0, 1), 1), 'Bw': (2, (-1, 0), -1),
+}
+for _face in 'RLUDFB':
+    _MOVES[_face.lower()] = _MOVES[_face + 'w']
+
+_TOKEN = re.compile(r"\s*(?:(\()|(\))(\d*)('?)|([URFDLB]w|[URFDLBMESxyzurfdlb])(\d*)('?))")
+_SUFFIX = {1: '', 2: '2', 3: "'"}
+
+
+def _quarter_permutations() -> np.ndarray:
+    """[axis, layer + 1] -> gather permutation for one clockwise quarter turn"""
+    return np.array([[cube_state.layer_turn_permutation(axis, (layer,)) for layer in LAYERS] for axis in AXES])
+
+
+_QUARTER = _quarter_permutations()
+
+
+def _power(perm: np.ndarray, k: int) -> np.ndarray:
+    """perm applied k times (k may be negative)"""
+    if k < 0:
+        perm, k = np.argsort(perm), -k
+    result = np.arange(len(perm))
+    while k:
+        if k & 1:
+            result = result[perm]
+        perm = perm[perm]
+        k >>= 1
+    return result
+
+
+def _parse(notation: str) -> List[Tuple[int, Tuple[int, ...], int]]:
+    """Flat list of (axis, layers, quarter turns about +axis)"""
+    stack: List[list] = [[]]
+    pos = 0
+    notation = notation.strip()
+    while pos < len(notation):
+        match = _TOKEN.match(notation, pos)
+        if not match:
+            bad = notation[pos:].split()[0]
+            raise ValueError(f"Invalid move: {bad}")
+        pos = match.end()
+        opening, closing, group_count, group_prime, name, count, prime = match.groups()
+        if opening:
+            stack.append([])
+        elif closing:
+            if len(stack) == 1:
+                raise ValueError("Unbalanced ')' in algorithm")
+            group = stack.pop()
+            times = int(group_count or 1)
+            if group_prime:
+                group = [(axis, layers, -q) for axis, layers, q in reversed(group)]
+            stack[-1].extend(group * times)
+        else:
+            axis, layers, sign = _MOVES[name]
+            quarters = sign * int(count or 1) * (-1 if prime else 1)
+            stack[-1].append((axis, layers, quarters))
+    if len(stack) != 1:
+        raise ValueError("Unbalanced '(' in algorithm")
+    return stack[0]
+
+
+def _simplify(moves: Sequence[Tuple[int, Tuple[int, ...], int]]) -> List[Tuple[int, Tuple[int, int, int]]]:
+    """Collapse same-axis runs into (axis, quarter turns per layer), dropping runs that cancel"""
+    runs: List[Tuple[int, List[int]]] = []
+    for axis, layers, quarters in moves:
+        if not runs or runs[-1][0] != axis:
+            runs.append((axis, [0, 0, 0]))
+        counts = runs[-1][1]
+        for layer in layers:
+            counts[layer + 1] = (counts[layer + 1] + quarters) % 4
+        if not any(counts):
+            runs.pop()
+    return [(axis, tuple(counts)) for axis, counts in runs]
+
+
+def _run_names(axis: int, counts: Tuple[int, int, int]) -> List[str]:
+    """Notation for one run, using rotations and wide turns where they fit"""
+    plus, minus, middle, rotation = [('R', 'L', 'M', 'x'), ('U', 'D', 'E', 'y'), ('F', 'B', 'S', 'z')][axis]
+    low, mid, high = counts
+    if low == mid == high:
+        return [rotation + _SUFFIX[high]]
+    names = []
+    if mid and mid == high:
+        names.append(plus + 'w' + _SUFFIX[high])
+        low_left, mid, high = low, 0, 0
+    elif mid and mid == low:
+        names.append(minus + 'w' + _SUFFIX[-low % 4])
+        low_left, mid = 0, 0
+    else:
+        low_left = low
+    if high:
+        names.append(plus + _SUFFIX[high])
+    if low_left:
+        names.append(minus + _SUFFIX[-low_left % 4])
+    if mid:
+        # M follows L and E follows D; S follows F
+        names.append(middle + _SUFFIX[mid if axis == 2 else -mid % 4])
+    return names
+
+
+class Algorithm:
+    """A compiled move sequence: simplified moves plus one fused permutation"""
+    def __init__(self, runs: Optional[Sequence[Tuple[int, Tuple[int, int, int]]]], permutation: np.ndarray):
+        # None when only the permutation is known (see from_permutation)
+        self.runs = None if runs is None else tuple(runs)
+        self.permutation = permutation
+        self.permutation.flags.writeable = False
+
+    @classmethod
+    def from_permutation(cls, permutation: np.ndarray) -> 'Algorithm':
+        return cls(None, np.array(permutation, dtype=np.intp))
+
+    @property
+    def moves(self) -> List[str]:
+        """Simplified sequence in notation; raises ValueError for a bare permutation"""
+        if self.runs is None:
+            raise ValueError("Algorithm was built from a permutation and has no move sequence")
+        return [name for axis, counts in self.runs for name in _run_names(axis, counts)]
+
+    @property
+    def face_moves(self) -> List[int]:
+        """cube_state.MOVE_TABLE indices for the simplified sequence
+
+        Raises ValueError if it contains slice, wide or rotation moves.
+        """
+        return cube_state.parse_moves(' '.join(self.moves))
+
+    def __str__(self) -> str:
+        return '<permutation>' if self.runs is None else ' '.join(self.moves)
+
+    def __repr__(self) -> str:
+        return f"Algorithm({str(self)!r})"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Algorithm) and np.array_equal(self.permutation, other.permutation)
+
+    def __hash__(self) -> int:
+        return hash(self.permutation.tobytes())
+
+    def apply(self, state: np.ndarray) -> np.ndarray:
+        """``state`` after the algorithm; ``state`` may be (54,) or (N, 54)"""
+        return state[..., self.permutation]
+
+    def then(self, other: 'Algorithm') -> 'Algorithm':
+        """This algorithm followed by ``other``"""
+        runs = None
+        if self.runs is not None and other.runs is not None:
+            runs = _simplify(_expand(self.runs) + _expand(other.runs))
+        return Algorithm(runs, self.permutation[other.permutation])
+
+    def inverse(self) -> 'Algorithm':
+        runs = None
+        if self.runs is not None:
+            runs = [(axis, tuple(-q % 4 for q in counts)) for axis, counts in reversed(self.runs)]
+        return Algorithm(runs, np.argsort(self.permutation))
+
+    def power(self, k: int) -> 'Algorithm':
+        """The algorithm repeated k times (the inverse repeated for k < 0), by repeated squaring
+
+        Only the permutation is computed; the result has no move sequence.
+        """
+        return Algorithm(None, _power(self.permutation, k))
+
+    def cycles(self) -> List[List[int]]:
+        """Facelet cycles of length > 1"""
+        seen = np.zeros(54, dtype=bool)
+        cycles = []
+        for start in range(54):
+            if seen[start]:
+                continue
+            cycle = []
+            i = start
+            while not seen[i]:
+                seen[i] = True
+                cycle.append(i)
+                i = int(self.permutation[i])
+            if len(cycle) > 1:
+                cycles.append(cycle)
+        return cycles
+
+    @property
+    def order(self) -> int:
+        """How many repetitions return every sticker to where it started"""
+        return math.lcm(1, *(len(c) for c in self.cycles()))
+
+
+def _expand(runs) -> List[Tuple[int, Tuple[int, ...], int]]:
+    return [(axis, (layer,), q) for axis, counts in runs for layer, q in zip(LAYERS, counts) if q]
+
+
+def _compose(runs) -> np.ndarray:
+    perm = np.arange(54)
+    for axis, counts in runs:
+        for layer, quarters in zip(LAYERS, counts):
+            if quarters:
+                perm = perm[_power(_QUARTER[axis, layer + 1], quarters)]
+    return perm
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_algorithm(notation: str) -> Algorithm:
+    """Parse, simplify and fuse an algorithm string; raises ValueError on bad notation
+
+    Results are cached, so compiling the same string again is a dict lookup.
+    """
+    runs = _simplify(_parse(notation))
+    return Algorithm(runs, _compose(runs))
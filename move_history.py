@@ -0,0 +1,139 @@
+"""Move history with undo/redo and checkpointed seeking.
+
+A MoveHistory records every move applied to a 3x3x3 cube as one byte and
+keeps the current facelet state. Undo applies the inverse of the last move
+and redo re-applies the next one, one gather each; recording a new move
+after an undo drops the redo tail, as in an editor.
+
+Every ``interval`` plies the state is also stored as a 9-byte state_codec
+record, so seeking to any ply decodes the nearest checkpoint at or before
+it and replays fewer than ``interval`` moves, however long the session:
+
+    session          moves      checkpoints (interval 64)
+    10**6 moves      1 MB       141 KB
+
+    >>> history = MoveHistory()
+    >>> history.extend(parse_moves("R U R' U'"))
+    >>> history.undo()                 # U, the move that undid U'
+    >>> history.seek(1)                # state after R
+    >>> history.seek(len(history))     # back to the end, redo tail included
+
+This module is headless; the viewer binds it to keys and a scrub slider.
+"""
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+import cube_state
+import state_codec
+
+_RECORD_SIZE = state_codec.RECORD.itemsize
+
+
+class MoveHistory:
+    """Recorded moves, a position within them and the state at that position"""
+    def __init__(self, state: Optional[np.ndarray] = None, interval: int = 64):
+        if interval < 1:
+            raise ValueError(f"interval must be at least 1, got {interval}")
+        self.interval = interval
+        self.position = 0
+        self._state = cube_state.solved_state() if state is None else cube_state.normalize_centers(state)
+        self._moves = bytearray()
+        # Records of the states at plies 0, interval, 2 * interval, ... up to len(self)
+        self._checkpoints = bytearray(state_codec.to_bytes(self._state))
+
+    def __len__(self) -> int:
+        """Number of recorded moves, including any that were undone"""
+        return len(self._moves)
+
+    @property
+    def state(self) -> np.ndarray:
+        """Facelets at the current position"""
+        return self._state.copy()
+
+    @property
+    def can_undo(self) -> bool:
+        return self.position > 0
+
+    @property
+    def can_redo(self) -> bool:
+        return self.position < len(self._moves)
+
+    def moves(self, start: int = 0, stop: Optional[int] = None) -> List[int]:
+        """Recorded moves from ply ``start`` to ``stop`` (default: the current position)"""
+        return list(self._moves[start:self.position if stop is None else stop])
+
+    def record(self, move: int):
+        """Apply ``move`` at the current position, dropping anything that was undone"""
+        self.extend((move,))
+
+    def extend(self, moves: Iterable[int]):
+        """Apply and record a sequence of moves
+
+        Long sequences are replayed one checkpoint interval at a time with
+        cube_state.apply_moves and the checkpoints encoded in one batch, so
+        loading a long session is cheap.
+        """
+        self._truncate()
+        moves = np.fromiter(moves, dtype=np.uint8)
+        if moves.size and moves.max() >= len(cube_state.MOVE_TABLE):
+            raise ValueError("Moves must be cube_state.MOVE_TABLE indices")
+        start = 0
+        checkpoints = []
+        while start < len(moves):
+            # Up to the next multiple of the interval, where a checkpoint is due
+            stop = min(len(moves), start + self.interval - self.position % self.interval)
+            self._state = cube_state.apply_moves(self._state, moves[start:stop].astype(np.intp))
+            self.position += stop - start
+            if self.position % self.interval == 0:
+                checkpoints.append(self._state)
+            start = stop
+        self._moves += moves.tobytes()
+        if checkpoints:
+            self._checkpoints += state_codec.encode(np.array(checkpoints)).tobytes()
+
+    def undo(self) -> Optional[int]:
+        """Step back one ply; returns the inverse move that was applied, or None at the start"""
+        if not self.can_undo:
+            return None
+        self.position -= 1
+        move = int(cube_state.INVERSE_MOVE[self._moves[self.position]])
+        self._state = self._state[cube_state.MOVE_TABLE[move]]
+        return move
+
+    def redo(self) -> Optional[int]:
+        """Step forward one ply; returns the move that was applied, or None at the end"""
+        if not self.can_redo:
+            return None
+        move = self._moves[self.position]
+        self.position += 1
+        self._state = self._state[cube_state.MOVE_TABLE[move]]
+        return move
+
+    def seek(self, ply: int) -> np.ndarray:
+        """Move to ``ply`` (0..len(self)) and return the state there
+
+        Replays from the current position when that is at or past the
+        nearest checkpoint, and from the checkpoint otherwise, so at most
+        ``interval - 1`` moves are applied.
+        """
+        if not 0 <= ply <= len(self._moves):
+            raise IndexError(f"ply {ply} is outside the history (0..{len(self._moves)})")
+        checkpoint = ply // self.interval
+        if not checkpoint * self.interval <= self.position <= ply:
+            offset = checkpoint * _RECORD_SIZE
+            self._state = state_codec.from_bytes(bytes(self._checkpoints[offset:offset + _RECORD_SIZE]))
+            self.position = checkpoint * self.interval
+        replay = np.frombuffer(self._moves, dtype=np.uint8, count=ply - self.position, offset=self.position)
+        self._state = cube_state.apply_moves(self._state, replay.astype(np.intp))
+        self.position = ply
+        return self.state
+
+    def clear(self, state: Optional[np.ndarray] = None):
+        """Forget every move and start again from ``state`` (default: the current state)"""
+        self.__init__(self._state if state is None else state, self.interval)
+
+    def _truncate(self):
+        """Drop the redo tail and the checkpoints that belong to it"""
+        del self._moves[self.position:]
+        del self._checkpoints[(self.position // self.interval + 1) * _RECORD_SIZE:]
@@ -0,0 +1,214 @@
+"""N x N x N cubes stored as six N x N face arrays.
+
+``faces[f, row, col]`` is the color of a sticker, with faces in URFDLB order
+and each face laid out as in cube_state's net, so for N = 3
+``faces.reshape(-1)`` is exactly a cube_state facelet array.
+
+A layer turn touches only what it has to: the 4N stickers in the ring
+around the layer move with one gather through a cached index array, and an
+outer layer also rotates its face with np.rot90. That is O(N) per inner
+slice and O(N^2) per outer face, with no per-cubie objects; a 100 x 100 x 100
+cube is a 60,000-byte array. Ring indices are derived from the same 3D
+sticker geometry as cube_state and built lazily per (face, depth).
+
+Notation: ``R``, ``R'``, ``R2`` turn the outer layer; ``3R`` turns only the
+third layer from the right; ``Rw`` turns the outer two layers and ``3Rw``
+the outer three; ``x``, ``y``, ``z`` turn the whole cube.
+"""
+import random
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import cube_state
+from cube_state import FACE_NORMALS, FACES
+
+# Opposite face of each face id: U-D, R-L, F-B
+OPPOSITE = (3, 4, 5, 0, 1, 2)
+
+_TOKEN = re.compile(r"^(\d*)([URFDLB])(w?)(\d*)('?)$|^([xyz])(\d*)('?)$")
+_ROTATION_FACE = {'x': 1, 'y': 0, 'z': 2}
+
+# (face, first depth, last depth, clockwise quarter turns)
+Move = Tuple[int, int, int, int]
+
+
+def _face_frames(n: int) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Per face: doubled coordinates of facelet (0, 0), and the column and row step directions"""
+    frames = []
+    for start, col_step, row_step in cube_state._FACE_LAYOUT:
+        frames.append((np.array(start) * (n - 1), np.array(col_step), np.array(row_step)))
+    return frames
+
+
+class NxNCube:
+    """N x N x N cube state with layer turns"""
+    def __init__(self, n: int, faces: Optional[np.ndarray] = None):
+        if n < 1:
+            raise ValueError(f"Cube size must be at least 1, got {n}")
+        self.n = n
+        if faces is None:
+            faces = np.repeat(np.arange(6, dtype=np.uint8), n * n).reshape(6, n, n)
+        self.faces = np.array(faces, dtype=np.uint8).reshape(6, n, n)
+        self._frames = _face_frames(n)
+        self._rings: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]] = {}
+
+    def copy(self) -> 'NxNCube':
+        cube = NxNCube(self.n, self.faces)
+        cube._rings = self._rings
+        return cube
+
+    @property
+    def facelets(self) -> np.ndarray:
+        """Flat view of the stickers, (6 * N * N,)"""
+        return self.faces.reshape(-1)
+
+    # -- geometry ---------------------------------------------------------
+
+    @property
+    def face_frames(self) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Per face: doubled coordinates of sticker (0, 0), and the column and row step directions"""
+        return self._frames
+
+    def layer_indices(self, face: int, depth: int = 0) -> np.ndarray:
+        """Flat indices of every sticker that a turn of this layer moves"""
+        n = self.n
+        if not 0 <= depth < n:
+            raise ValueError(f"Depth {depth} is outside a {n}x{n}x{n} cube")
+        parts = [self._ring(face, depth)[1]]
+        if depth == 0:
+            parts.append(np.arange(face * n * n, (face + 1) * n * n))
+        if depth == n - 1:
+            opposite = OPPOSITE[face]
+            parts.append(np.arange(opposite * n * n, (opposite + 1) * n * n))
+        return np.unique(np.concatenate(parts))
+
+    def _index(self, positions: np.ndarray, normals: np.ndarray) -> np.ndarray:
+        """Flat sticker index for doubled cubie positions and outward normals"""
+        n = self.n
+        faces = np.array([FACE_NORMALS.index(tuple(int(v) for v in normal)) for normal in normals])
+        out = np.empty(len(positions), dtype=np.intp)
+        for face in np.unique(faces):
+            rows = faces == face
+            start, col_step, row_step = self._frames[face]
+            offset = positions[rows] - start
+            out[rows] = face * n * n + (offset @ row_step) // 2 * n + (offset @ col_step) // 2
+        return out
+
+    def _ring(self, face: int, depth: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(destination, source) flat indices moving the ring of a layer one clockwise quarter turn"""
+        key = (face, depth)
+        ring = self._rings.get(key)
+        if ring is not None:
+            return ring
+        n = self.n
+        axis = np.array(FACE_NORMALS[face])
+        level = (n - 1) - 2 * depth
+        positions, normals = [], []
+        for side, normal in enumerate(FACE_NORMALS):
+            if side == face or side == OPPOSITE[face]:
+                continue
+            start, col_step, row_step = self._frames[side]
+            # One of the steps runs along the axis; the stickers at this level form a line
+            k = np.arange(n)
+            if col_step @ axis:
+                col = (level - start @ axis) // (2 * (col_step @ axis))
+                points = start + 2 * col * col_step + 2 * k[:, None] * row_step
+            else:
+                row = (level - start @ axis) // (2 * (row_step @ axis))
+                points = start + 2 * row * row_step + 2 * k[:, None] * col_step
+            positions.append(points)
+            normals.append(np.tile(normal, (n, 1)))
+        positions = np.concatenate(positions)
+        normals = np.concatenate(normals)
+        rotation = cube_state._quarter_turn_matrix(FACE_NORMALS[face])
+        source = self._index(positions, normals)
+        destination = self._index(positions @ rotation.T, normals @ rotation.T)
+        ring = self._rings[key] = (destination, source)
+        return ring
+
+    # -- turns ------------------------------------------------------------
+
+    def turn(self, face: int, depth: int = 0, quarters: int = 1):
+        """Turn one layer, ``depth`` layers in from ``face``, clockwise seen from that face"""
+        n = self.n
+        if not 0 <= depth < n:
+            raise ValueError(f"Depth {depth} is outside a {n}x{n}x{n} cube")
+        quarters %= 4
+        if not quarters:
+            return
+        destination, source = self._ring(face, depth)
+        flat = self.faces.reshape(-1)
+        for _ in range(quarters):
+            flat[destination] = flat[source]
+        if depth == 0:
+            self.faces[face] = np.rot90(self.faces[face], -quarters)
+        if depth == n - 1:
+            # Seen from the opposite face the same turn is counter-clockwise
+            opposite = OPPOSITE[face]
+            self.faces[opposite] = np.rot90(self.faces[opposite], quarters)
+
+    def apply(self, move: Move):
+        face, first, last, quarters = move
+        for depth in range(first, last + 1):
+            self.turn(face, depth, quarters)
+
+    def apply_move(self, move: int):
+        """One of the 18 outer face turns, as a cube_state.MOVE_TABLE index"""
+        face, power = divmod(move, 3)
+        self.turn(face, 0, power + 1)
+
+    def apply_moves(self, moves):
+        for move in moves:
+            self.apply_move(move)
+
+    def parse(self, notation: str) -> List[Move]:
+        """Moves for a string such as "R 2U' 3Rw2 x"; raises ValueError on bad notation"""
+        moves = []
+        for token in notation.split():
+            match = _TOKEN.match(token)
+            if not match:
+                raise ValueError(f"Invalid move: {token}")
+            layer, letter, wide, count, prime, rotation, rotation_count, rotation_prime = match.groups()
+            if rotation:
+                face, first, last = _ROTATION_FACE[rotation], 0, self.n - 1
+                count, prime = rotation_count, rotation_prime
+            else:
+                face = FACES.index(letter)
+                depth = int(layer or (2 if wide else 1))
+                if not 1 <= depth <= self.n:
+                    raise ValueError(f"Invalid move for a {self.n}x{self.n}x{self.n} cube: {token}")
+                first, last = (0 if wide else depth - 1), depth - 1
+            quarters = int(count or 1) * (-1 if prime else 1)
+            moves.append((face, first, last, quarters % 4))
+        return moves
+
+    def apply_algorithm(self, notation: str):
+        for move in self.parse(notation):
+            self.apply(move)
+
+    def scramble(self, num_moves: Optional[int] = None, rng: Optional[random.Random] = None) -> List[Move]:
+        """Random single-layer turns (default 20 for 3x3, growing with N) applied to the cube"""
+        rng = rng or random
+        if num_moves is None:
+            num_moves = max(20, 10 * self.n)
+        moves = [(rng.randrange(6), depth, depth, rng.randrange(1, 4))
+                 for depth in (rng.randrange(self.n) for _ in range(num_moves))]
+        for move in moves:
+            self.apply(move)
+        return moves
+
+    def is_solved(self) -> bool:
+        """True if every face shows a single color"""
+        flat = self.faces.reshape(6, -1)
+        return bool((flat == flat[:, :1]).all())
+
+    def format_move(self, move: Move) -> str:
+        face, first, last, quarters = move
+        suffix = {1: '', 2: '2', 3: "'"}[quarters % 4]
+        if first == 0 and last == self.n - 1:
+            return f"{FACES[face]}w{suffix}" if self.n <= 2 else f"{last + 1}{FACES[face]}w{suffix}"
+        if first == 0 and last > 0:
+            return f"{'' if last == 1 else last + 1}{FACES[face]}w{suffix}"
+        return f"{'' if first == 0 else first + 1}{FACES[face]}{suffix}"
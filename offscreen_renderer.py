@@ -0,0 +1,276 @@
+"""Headless cube images: batches of states to RGBA arrays or PNG files.
+
+No window, GL context or display is needed. For a given view and size, the
+renderer ray-casts the cube once, using the viewer's geometry (cubies of
+size 0.95 at the cube_state facelet positions), its default view rotation
+and its colors. For every pixel it records which facelet, black cubie body
+or background each antialiasing sample hits. Drawing a batch of states is
+then a gather through that map:
+
+    pure pixels     every sample hits the same thing: one packed RGBA lookup
+    edge pixels     a few percent of the image: average of the samples
+
+so one precomputed map serves the whole batch, the way one GL framebuffer
+would. PNGs are encoded with zlib from the standard library.
+
+    iso   the viewer's 3D view (orthographic), U, F and R visible
+    net   the flat URFDLB net of cube_state's docstring, 12 x 9 stickers
+
+    >>> renderer = OffscreenRenderer(size=256)
+    >>> images = renderer.render(batch.states)      # (N, 256, 256, 4) uint8 RGBA
+    >>> renderer.save(state, 'case.png')
+    >>> renderer.export(batch.states, 'previews/')  # previews/cube-000000.png, ...
+
+    python offscreen_renderer.py scrambles.txt -o previews/ --size 256 --view net
+"""
+import os
+import struct
+import zlib
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import cube_state
+from cube_state import COLORS, FACE_COLORS
+
+VIEWS = ('iso', 'net')
+# Extra color ids after the six face ids, for the cubie body and the background
+_BODY, _BACKGROUND = 6, 7
+# Normal id of samples that are not shaded (net stickers, background)
+_FLAT = 6
+# Light direction of the viewer (cube_renderer.begin_frame)
+_LIGHT = np.array([2.0, 4.0, 5.0]) / np.linalg.norm([2.0, 4.0, 5.0])
+# Half the width of a cubie (size 0.95) and of the outer surface of the cube
+_CUBIE_HALF = 0.475
+_SURFACE = 1 + _CUBIE_HALF
+
+
+def encode_png(image: np.ndarray, level: int = 6) -> bytes:
+    """(H, W, 4) RGBA or (H, W, 3) RGB uint8 image as PNG file bytes"""
+    height, width, channels = image.shape
+    color_type = {3: 2, 4: 6}[channels]
+    # Every scanline starts with filter type 0 (none)
+    raw = np.zeros((height, width * channels + 1), dtype=np.uint8)
+    raw[:, 1:] = image.reshape(height, -1)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), level))
+            + chunk(b'IEND', b''))
+
+
+def _rotation(rotation_x: float, rotation_y: float) -> np.ndarray:
+    """Modelview rotation of glRotatef(rotation_x, 1, 0, 0) then glRotatef(rotation_y, 0, 1, 0)"""
+    ax, ay = np.radians(rotation_x), np.radians(rotation_y)
+    rx = np.array([[1, 0, 0], [0, np.cos(ax), -np.sin(ax)], [0, np.sin(ax), np.cos(ax)]])
+    ry = np.array([[np.cos(ay), 0, np.sin(ay)], [0, 1, 0], [-np.sin(ay), 0, np.cos(ay)]])
+    return rx @ ry
+
+
+def _facelet_lookup() -> np.ndarray:
+    """Facelet index by base-3 digits of (position + 1, normal + 1), as in cube_symmetry"""
+    geometry = np.hstack([cube_state.FACELET_POSITIONS, cube_state.FACELET_NORMALS]).astype(int)
+    lookup = np.full(3 ** 6, -1, dtype=np.intp)
+    lookup[(geometry + 1) @ 3 ** np.arange(6)] = np.arange(54)
+    return lookup
+
+
+def iso_samples(size: int, rotation: np.ndarray, sticker: float) -> Tuple[np.ndarray, np.ndarray]:
+    """(slot, normal id) of every sample of a ``size`` x ``size`` orthographic view
+
+    Slots are facelet indices 0..53, 54 for the cubie body and 55 for the
+    background; normal ids index cube_state.FACE_NORMALS (6: none).
+    """
+    # Pixel centers, top row first, framing the cube's bounding sphere
+    extent = _SURFACE * np.sqrt(3) * 1.04
+    coords = (np.arange(size) + 0.5) / size * 2 - 1
+    x, y = np.meshgrid(coords * extent, -coords * extent)
+    eye = np.stack([x.ravel(), y.ravel(), np.full(x.size, 10.0)], axis=1)
+    # Into cube coordinates: the rotation is orthogonal, so its inverse is its transpose
+    origins = eye @ rotation
+    direction = np.array([0.0, 0.0, -1.0]) @ rotation
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t1 = (-_SURFACE - origins) / direction
+        t2 = (_SURFACE - origins) / direction
+    near = np.minimum(t1, t2)
+    t_near, t_far = near.max(axis=1), np.maximum(t1, t2).min(axis=1)
+    hit = t_near <= t_far
+    axis = near.argmax(axis=1)
+    rows = np.arange(len(axis))
+    points = origins + t_near[:, None] * direction
+    # The face hit, the cubie under the point and the offset from its center
+    normals = np.zeros((len(axis), 3), dtype=int)
+    normals[rows, axis] = -np.sign(direction[axis]).astype(int)
+    cells = np.clip(np.rint(points), -1, 1).astype(int)
+    cells[rows, axis] = normals[rows, axis]
+    offsets = np.abs(points - cells)
+    offsets[rows, axis] = 0
+    on_sticker = hit & (offsets.max(axis=1) < _CUBIE_HALF * sticker)
+
+    slots = np.where(hit, 54, 55)
+    digits = 3 ** np.arange(6)
+    slots[on_sticker] = _facelet_lookup()[(np.hstack([cells, normals])[on_sticker] + 1) @ digits]
+    normal_ids = np.full(len(axis), _FLAT)
+    face_of = {normal: face for face, normal in enumerate(cube_state.FACE_NORMALS)}
+    normal_ids[hit] = [face_of[tuple(n)] for n in normals[hit].tolist()]
+    return slots.reshape(size, size), normal_ids.reshape(size, size)
+
+
+# Top-left sticker cell of each face in the 12 x 9 net, in FACES order
+_NET_ORIGINS = ((0, 3), (3, 6), (3, 3), (6, 3), (3, 0), (3, 9))
+
+
+def net_samples(cell: int, sticker: float) -> Tuple[np.ndarray, np.ndarray]:
+    """(slot, normal id) of every sample of the flat net, ``cell`` samples per sticker"""
+    grid = np.full((9, 12), 55)
+    for face, (row, col) in enumerate(_NET_ORIGINS):
+        grid[row:row + 3, col:col + 3] = 9 * face + np.arange(9).reshape(3, 3)
+    slots = np.repeat(np.repeat(grid, cell, axis=0), cell, axis=1)
+    # Black border around each sticker
+    offset = np.abs((np.arange(cell) + 0.5) / cell - 0.5) * 2
+    inside = offset < sticker
+    border = ~(inside[:, None] & inside[None, :])
+    border = np.tile(border, (9, 12))
+    slots[border & (slots != 55)] = 54
+    return slots, np.full(slots.shape, _FLAT)
+
+
+def _per_pixel(samples: np.ndarray, antialias: int) -> np.ndarray:
+    """(H * a, W * a) samples -> (H * W, a * a), one row per output pixel"""
+    height, width = samples.shape[0] // antialias, samples.shape[1] // antialias
+    return samples.reshape(height, antialias, width, antialias).transpose(0, 2, 1, 3).reshape(height * width, -1)
+
+
+class OffscreenRenderer:
+    """Renders batches of facelet states to RGBA images through one precomputed sample map"""
+    def __init__(self, size: int = 256, view: str = 'iso', rotation_x: float = 20.0, rotation_y: float = -45.0,
+                 antialias: int = 2, background: Sequence[float] = (0, 0, 0, 0), sticker: float = 0.9,
+                 shade: float = 0.2):
+        if view not in VIEWS:
+            raise ValueError(f"Unknown view {view!r}, expected one of {VIEWS}")
+        if size < 12 or antialias < 1:
+            raise ValueError("size must be at least 12 and antialias at least 1")
+        self.view = view
+        if view == 'iso':
+            rotation = _rotation(rotation_x, rotation_y)
+            slots, normals = iso_samples(size * antialias, rotation, sticker)
+        else:
+            slots, normals = net_samples(size // 12 * antialias, sticker)
+            rotation = np.eye(3)
+        height, width = slots.shape[0] // antialias, slots.shape[1] // antialias
+        self.shape = (height, width)
+        slots, normals = _per_pixel(slots, antialias), _per_pixel(normals, antialias)
+
+        # Color of (color id, normal id): the viewer's palette, dimmed on faces turned from the light
+        palette = np.array(list(FACE_COLORS) + [COLORS['black'], tuple(background)], dtype=np.float64)
+        eye_normals = np.array(cube_state.FACE_NORMALS, dtype=np.float64) @ rotation.T
+        brightness = np.append(1 - shade * (1 - np.clip(eye_normals @ _LIGHT, 0, 1)), 1.0)
+        table = palette[:, None, :].repeat(len(brightness), axis=1)
+        table[:_BACKGROUND, :, :3] *= brightness[None, :, None]
+        # Packed RGBA, so a pixel is one uint32 gather
+        self._table = np.rint(table * 255).astype(np.uint8).view(np.uint32)[..., 0]
+
+        # Every sample hits one of a few dozen (slot, normal) pairs; a state
+        # gives each pair a color, and the images are gathers of those colors
+        pairs, pair_ids = np.unique(slots * len(brightness) + normals, return_inverse=True)
+        pair_ids = pair_ids.reshape(slots.shape)
+        self._pair_slots, self._pair_normals = np.divmod(pairs, len(brightness))
+        pure = (pair_ids == pair_ids[:, :1]).all(axis=1)
+        self._pure, self._pure_pairs = np.flatnonzero(pure), pair_ids[pure, 0]
+        self._mixed, self._mixed_pairs = np.flatnonzero(~pure), pair_ids[~pure]
+        self._samples = slots.shape[1]
+        # Channel sums of up to 257 samples fit in uint16 (antialias <= 16)
+        self._sum_dtype = np.uint16 if self._samples * 255 < 1 << 16 else np.uint32
+
+    def render(self, states: np.ndarray) -> np.ndarray:
+        """(N, H, W, 4) uint8 RGBA images of (N, 54) facelet states (or one (H, W, 4) image of one state)"""
+        states = np.asarray(states, dtype=np.uint8)
+        single = states.ndim == 1
+        states = states.reshape(-1, 54)
+        # Color id of every slot: the state's facelets, then body and background
+        colors = np.empty((len(states), 56), dtype=np.intp)
+        colors[:, :54] = states
+        colors[:, 54], colors[:, 55] = _BODY, _BACKGROUND
+        pair_colors = self._table[colors[:, self._pair_slots], self._pair_normals]
+        images = np.empty((len(states), self.shape[0] * self.shape[1]), dtype=np.uint32)
+        images[:, self._pure] = pair_colors[:, self._pure_pairs]
+        if len(self._mixed):
+            samples = pair_colors[:, self._mixed_pairs][..., None].view(np.uint8)
+            total = samples.sum(axis=2, dtype=self._sum_dtype)
+            mixed = ((total + self._samples // 2) // self._samples).astype(np.uint8)
+            images[:, self._mixed] = mixed.view(np.uint32)[..., 0]
+        images = images.view(np.uint8).reshape((len(states),) + self.shape + (4,))
+        return images[0] if single else images
+
+    def png(self, state: np.ndarray, level: int = 6) -> bytes:
+        """PNG file bytes of one state"""
+        return encode_png(self.render(np.asarray(state).reshape(54)), level)
+
+    def save(self, state: np.ndarray, path: str, level: int = 6):
+        with open(path, 'wb') as f:
+            f.write(self.png(state, level))
+
+    def export(self, states: np.ndarray, directory: str, prefix: str = 'cube', start: int = 0,
+               chunk: int = 256, level: int = 6) -> List[str]:
+        """Write ``{prefix}-{index:06d}.png`` for every state, rendering ``chunk`` at a time"""
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for offset in range(0, len(states), chunk):
+            for i, image in enumerate(self.render(states[offset:offset + chunk])):
+                path = os.path.join(directory, f"{prefix}-{start + offset + i:06d}.png")
+                with open(path, 'wb') as f:
+                    f.write(encode_png(image, level))
+                paths.append(path)
+        return paths
+
+
+def main(argv: Optional[List[str]] = None):
+    import argparse
+    import sys
+    import time
+
+    import batch_solve
+
+    parser = argparse.ArgumentParser(description="Render cube states to PNG files without a display")
+    parser.add_argument('input', nargs='?', default='-',
+                        help="scrambles or facelet strings, one per line, or a state_codec file ('-': stdin)")
+    parser.add_argument('-o', '--output', default='images', help="output directory (default: images)")
+    parser.add_argument('--npy', default=None, help="also save all images as one (N, H, W, 4) .npy array")
+    parser.add_argument('--size', type=int, default=256)
+    parser.add_argument('--view', choices=VIEWS, default='iso')
+    parser.add_argument('--antialias', type=int, default=2)
+    parser.add_argument('--prefix', default='cube')
+    args = parser.parse_args(argv)
+
+    import state_codec
+    if args.input != '-' and not os.path.isfile(args.input):
+        parser.error(f"{args.input}: no such file")
+    try:
+        states = state_codec.decode(state_codec.open_states(args.input))
+    except (OSError, state_codec.StateFileError):
+        source = sys.stdin if args.input == '-' else open(args.input)
+        rows = []
+        with source:
+            for number, line in enumerate(source, 1):
+                if line.strip():
+                    try:
+                        rows.append(batch_solve.parse_scramble(line)[1])
+                    except ValueError as e:
+                        parser.error(f"line {number}: {e}")
+        states = np.array(rows, dtype=np.uint8).reshape(-1, 54)
+
+    start = time.perf_counter()
+    renderer = OffscreenRenderer(args.size, args.view, antialias=args.antialias)
+    renderer.export(states, args.output, args.prefix)
+    if args.npy:
+        np.save(args.npy, renderer.render(states))
+    elapsed = time.perf_counter() - start
+    print(f"{len(states)} images in {elapsed:.2f} s ({len(states) / elapsed if elapsed else 0:.0f}/s)",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,476 @@
+"""Optimal (shortest) solutions: IDA* over pattern databases, after Korf (1997).
+
+The heuristic is the largest of three exact distances in simplified puzzles:
+
+    corners      all 8 corners, position and twist      88,179,840 states
+    edges A      edges UR UF UL UB DR DF, position+flip  42,577,920 states
+    edges B      edges DL DB FR FL BL BR                42,577,920 states
+
+Each pattern database stores the distance of every state of its puzzle to
+the solved one, 4 bits per entry (no distance exceeds 11), so the three
+take 88 MB. They are generated by breadth-first search from the solved
+state. Each BFS level is split into index ranges handled by a pool of worker
+processes, which share the distance array through a memory-mapped scratch
+file; a worker expands the frontier states in its range with all 18 moves
+and marks unseen neighbours. Writes from different workers can collide,
+but they all write the same value, so no locking is needed. The finished
+tables go into the table_cache file ``optimal-v1.tbl`` next to the two-phase
+tables, whose corner move tables the search reuses.
+
+The search is IDA*: for each depth bound it runs a depth-first search,
+vectorized like two_phase's phase 1 (a chunk of nodes is expanded with all
+18 moves in one numpy step, and children whose pattern distance exceeds
+the moves left are dropped). With ``processes > 1`` the first few levels
+are expanded in the main process and the subtrees below them are searched
+by worker processes; the first worker to reach the solved state stops the
+others. ``OptimalSolver.stats`` reports nodes and nodes per second.
+
+Scrambles up to about 14 moves solve in seconds. Random positions need
+17-18 moves and billions of nodes: hours per position per core.
+
+    python optimal_solver.py "R U R' F2 D L'" --processes 8
+"""
+import functools
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+import cube_state
+import cubie_cube
+import metrics
+import table_cache
+import two_phase
+from cubie_cube import N_CORNER_PERM, N_TWIST
+from two_phase import ALLOWED
+
+logger = logging.getLogger(__name__)
+
+N_CORNERS = N_CORNER_PERM * N_TWIST
+N_EDGE6_PERM = 12 * 11 * 10 * 9 * 8 * 7
+N_EDGE6 = N_EDGE6_PERM * 64
+EDGE_GROUPS = {'edge_a_pdb': np.arange(6), 'edge_b_pdb': np.arange(6, 12)}
+
+TABLE_LAYOUT = {
+    'edge6_move': ((N_EDGE6_PERM, 18), np.uint32),
+    'corner_pdb': ((N_CORNERS // 2,), np.uint8),
+    'edge_a_pdb': ((N_EDGE6 // 2,), np.uint8),
+    'edge_b_pdb': ((N_EDGE6 // 2,), np.uint8),
+}
+TABLE_VERSION = 1
+# One table per stage: each pattern database BFS runs its own worker pool
+TABLE_STAGES = (('edge6_move',), ('corner_pdb',), ('edge_a_pdb',), ('edge_b_pdb',))
+
+UNSEEN = 255
+# Nodes expanded per numpy step, in both the BFS and the search
+CHUNK = 1 << 12
+BFS_CHUNK = 1 << 18
+# Levels expanded in the main process before handing subtrees to workers
+SPLIT_DEPTH = 3
+
+_ORIENTATION_BITS = 1 << np.arange(5, -1, -1)
+
+
+# -- coordinates ------------------------------------------------------------
+
+def corner_coord(cp: np.ndarray, co: np.ndarray) -> np.ndarray:
+    """Corner permutation and twist as one index, 0..N_CORNERS-1"""
+    return cubie_cube.corner_perm(cp) * N_TWIST + cubie_cube.twist(co)
+
+
+def edge6_coord(ep: np.ndarray, eo: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Positions and flips of six tracked edges as one index, 0..N_EDGE6-1
+
+    The high bits rank the (ordered) positions of ``edges``, the low six
+    bits are their flips.
+    """
+    positions = np.argsort(ep, axis=-1)[..., edges]
+    flips = np.take_along_axis(eo, positions, axis=-1)
+    return cubie_cube.partial_perm_rank(positions, 12) * 64 + flips @ _ORIENTATION_BITS
+
+
+def corner_moves(t: Dict[str, np.ndarray], corner: np.ndarray, move: Optional[np.ndarray] = None) -> np.ndarray:
+    """Corner indices after a move: (n, 18) for every move, or (n,) for one ``move`` per index"""
+    perm, twist = np.divmod(corner, N_TWIST)
+    if move is None:
+        return t['corner_perm_move'][perm].astype(np.int64) * N_TWIST + t['twist_move'][twist]
+    # Flat indexing is much faster than a two-axis gather
+    return (t['corner_perm_move'].reshape(-1)[perm * 18 + move].astype(np.int64) * N_TWIST
+            + t['twist_move'].reshape(-1)[twist * 18 + move])
+
+
+def edge6_moves(t: Dict[str, np.ndarray], edge: np.ndarray, move: Optional[np.ndarray] = None) -> np.ndarray:
+    """Edge6 indices after a move, shaped like corner_moves
+
+    edge6_move holds the new position rank in the high bits and, in the low
+    six, which of the tracked edges the move flips.
+    """
+    if move is None:
+        entry = t['edge6_move'][edge >> 6].astype(np.int64)
+        return (entry >> 6 << 6) | ((entry & 63) ^ (edge & 63)[:, None])
+    entry = t['edge6_move'].reshape(-1)[(edge >> 6) * 18 + move].astype(np.int64)
+    return (entry >> 6 << 6) | ((entry & 63) ^ (edge & 63))
+
+
+def nibble(table: np.ndarray, index: np.ndarray) -> np.ndarray:
+    """Entries of a 4-bit packed table"""
+    return (table[index >> 1] >> ((index & 1) << 2).astype(np.uint8)) & 15
+
+
+def pack_nibbles(values: np.ndarray) -> np.ndarray:
+    """Two 4-bit values per byte, even indices in the low half"""
+    if values.max() > 15:
+        raise ValueError("Values do not fit in 4 bits")
+    return (values[0::2] | (values[1::2] << 4)).astype(np.uint8)
+
+
+# -- table generation -------------------------------------------------------
+
+def _edge6_move_table() -> np.ndarray:
+    positions = cubie_cube.partial_perm_unrank(np.arange(N_EDGE6_PERM), 12, 6)
+    table = np.empty((N_EDGE6_PERM, 18), dtype=np.uint32)
+    for m in range(18):
+        # The edge at position p moves to q with MOVE_EP[m][q] == p and flips by MOVE_EO[m][q]
+        moved = np.argsort(cubie_cube.MOVE_EP[m])[positions]
+        flips = cubie_cube.MOVE_EO[m][moved] @ _ORIENTATION_BITS
+        table[:, m] = cubie_cube.partial_perm_rank(moved, 12) * 64 + flips
+    return table
+
+
+# Worker state for the BFS: the neighbour function, its move tables and the shared distances
+_bfs_neighbours = None
+_bfs_tables: Dict[str, np.ndarray] = {}
+_bfs_dist: Optional[np.ndarray] = None
+
+
+def _bfs_init(neighbours, tables: Dict[str, np.ndarray], path: str, size: int):
+    global _bfs_neighbours, _bfs_tables, _bfs_dist
+    _bfs_neighbours, _bfs_tables = neighbours, tables
+    _bfs_dist = np.memmap(path, dtype=np.uint8, mode='r+', shape=(size,))
+
+
+def _bfs_expand(task: Tuple[int, int, int]):
+    """Mark the unseen neighbours of the level-``depth`` states in [start, stop)"""
+    start, stop, depth = task
+    dist = _bfs_dist
+    frontier = np.flatnonzero(dist[start:stop] == depth) + start
+    for i in range(0, len(frontier), BFS_CHUNK):
+        neighbours = _bfs_neighbours(_bfs_tables, frontier[i:i + BFS_CHUNK]).ravel()
+        dist[neighbours[dist[neighbours] == UNSEEN]] = depth + 1
+
+
+def breadth_first(size: int, goal: int, neighbours, tables: Dict[str, np.ndarray],
+                  processes: Optional[int] = None) -> np.ndarray:
+    """Distance from ``goal`` of every state 0..size-1, as uint8
+
+    ``neighbours(tables, states)`` returns the (n, 18) successors of states.
+    Each level is split into index ranges expanded by ``processes`` workers
+    (all cores by default; one runs in this process).
+    """
+    processes = processes or os.cpu_count() or 1
+    if multiprocessing.current_process().daemon:
+        processes = 1
+    with tempfile.TemporaryDirectory(prefix='rubiks-bfs-') as scratch:
+        path = os.path.join(scratch, 'dist')
+        dist = np.memmap(path, dtype=np.uint8, mode='w+', shape=(size,))
+        dist[:] = UNSEEN
+        dist[goal] = 0
+        dist.flush()
+        # Enough ranges to balance the load, each small enough to expand in chunks
+        step = -(-size // (processes * 16))
+        pool = multiprocessing.Pool(processes, _bfs_init, (neighbours, tables, path, size)) if processes > 1 else None
+        if pool is None:
+            _bfs_init(neighbours, tables, path, size)
+        try:
+            depth, count = 0, 1
+            while count:
+                start = time.perf_counter()
+                tasks = [(a, min(a + step, size), depth) for a in range(0, size, step)]
+                if pool is None:
+                    for task in tasks:
+                        _bfs_expand(task)
+                else:
+                    pool.map(_bfs_expand, tasks)
+                depth += 1
+                count = int(np.count_nonzero(dist == depth))
+                logger.info("BFS depth %d: %d states in %.1f s", depth, count, time.perf_counter() - start)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        result = np.array(dist)
+        del dist
+    if (result == UNSEEN).any():
+        raise RuntimeError("Some states were not reached")
+    return result
+
+
+def build_table(name: str, tables: Optional[Dict[str, np.ndarray]] = None, processes: Optional[int] = None,
+                directory: Optional[str] = None) -> np.ndarray:
+    """Build one table by name; the pattern databases need edge6_move from ``tables``"""
+    tables = {} if tables is None else tables
+    if name == 'edge6_move':
+        return _edge6_move_table()
+    if name == 'corner_pdb':
+        moves = two_phase.load_tables(directory)
+        corner_tables = {k: np.array(moves[k]) for k in ('corner_perm_move', 'twist_move')}
+        return pack_nibbles(breadth_first(N_CORNERS, 0, corner_moves, corner_tables, processes))
+    if name in EDGE_GROUPS:
+        if 'edge6_move' not in tables:
+            tables['edge6_move'] = _edge6_move_table()
+        solved = np.arange(12)
+        goal = int(edge6_coord(solved, np.zeros(12, dtype=np.intp), EDGE_GROUPS[name]))
+        return pack_nibbles(breadth_first(N_EDGE6, goal, edge6_moves, {'edge6_move': tables['edge6_move']},
+                                          processes))
+    raise KeyError(f"Unknown table: {name}")
+
+
+def load_tables(directory: Optional[str] = None, processes: Optional[int] = None,
+                rebuild: bool = False) -> Dict[str, np.ndarray]:
+    """Pattern databases plus the two-phase corner move tables, memory-mapped from the cache"""
+    builder = functools.partial(build_table, processes=processes, directory=directory)
+    tables = dict(two_phase.load_tables(directory, processes))
+    tables.update(table_cache.open_tables('optimal', TABLE_VERSION, TABLE_LAYOUT, builder, TABLE_STAGES,
+                                          directory, processes, rebuild))
+    return tables
+
+
+# -- search -----------------------------------------------------------------
+
+class _Cancelled(Exception):
+    """Another worker found a solution, or the deadline passed"""
+
+
+class _Search:
+    """Depth-first search below a set of nodes, for one depth bound"""
+    def __init__(self, tables: Dict[str, np.ndarray], deadline: Optional[float] = None, stop=None):
+        self.t = tables
+        self.deadline = deadline
+        self.stop = stop
+        self.nodes = 0
+
+    def distance(self, perm, twist, edge_a, edge_b) -> np.ndarray:
+        """Admissible lower bound on the moves left: the largest pattern distance"""
+        t = self.t
+        return np.maximum.reduce([nibble(t['corner_pdb'], perm * N_TWIST + twist),
+                                  nibble(t['edge_a_pdb'], edge_a), nibble(t['edge_b_pdb'], edge_b)])
+
+    def expand(self, perm, twist, edge_a, edge_b, paths, togo: int):
+        """Children that can still be solved within ``togo - 1`` further moves
+
+        Each pattern database only looks at the children the previous one
+        kept, so most lookups go to the (most selective) corner table.
+        Nodes carry the corner permutation and twist separately, which
+        saves a division per child.
+        """
+        t = self.t
+        last_face = paths[:, -1] // 3 if paths.shape[1] else np.full(len(paths), 6)
+        parent, move = np.nonzero(ALLOWED[last_face])
+        perm = t['corner_perm_move'].reshape(-1)[perm[parent] * 18 + move].astype(np.int64)
+        twist = t['twist_move'].reshape(-1)[twist[parent] * 18 + move].astype(np.int64)
+        keep = np.flatnonzero(nibble(t['corner_pdb'], perm * N_TWIST + twist) < togo)
+        parent, move, perm, twist = parent[keep], move[keep], perm[keep], twist[keep]
+        edge_a = edge6_moves(t, edge_a[parent], move)
+        keep = np.flatnonzero(nibble(t['edge_a_pdb'], edge_a) < togo)
+        parent, move, perm, twist, edge_a = parent[keep], move[keep], perm[keep], twist[keep], edge_a[keep]
+        edge_b = edge6_moves(t, edge_b[parent], move)
+        keep = np.flatnonzero(nibble(t['edge_b_pdb'], edge_b) < togo)
+        parent, move = parent[keep], move[keep]
+        self.nodes += len(parent)
+        paths = np.concatenate([paths[parent], move[:, None].astype(np.uint8)], axis=1)
+        return perm[keep], twist[keep], edge_a[keep], edge_b[keep], paths
+
+    def check(self):
+        if self.stop is not None and self.stop.is_set():
+            raise _Cancelled
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise _Cancelled
+
+    def bounded(self, perm, twist, edge_a, edge_b, paths, bound: int) -> Optional[List[int]]:
+        """A path of exactly ``bound`` moves to the solved state, or None"""
+        done = paths.shape[1]
+        if done == bound:
+            # Every node here had pattern distance 0 after its last move: solved
+            return paths[0].tolist() if len(paths) else None
+        children = self.expand(perm, twist, edge_a, edge_b, paths, bound - done)
+        for i in range(0, len(children[0]), CHUNK):
+            found = self.bounded(*(c[i:i + CHUNK] for c in children), bound)
+            if found is not None:
+                return found
+            self.check()
+        return None
+
+
+# Worker state for parallel searches
+_worker_tables: Optional[Dict[str, np.ndarray]] = None
+_worker_stop = None
+
+
+def _search_init(tables: Optional[Dict[str, np.ndarray]], directory: Optional[str], stop):
+    """Use the solver's own tables if it was given some, else map them from the cache"""
+    global _worker_tables, _worker_stop
+    _worker_tables, _worker_stop = load_tables(directory) if tables is None else tables, stop
+
+
+def _search_subtrees(task) -> Tuple[Optional[List[int]], int, bool]:
+    """(solution or None, nodes, cancelled) for one share of the split frontier"""
+    *nodes, bound, deadline = task
+    search = _Search(_worker_tables, deadline, _worker_stop)
+    try:
+        return search.bounded(*nodes, bound), search.nodes, False
+    except _Cancelled:
+        return None, search.nodes, True
+
+
+class OptimalSolver:
+    """IDA* solver returning a shortest solution in the face turn metric
+
+    With ``processes > 1`` each depth bound is searched by a pool of worker
+    processes that map the same table file, or inherit ``tables`` if they
+    were passed in. Call ``close()`` (or use the solver as a context manager)
+    to stop the pool.
+    """
+    def __init__(self, tables: Optional[Dict[str, np.ndarray]] = None, processes: Optional[int] = 1,
+                 directory: Optional[str] = None):
+        self.tables = load_tables(directory) if tables is None else tables
+        # Tables the workers must be handed; None lets them map the cache file themselves
+        self._worker_tables = tables
+        self.processes = processes or os.cpu_count() or 1
+        self.directory = directory
+        self.stats: Dict[str, Union[int, float]] = {}
+        self._pool = None
+        self._stop = None
+
+    def __enter__(self) -> 'OptimalSolver':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._stop = multiprocessing.Event()
+            self._pool = multiprocessing.Pool(self.processes, _search_init,
+                                              (self._worker_tables, self.directory, self._stop))
+        return self._pool
+
+    def solve(self, state: Union[np.ndarray, str, 'cube_state.CubeState'],
+              timeout: Optional[float] = None) -> List[int]:
+        """Moves (cube_state.MOVE_TABLE indices) of a shortest solution of ``state``
+
+        Raises ValueError for states that are not reachable by turning, and
+        TimeoutError if no solution is found within ``timeout`` seconds.
+        """
+        facelets = two_phase._facelets(state)
+        if np.bincount(facelets, minlength=6).tolist() != [9] * 6:
+            raise ValueError("Each color must appear on exactly 9 of the 54 facelets")
+        cp, co, ep, eo = cubie_cube.from_facelets(facelets)
+        cubie_cube.verify(cp, co, ep, eo)
+        root = (cubie_cube.corner_perm(cp), cubie_cube.twist(co), edge6_coord(ep, eo, EDGE_GROUPS['edge_a_pdb']),
+                edge6_coord(ep, eo, EDGE_GROUPS['edge_b_pdb']), np.zeros((1, 0), dtype=np.uint8))
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        start = time.perf_counter()
+        nodes = 0
+        bound = int(_Search(self.tables).distance(*root[:4])[0])
+        with metrics.histogram('optimal_solve_time').time():
+            while True:
+                level_start = time.perf_counter()
+                found, level_nodes, cancelled = self._search_bound(root, bound, deadline)
+                nodes += level_nodes
+                elapsed = time.perf_counter() - level_start
+                logger.info("depth %d: %d nodes in %.2f s (%.0f nodes/s)", bound, level_nodes, elapsed,
+                            level_nodes / elapsed if elapsed else 0.0)
+                if found is not None or cancelled:
+                    break
+                bound += 1
+        metrics.counter('optimal_nodes').inc(nodes)
+        seconds = time.perf_counter() - start
+        self.stats = {
+            'length': bound,
+            'nodes': nodes,
+            'seconds': seconds,
+            'nodes_per_second': nodes / seconds if seconds else 0.0,
+            'processes': self.processes,
+        }
+        if found is None:
+            raise TimeoutError(f"No solution within {timeout} s; every solution has at least {bound} moves")
+        return found
+
+    def _search_bound(self, root, bound: int, deadline: Optional[float]) -> Tuple[Optional[List[int]], int, bool]:
+        """(solution or None, nodes, cancelled) for one IDA* iteration"""
+        search = _Search(self.tables, deadline)
+        if self.processes == 1 or bound <= SPLIT_DEPTH:
+            try:
+                return search.bounded(*root, bound), search.nodes, False
+            except _Cancelled:
+                return None, search.nodes, True
+        # Expand the first levels here, then share the frontier out
+        frontier = root
+        for depth in range(SPLIT_DEPTH):
+            frontier = search.expand(*frontier, bound - depth)
+        share = max(1, -(-len(frontier[0]) // (self.processes * 8)))
+        tasks = [tuple(c[i:i + share] for c in frontier) + (bound, deadline)
+                 for i in range(0, len(frontier[0]), share)]
+        pool = self._get_pool()
+        found, nodes, cancelled = None, search.nodes, False
+        for path, task_nodes, task_cancelled in pool.imap_unordered(_search_subtrees, tasks):
+            nodes += task_nodes
+            if path is not None and found is None:
+                found = path
+                self._stop.set()
+            elif task_cancelled and found is None:
+                cancelled = True
+        self._stop.clear()
+        return found, nodes, cancelled and found is None
+
+
+_default_solver: Optional[OptimalSolver] = None
+
+
+def solve(state, timeout: Optional[float] = None) -> List[int]:
+    """Shortest solution with a process-wide single-process solver; see OptimalSolver.solve"""
+    global _default_solver
+    if _default_solver is None:
+        _default_solver = OptimalSolver()
+    return _default_solver.solve(state, timeout)
+
+
+def main(argv: Optional[List[str]] = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Find shortest solutions (IDA* with pattern databases)")
+    parser.add_argument('scrambles', nargs='*', help="move sequences or 54-character facelet strings")
+    parser.add_argument('--processes', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--timeout', type=float, default=None, help="give up after this many seconds")
+    parser.add_argument('--dir', help="table cache directory")
+    parser.add_argument('-v', '--verbose', action='store_true', help="log every depth and the table build")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(message)s')
+
+    import batch_solve
+
+    with OptimalSolver(processes=args.processes, directory=args.dir) as solver:
+        for scramble in args.scrambles:
+            try:
+                _, state = batch_solve.parse_scramble(scramble)
+                moves = solver.solve(state, args.timeout)
+            except (ValueError, TimeoutError) as e:
+                print(f"{scramble}: {e}")
+                continue
+            stats = solver.stats
+            print(f"{scramble}: {cube_state.format_moves(moves)} ({len(moves)} moves, {stats['nodes']} nodes "
+                  f"in {stats['seconds']:.2f} s, {stats['nodes_per_second']:.3g} nodes/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,540 +1,304 @@
-import pygame
-from pygame.locals import *
-from OpenGL.GL import *
-from OpenGL.GLU import *
-import numpy as np
-import random
-from typing import List, Tuple
-import math
 import sys
 import os
+import logging
+import time
+from typing import List, Optional, Tuple
 
-os.environ['PYOPENGL_DEBUG'] = 'debug'
-os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
+import numpy as np
 
-print("Starting program...")
+import cube_state
+import metrics
+from cube_animation import TurnAnimator
+from cube_state import COLORS, FACE_COLORS, CubeState
+from move_history import MoveHistory
+from nxn_cube import NxNCube
+from solution_cache import SolutionCache
 
-def init_pygame_and_gl():
-    """Initialize Pygame and OpenGL with error checking"""
-    print("Initializing Pygame...")
-    pygame.init()
-    print("Pygame initialized!")
-    
-    print("Setting up display...")
-    display = (800, 600)
-    try:
-        screen = pygame.display.set_mode(display, DOUBLEBUF | OPENGL)
-        if not screen:
-            print("Failed to create display surface!")
-            sys.exit(1)
-        pygame.display.set_caption("Rubik's Cube")
-        print("Display setup successful!")
-    except pygame.error as e:
-        print(f"Failed to create display: {e}")
-        sys.exit(1)
-    
-    print("Setting up OpenGL...")
-    try:
-        # Clear to black
-        glClearColor(0.0, 0.0, 0.0, 1.0)
-        print("Set clear color")
-        
-        # Basic setup
-        glViewport(0, 0, display[0], display[1])
-        print("Set viewport")
-        
-        # Enable features
-        print("Enabling OpenGL features...")
-        glEnable(GL_DEPTH_TEST)
-        print("Enabled depth test")
-        glEnable(GL_LIGHTING)
-        print("Enabled lighting")
-        glEnable(GL_LIGHT0)
-        print("Enabled light 0")
-        glEnable(GL_COLOR_MATERIAL)
-        print("Enabled color material")
-        glShadeModel(GL_SMOOTH)
-        print("Set shade model")
-        
-        # Set up material properties
-        print("Setting up materials...")
-        glColorMaterial(GL_FRONT_AND_BACK, GL_AMBIENT_AND_DIFFUSE)
-        
-        # Set up lighting with error checking
-        print("Setting up lighting...")
-        light_ambient = [0.6, 0.6, 0.6, 1.0]
-        light_diffuse = [0.8, 0.8, 0.8, 1.0]
-        light_position = [2.0, 4.0, 5.0, 0.0]
-        
-        glLightfv(GL_LIGHT0, GL_AMBIENT, light_ambient)
-        print("Set light ambient")
-        glLightfv(GL_LIGHT0, GL_DIFFUSE, light_diffuse)
-        print("Set light diffuse")
-        glLightfv(GL_LIGHT0, GL_POSITION, light_position)
-        print("Set light position")
-        glLightModelfv(GL_LIGHT_MODEL_AMBIENT, [0.4, 0.4, 0.4, 1.0])
-        print("Set light model")
-        
-        # Set up perspective
-        print("Setting up perspective...")
-        glMatrixMode(GL_PROJECTION)
-        print("Set matrix mode to projection")
-        gluPerspective(45, (display[0]/display[1]), 0.1, 50.0)
-        print("Set perspective")
-        glMatrixMode(GL_MODELVIEW)
-        print("Set matrix mode to modelview")
-        
-        # Test if everything is working
-        error = glGetError()
-        if error != GL_NO_ERROR:
-            print(f"OpenGL error during initialization: {error}")
-            sys.exit(1)
-            
-        print("OpenGL initialization successful!")
-        
-        # Clear the screen
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-        pygame.display.flip()
-        print("Initial screen clear done")
-        
-    except Exception as e:
-        print(f"Failed to initialize OpenGL: {e}")
-        import traceback
-        traceback.print_exc()
-        sys.exit(1)
+logger = logging.getLogger('rubiks_cube')
+
+def _renderer():
+    """Import the pygame/OpenGL front end on first use, keeping this module headless"""
+    import cube_renderer
+    return cube_renderer
 
-# Define colors with alpha
-COLORS = {
-    'red': (1, 0, 0, 1),
-    'green': (0, 1, 0, 1),
-    'blue': (0, 0, 1, 1),
-    'yellow': (1, 1, 0.1, 1),  # Even brighter yellow with slight warmth
-    'orange': (1, 0.3, 0, 1),  # Darker and more reddish orange
-    'white': (1, 1, 1, 1),
-    'black': (0, 0, 0, 1)
-}
+# Outward normals in Cubie.colors order: [right, left, top, bottom, front, back]
+SIDE_NORMALS = ((1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1))
 
 class Cubie:
-    def __init__(self, position: Tuple[float, float, float], colors: List[Tuple[float, float, float, float]]):
+    """View of one cubie slot that reads its sticker colors from the cube's facelet array"""
+    def __init__(self, cube: 'RubiksCube', position: Tuple[int, int, int]):
+        self.cube = cube
         self.position = list(position)
-        self.colors = colors  # [right, left, top, bottom, front, back]
         self.size = 0.95  # Slightly smaller than 1 to create gaps
+        # Facelet index shown on each side, or None for the black inner sides
+        self.facelets = [
+            cube_state.facelet_index(position, normal) if np.dot(position, normal) == 1 else None
+            for normal in SIDE_NORMALS
+        ]
     
-    def draw(self):
-        """Draw a single cubie"""
-        try:
-            glPushMatrix()
-            
-            # Move to cubie position
-            glTranslatef(self.position[0], self.position[1], self.position[2])
-            
-            # Draw each face
-            self.draw_face('right', self.colors[0])   # Right face
-            self.draw_face('left', self.colors[1])    # Left face
-            self.draw_face('top', self.colors[2])     # Top face
-            self.draw_face('bottom', self.colors[3])  # Bottom face
-            self.draw_face('front', self.colors[4])   # Front face
-            self.draw_face('back', self.colors[5])    # Back face
-            
-            glPopMatrix()
-        except Exception as e:
-            print(f"Error drawing cubie at position {self.position}: {e}")
-            import traceback
-            traceback.print_exc()
-    
-    def draw_face(self, face_type: str, color: Tuple[float, float, float, float]):
-        """Draw a single face of the cubie"""
-        try:
-            s = self.size / 2  # Half size for vertices
-            
-            glBegin(GL_QUADS)
-            glColor4fv(color)  # Set the face color
-            
-            if face_type == 'right':  # Right face (x = 1)
-                glNormal3f(1.0, 0.0, 0.0)
-                glVertex3f(s, -s, -s)
-                glVertex3f(s, s, -s)
-                glVertex3f(s, s, s)
-                glVertex3f(s, -s, s)
-            elif face_type == 'left':  # Left face (x = -1)
-                glNormal3f(-1.0, 0.0, 0.0)
-                glVertex3f(-s, -s, -s)
-                glVertex3f(-s, -s, s)
-                glVertex3f(-s, s, s)
-                glVertex3f(-s, s, -s)
-            elif face_type == 'top':  # Top face (y = 1)
-                glNormal3f(0.0, 1.0, 0.0)
-                glVertex3f(-s, s, -s)
-                glVertex3f(-s, s, s)
-                glVertex3f(s, s, s)
-                glVertex3f(s, s, -s)
-            elif face_type == 'bottom':  # Bottom face (y = -1)
-                glNormal3f(0.0, -1.0, 0.0)
-                glVertex3f(-s, -s, -s)
-                glVertex3f(s, -s, -s)
-                glVertex3f(s, -s, s)
-                glVertex3f(-s, -s, s)
-            elif face_type == 'front':  # Front face (z = 1)
-                glNormal3f(0.0, 0.0, 1.0)
-                glVertex3f(-s, -s, s)
-                glVertex3f(s, -s, s)
-                glVertex3f(s, s, s)
-                glVertex3f(-s, s, s)
-            else:  # Back face (z = -1)
-                glNormal3f(0.0, 0.0, -1.0)
-                glVertex3f(-s, -s, -s)
-                glVertex3f(-s, s, -s)
-                glVertex3f(s, s, -s)
-                glVertex3f(s, -s, -s)
-            
-            glEnd()
-            
-            # Draw black edges
-            glColor4fv(COLORS['black'])
-            glBegin(GL_LINE_LOOP)
-            glVertex3f(-s, -s, -s)
-            glVertex3f(s, -s, -s)
-            glVertex3f(s, s, -s)
-            glVertex3f(-s, s, -s)
-            glEnd()
-            
-        except Exception as e:
-            print(f"Error drawing face {face_type}: {e}")
-            import traceback
-            traceback.print_exc()
+    @property
+    def colors(self) -> List[Tuple[float, float, float, float]]:
+        """Current colors as [right, left, top, bottom, front, back]"""
+        state = self.cube.facelets
+        return [FACE_COLORS[state[i]] if i is not None else COLORS['black'] for i in self.facelets]
 
-class RubiksCube:
+class RubiksCube(CubeState):
+    """Cube with per-cubie views for drawing; the state and moves come from CubeState"""
     def __init__(self):
         """Initialize the Rubik's Cube with all cubies in solved state"""
-        self.cubies = []
-        self.moves = ['F', 'B', 'R', 'L', 'U', 'D']
+        super().__init__()
         
-        # Create all 27 cubies (3x3x3)
-        for x in range(-1, 2):
-            for y in range(-1, 2):
-                for z in range(-1, 2):
-                    # Initialize all faces as black
-                    colors = [COLORS['black']] * 6  # [right, left, top, bottom, front, back]
-                    
-                    # Set colors for visible faces
-                    if x == 1:  # Right face
-                        colors[0] = COLORS['green']
-                    if x == -1:  # Left face
-                        colors[1] = COLORS['blue']
-                    if y == 1:   # Top face
-                        colors[2] = COLORS['white']
-                    if y == -1:  # Bottom face
-                        colors[3] = COLORS['yellow']
-                    if z == 1:   # Front face
-                        colors[4] = COLORS['red']
-                    if z == -1:  # Back face
-                        colors[5] = COLORS['orange']
-                    
-                    # Create cubie with position and colors
-                    self.cubies.append(Cubie((x, y, z), colors))
-        print("Cube initialized with all cubies")
+        # Create views for all 27 cubie slots (3x3x3)
+        self.cubies = [
+            Cubie(self, (x, y, z))
+            for x in range(-1, 2)
+            for y in range(-1, 2)
+            for z in range(-1, 2)
+        ]
+        # GPU buffers for drawing, created on first draw
+        self.mesh = None
+        logger.debug("Cube initialized with all cubies")
     
-    def draw(self):
-        """Draw the entire cube"""
-        try:
-            glPushMatrix()
-            # Scale the entire cube to fit the view
-            glScalef(0.5, 0.5, 0.5)
-            
-            # Draw each cubie
-            for cubie in self.cubies:
-                cubie.draw()
-            
-            glPopMatrix()
-        except Exception as e:
-            print(f"Error drawing cube: {e}")
-            import traceback
-            traceback.print_exc()
+    def draw(self, turn: Optional[Tuple[int, float]] = None):
+        """Draw the entire cube; sticker colors are re-uploaded only after a move
+
+        ``turn`` is (face, degrees) for a layer part way through an animated turn.
+        """
+        if self.mesh is None:
+            self.mesh = _renderer().CubeMesh(self.cubies, FACE_COLORS, COLORS['black'])
+        self.mesh.draw(self.facelets, turn)
             
-    def scramble(self, num_moves: int = 20):
+    def scramble(self, num_moves: int = 20, rng=None) -> List[int]:
         """Scramble the cube with random moves"""
-        print("\nStarting scramble...")
-        for i in range(num_moves):
-            # Choose a random face and direction
-            face = random.choice(self.moves)
-            clockwise = random.choice([True, False])
-            
-            # Print debug info
-            print(f"\nMove {i+1}/{num_moves}:")
-            print(f"Selected face: {face}, {'clockwise' if clockwise else 'counterclockwise'}")
-            
-            # Print colors before rotation
-            print("Colors before rotation:")
-            for j, cubie in enumerate(self.cubies):
-                if any(c != COLORS['black'] for c in cubie.colors):
-                    print(f"Cubie {j} at {cubie.position}: {[c == COLORS['black'] for c in cubie.colors]}")
-            
-            # Perform the rotation
-            self.rotate_face(face, clockwise)
-            
-            # Print colors after rotation
-            print("Colors after rotation:")
-            for j, cubie in enumerate(self.cubies):
-                if any(c != COLORS['black'] for c in cubie.colors):
-                    print(f"Cubie {j} at {cubie.position}: {[c == COLORS['black'] for c in cubie.colors]}")
-            
-            # Verify no colors were lost
-            for cubie in self.cubies:
-                visible_faces = sum(1 for c in cubie.colors if c != COLORS['black'])
-                if visible_faces == 0 and any(abs(p) == 1 for p in cubie.position):
-                    print(f"WARNING: Cubie at {cubie.position} lost all colors!")
-                elif visible_faces > 3:
-                    print(f"WARNING: Cubie at {cubie.position} has too many colors: {visible_faces}")
-        
-        print("\nScramble complete!")
+        moves = super().scramble(num_moves, rng)
+        logger.info("Scramble: %s", cube_state.format_moves(moves))
+        return moves
 
     def rotate_face(self, face: str, clockwise: bool = True):
-        """Rotate a face of the cube"""
-        try:
-            print(f"Rotating face {face} {'clockwise' if clockwise else 'counterclockwise'}")
-            
-            # Get the axis and coordinate for the face
-            if face == 'F':  # Front face (z = 1)
-                axis = 2  # z-axis
-                coord = 1
-            elif face == 'B':  # Back face (z = -1)
-                axis = 2  # z-axis
-                coord = -1
-            elif face == 'R':  # Right face (x = 1)
-                axis = 0  # x-axis
-                coord = 1
-            elif face == 'L':  # Left face (x = -1)
-                axis = 0  # x-axis
-                coord = -1
-            elif face == 'U':  # Up face (y = 1)
-                axis = 1  # y-axis
-                coord = 1
-            elif face == 'D':  # Down face (y = -1)
-                axis = 1  # y-axis
-                coord = -1
-            else:
-                print(f"Invalid face: {face}")
-                return
-
-            # Find cubies on this face
-            face_cubies = []
-            for cubie in self.cubies:
-                if abs(cubie.position[axis] - coord) < 0.1:  # Use small threshold for float comparison
-                    face_cubies.append(cubie)
-
-            if not face_cubies:
-                print(f"No cubies found for face {face}")
-                return
-
-            print(f"Found {len(face_cubies)} cubies to rotate")
-
-            # Rotate the cubies
-            angle = -90 if clockwise else 90  # Angle in degrees
-            angle_rad = math.radians(angle)
-            
-            # Store original states
-            original_states = [(cubie.position.copy(), cubie.colors.copy()) for cubie in face_cubies]
-            
-            # Perform rotations
-            for cubie, (orig_pos, orig_colors) in zip(face_cubies, original_states):
-                x, y, z = orig_pos
-                
-                # Rotate position based on axis
-                if axis == 0:  # x-axis rotation (R/L faces)
-                    new_y = y * math.cos(angle_rad) - z * math.sin(angle_rad)
-                    new_z = y * math.sin(angle_rad) + z * math.cos(angle_rad)
-                    cubie.position = [x, new_y, new_z]
-                    
-                    if clockwise:
-                        cubie.colors = [
-                            orig_colors[0],  # Right stays
-                            orig_colors[1],  # Left stays
-                            orig_colors[4],  # Front becomes top
-                            orig_colors[5],  # Back becomes bottom
-                            orig_colors[3],  # Bottom becomes front
-                            orig_colors[2]   # Top becomes back
-                        ]
-                    else:
-                        cubie.colors = [
-                            orig_colors[0],  # Right stays
-                            orig_colors[1],  # Left stays
-                            orig_colors[5],  # Back becomes top
-                            orig_colors[4],  # Front becomes bottom
-                            orig_colors[2],  # Top becomes front
-                            orig_colors[3]   # Bottom becomes back
-                        ]
-                        
-                elif axis == 1:  # y-axis rotation (U/D faces)
-                    new_x = x * math.cos(angle_rad) + z * math.sin(angle_rad)
-                    new_z = -x * math.sin(angle_rad) + z * math.cos(angle_rad)
-                    cubie.position = [new_x, y, new_z]
-                    
-                    if clockwise:
-                        cubie.colors = [
-                            orig_colors[4],  # Front becomes right
-                            orig_colors[5],  # Back becomes left
-                            orig_colors[2],  # Top stays
-                            orig_colors[3],  # Bottom stays
-                            orig_colors[1],  # Left becomes front
-                            orig_colors[0]   # Right becomes back
-                        ]
-                    else:
-                        cubie.colors = [
-                            orig_colors[5],  # Back becomes right
-                            orig_colors[4],  # Front becomes left
-                            orig_colors[2],  # Top stays
-                            orig_colors[3],  # Bottom stays
-                            orig_colors[0],  # Right becomes front
-                            orig_colors[1]   # Left becomes back
-                        ]
-                        
-                else:  # z-axis rotation (F/B faces)
-                    new_x = x * math.cos(angle_rad) - y * math.sin(angle_rad)
-                    new_y = x * math.sin(angle_rad) + y * math.cos(angle_rad)
-                    cubie.position = [new_x, new_y, z]
-                    
-                    if clockwise:
-                        cubie.colors = [
-                            orig_colors[3],  # Bottom becomes right
-                            orig_colors[2],  # Top becomes left
-                            orig_colors[0],  # Right becomes top
-                            orig_colors[1],  # Left becomes bottom
-                            orig_colors[4],  # Front stays
-                            orig_colors[5]   # Back stays
-                        ]
-                    else:
-                        cubie.colors = [
-                            orig_colors[2],  # Top becomes right
-                            orig_colors[3],  # Bottom becomes left
-                            orig_colors[1],  # Left becomes top
-                            orig_colors[0],  # Right becomes bottom
-                            orig_colors[4],  # Front stays
-                            orig_colors[5]   # Back stays
-                        ]
+        """Rotate a face of the cube, clockwise as seen looking at that face"""
+        if face not in self.moves:
+            logger.warning("Invalid face: %s", face)
+            return
+        logger.debug("Rotating face %s %s", face, 'clockwise' if clockwise else 'counterclockwise')
+        super().rotate_face(face, clockwise)
 
-            print(f"Rotation complete for face {face}")
+class BigCube(NxNCube):
+    """N x N x N cube for the viewer, drawn as stickers from GPU buffers"""
+    def __init__(self, n: int):
+        super().__init__(n)
+        self.mesh = None
 
-        except Exception as e:
-            print(f"Error rotating face {face}: {e}")
-            import traceback
-            traceback.print_exc()    
+    def draw(self, turn: Optional[Tuple[int, float]] = None):
+        if self.mesh is None:
+            self.mesh = _renderer().StickerMesh(self, FACE_COLORS)
+        self.mesh.draw(self.facelets, turn)
 
-def main():
+def main(show_stats: bool = False, size: int = 3):
+    import pygame
+    renderer = _renderer()
     try:
-        init_pygame_and_gl()
-        print("Starting Rubik's Cube...")
+        renderer.init_pygame_and_gl()
+        logger.info("Starting Rubik's Cube")
         
-        # Create the Rubik's cube
-        cube = RubiksCube()
+        # Create the Rubik's cube; key presses queue moves for the animator
+        cube = RubiksCube() if size == 3 else BigCube(size)
+        animator = TurnAnimator(cube)
+        # Every move played on the 3x3x3, for undo/redo and the scrub slider
+        history = MoveHistory(cube.facelets) if size == 3 else None
+        slider = renderer.ScrubSlider()
+        scrubbing = False
+
+        def play(moves):
+            """Queue moves for the animator and record them in the history"""
+            if history is not None:
+                history.extend(moves)
+            animator.extend(moves)
+
+        def seek(ply):
+            """Jump to a ply of the history without animating"""
+            animator.finish()
+            cube.facelets = history.seek(ply)
+        # Solving the same position again, or a symmetric one, is a cache hit
+        solutions = SolutionCache(maxsize=1000)
+        # Layer for the next face key on big cubes, chosen with the digit keys
+        layer = 1
         
         # Initialize rotation variables
         rotation_x = 20  # Initial rotation
         rotation_y = -45  # Initial rotation
-        last_mouse = None
         mouse_button_down = False
+        face_keys = {
+            pygame.K_f: 'F', pygame.K_b: 'B', pygame.K_r: 'R',
+            pygame.K_l: 'L', pygame.K_u: 'U', pygame.K_d: 'D',
+        }
+        # Events after which the window contents must be drawn again
+        redraw_events = {pygame.VIDEOEXPOSE, pygame.VIDEORESIZE, pygame.WINDOWEXPOSED,
+                         pygame.WINDOWSIZECHANGED, pygame.WINDOWRESTORED, pygame.WINDOWSHOWN}
+        
+        # Metrics overlay (F3), refreshed twice a second by a timer event
+        overlay = None
+        overlay_refresh = pygame.USEREVENT + 1
+        if show_stats:
+            overlay = renderer.TextOverlay()
+            pygame.time.set_timer(overlay_refresh, 500)
+        frames_rendered = metrics.counter('frames_rendered')
+        frame_time = metrics.histogram('frame_time')
+        draw_time = metrics.histogram('draw_time')
         
-        # Game loop
+        # Event loop: draw only when the view, the cube or the window changed,
+        # and sleep in pygame.event.wait() otherwise
         clock = pygame.time.Clock()
+        needs_redraw = True
         running = True
         while running:
             try:
-                for event in pygame.event.get():
+                if needs_redraw:
+                    events = pygame.event.get()
+                else:
+                    events = [pygame.event.wait()] + pygame.event.get()
+                
+                # A burst of mouse motion becomes one view change (or one seek) and one redraw
+                drag_x = drag_y = 0
+                scrub_pos = None
+                for event in events:
                     try:
                         if event.type == pygame.QUIT:
                             running = False
                         elif event.type == pygame.KEYDOWN:
-                            print(f"Key pressed: {event.key}")  # Debug print
                             if event.key == pygame.K_ESCAPE:
                                 running = False
+                            elif event.key == pygame.K_SPACE and size != 3:
+                                # Inner-layer turns are not animated: finish the queue and apply at once
+                                animator.finish()
+                                moves = cube.scramble()
+                                logger.info("Scramble: %s", ' '.join(cube.format_move(m) for m in moves))
+                                needs_redraw = True
                             elif event.key == pygame.K_SPACE:
-                                print("Scrambling cube...")  # Debug print
-                                cube.scramble()
+                                import scrambler  # loads the solver modules, so only on the first scramble
+                                moves = scrambler.random_moves(1, 25)[0].tolist()
+                                logger.info("Scramble: %s", cube_state.format_moves(moves))
+                                play(moves)
+                            elif event.key == pygame.K_RETURN and size != 3:
+                                logger.warning("The solver only handles the 3x3x3 cube")
+                            elif event.key == pygame.K_RETURN:
+                                # Solve the position the queued moves lead to
+                                solution = solutions.solve(animator.final_state())
+                                logger.info("Solution (%d moves): %s", len(solution), cube_state.format_moves(solution))
+                                play(solution)
+                            elif event.key == pygame.K_F3:
+                                if overlay is None:
+                                    overlay = renderer.TextOverlay()
+                                    pygame.time.set_timer(overlay_refresh, 500)
+                                else:
+                                    overlay = None
+                                    pygame.time.set_timer(overlay_refresh, 0)
+                                needs_redraw = True
+                            elif history is not None and event.mod & pygame.KMOD_CTRL and (
+                                    event.key == pygame.K_y or (event.key == pygame.K_z and event.mod & pygame.KMOD_SHIFT)):
+                                move = history.redo()
+                                if move is not None:
+                                    animator.push(move)
+                            elif history is not None and event.mod & pygame.KMOD_CTRL and event.key == pygame.K_z:
+                                move = history.undo()
+                                if move is not None:
+                                    animator.push(move)
+                            elif history is not None and event.key in (pygame.K_HOME, pygame.K_END):
+                                seek(0 if event.key == pygame.K_HOME else len(history))
+                                needs_redraw = True
+                            elif size != 3 and event.unicode.isdigit() and event.unicode != '0':
+                                layer = min(int(event.unicode), size)
                             # Handle face rotation keys
-                            elif event.key == pygame.K_f:
-                                print("Rotating front face")
-                                cube.rotate_face('F', not pygame.key.get_mods() & pygame.KMOD_SHIFT)
-                            elif event.key == pygame.K_b:
-                                print("Rotating back face")
-                                cube.rotate_face('B', not pygame.key.get_mods() & pygame.KMOD_SHIFT)
-                            elif event.key == pygame.K_r:
-                                print("Rotating right face")
-                                cube.rotate_face('R', not pygame.key.get_mods() & pygame.KMOD_SHIFT)
-                            elif event.key == pygame.K_l:
-                                print("Rotating left face")
-                                cube.rotate_face('L', not pygame.key.get_mods() & pygame.KMOD_SHIFT)
-                            elif event.key == pygame.K_u:
-                                print("Rotating up face")
-                                cube.rotate_face('U', not pygame.key.get_mods() & pygame.KMOD_SHIFT)
-                            elif event.key == pygame.K_d:
-                                print("Rotating down face")
-                                cube.rotate_face('D', not pygame.key.get_mods() & pygame.KMOD_SHIFT)
+                            elif event.key in face_keys and layer > 1:
+                                animator.finish()
+                                clockwise = not event.mod & pygame.KMOD_SHIFT
+                                cube.turn(cube_state.FACES.index(face_keys[event.key]), layer - 1, 1 if clockwise else 3)
+                                layer = 1
+                                needs_redraw = True
+                            elif event.key in face_keys:
+                                play([cube_state.move_index(face_keys[event.key], not event.mod & pygame.KMOD_SHIFT)])
                         # Mouse controls
                         elif event.type == pygame.MOUSEBUTTONDOWN:
-                            if event.button == 1:  # Left click
-                                last_mouse = pygame.mouse.get_pos()
+                            if event.button == 1 and history is not None and slider.hit(event.pos):
+                                scrubbing = True
+                                scrub_pos = event.pos
+                            elif event.button == 1:  # Left click
                                 mouse_button_down = True
-                                print("Mouse button down")  # Debug print
                         elif event.type == pygame.MOUSEBUTTONUP:
                             if event.button == 1:  # Left click release
-                                mouse_button_down = False
-                                print("Mouse button up")  # Debug print
-                        elif event.type == pygame.MOUSEMOTION and mouse_button_down:
-                            current_mouse = pygame.mouse.get_pos()
-                            if last_mouse:
-                                diff_x = current_mouse[0] - last_mouse[0]
-                                diff_y = current_mouse[1] - last_mouse[1]
-                                rotation_y += diff_x * 0.5
-                                rotation_x += diff_y * 0.5
-                                print(f"Rotating view: dx={diff_x}, dy={diff_y}")  # Debug print
-                            last_mouse = current_mouse
+                                mouse_button_down = scrubbing = False
+                        elif event.type == pygame.MOUSEMOTION:
+                            if scrubbing:
+                                scrub_pos = event.pos
+                            elif mouse_button_down:
+                                drag_x += event.rel[0]
+                                drag_y += event.rel[1]
+                        elif event.type in redraw_events or event.type == overlay_refresh:
+                            needs_redraw = True
                             
-                    except Exception as e:
-                        print(f"Error handling event: {e}")
-                        import traceback
-                        traceback.print_exc()
+                    except Exception:
+                        logger.exception("Error handling event")
                         continue
                 
-                # Clear the screen and depth buffer
-                glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-                glLoadIdentity()
-                
-                # Set up camera and lighting
-                glTranslatef(0.0, 0.0, -9.0)
-                glLightfv(GL_LIGHT0, GL_POSITION, [2.0, 4.0, 5.0, 0.0])
+                if scrub_pos is not None:
+                    seek(round(slider.fraction(scrub_pos) * len(history)))
+                    needs_redraw = True
                 
-                # Apply rotations
-                glRotatef(rotation_x, 1, 0, 0)
-                glRotatef(rotation_y, 0, 1, 0)
+                if drag_x or drag_y:
+                    rotation_y += drag_x * 0.5
+                    rotation_x += drag_y * 0.5
+                    needs_redraw = True
                 
-                # Draw the cube
-                cube.draw()
+                # Advance turns by elapsed time; keep drawing while any are queued
+                if animator.update():
+                    needs_redraw = True
                 
-                # Update the display
-                pygame.display.flip()
-                
-                # Cap the frame rate
-                clock.tick(60)
+                if needs_redraw and running:
+                    frame_start = time.perf_counter()
+                    renderer.begin_frame(rotation_x, rotation_y)
+                    
+                    # Draw the cube
+                    cube.draw(animator.current_turn())
+                    if history is not None and len(history):
+                        slider.draw(history.position, len(history))
+                    draw_time.observe(time.perf_counter() - frame_start)
+                    if overlay is not None:
+                        overlay.set_lines(metrics.report())
+                        overlay.draw()
+                    
+                    # Update the display
+                    renderer.end_frame()
+                    frames_rendered.inc()
+                    frame_time.observe(time.perf_counter() - frame_start)
+                    needs_redraw = animator.busy
+                    
+                    # Cap the frame rate while dragging or animating
+                    clock.tick(60)
                 
-            except Exception as e:
-                print(f"Error in game loop: {e}")
-                import traceback
-                traceback.print_exc()
+            except Exception:
+                logger.exception("Error in game loop")
                 continue
                 
-    except Exception as e:
-        print(f"Fatal error in main: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Fatal error in main")
     finally:
         pygame.quit()
-        print("Game closed")
+        logger.info("Game closed")
 
 if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Interactive 3D Rubik's cube")
+    parser.add_argument('--gl-debug', action='store_true', help="enable PyOpenGL per-call error checking")
+    parser.add_argument('--stats', action='store_true', help="show the metrics overlay (toggle with F3)")
+    parser.add_argument('--size', type=int, default=3, help="cube size N for an NxNxN cube (default: 3)")
+    parser.add_argument('-v', '--verbose', action='count', default=0, help="log moves and solutions (-vv: debug)")
+    args = parser.parse_args()
+    logging.basicConfig(level=(logging.WARNING, logging.INFO, logging.DEBUG)[min(args.verbose, 2)],
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    if args.gl_debug:
+        # Opt in to PyOpenGL's per-call error checking; read when cube_renderer is imported
+        os.environ['RUBIKS_GL_DEBUG'] = '1'
     try:
-        main()
-    except Exception as e:
-        print(f"Error: {e}")
-        import traceback
-        traceback.print_exc()
-        pygame.quit()
+        main(args.stats, args.size)
+    except Exception:
+        logger.exception("Error")
         sys.exit(1)
@@ -0,0 +1,157 @@
+"""Scramble generation: random-state (WCA-style) and filtered random-move.
+
+random-state   draw a uniformly random reachable cube (cubie_cube.random_cubies),
+               solve it with the two-phase solver and return the inverse of
+               the solution. Every position is equally likely, as in official
+               WCA scrambles. Costs one solve per scramble (tens of ms at the
+               default max_length), so bulk calls can spread over a pool.
+random-move    ``length`` random face turns (half turns included) that never
+               turn the same face twice in a row, and turn opposite faces
+               only in U/R/F-before-D/L/B order, so R R, R R' or R L R
+               cannot occur. Vectorized: millions of scrambles a second.
+
+Every function takes ``seed`` (an int, a numpy Generator or None) and
+returns notation strings or move arrays; nothing is printed. Random-state
+output is the same for a given seed whatever the number of processes.
+
+    >>> random_move_scrambles(3, length=25, seed=1)
+    ["L' B2 U F' ...", ...]
+    >>> random_state_scrambles(1000, seed=7, processes=8)   # doctest: +SKIP
+
+    python scrambler.py 100 --mode random-state --seed 7 --processes 4
+"""
+import multiprocessing
+import os
+from typing import List, Optional, Union
+
+import numpy as np
+
+import cube_state
+import cubie_cube
+import two_phase
+
+Seed = Union[None, int, np.random.Generator]
+MODES = ('random-state', 'random-move')
+# Random states this close to solved are redrawn, as the WCA scrambler does
+MIN_DISTANCE = 2
+
+# _FOLLOWERS[last_face, :_FOLLOWER_COUNTS[last_face]] are the moves allowed
+# after a turn of last_face (row 6: first move), padded with -1
+_FOLLOWER_COUNTS = two_phase.ALLOWED.sum(axis=1)
+_FOLLOWERS = np.full((7, 18), -1, dtype=np.int8)
+for _last, _allowed in enumerate(two_phase.ALLOWED):
+    _FOLLOWERS[_last, :_FOLLOWER_COUNTS[_last]] = np.flatnonzero(_allowed)
+
+
+def random_moves(count: int, length: int = 25, seed: Seed = None) -> np.ndarray:
+    """(count, length) int8 matrix of filtered random moves (MOVE_TABLE indices)"""
+    rng = np.random.default_rng(seed)
+    moves = np.empty((count, length), dtype=np.int8)
+    last = np.full(count, 6)
+    for step in range(length):
+        pick = (rng.random(count) * _FOLLOWER_COUNTS[last]).astype(np.intp)
+        moves[:, step] = _FOLLOWERS[last, pick]
+        last = moves[:, step] // 3
+    return moves
+
+
+def random_move_scrambles(count: int, length: int = 25, seed: Seed = None) -> List[str]:
+    """``count`` filtered random-move scrambles in notation form"""
+    names = np.array(cube_state.MOVE_NAMES)
+    return [' '.join(row) for row in names[random_moves(count, length, seed)]]
+
+
+def inverse(moves: List[int]) -> List[int]:
+    """The move sequence that undoes ``moves``"""
+    return [int(cube_state.INVERSE_MOVE[m]) for m in reversed(moves)]
+
+
+def random_states(count: int, seed: Seed = None) -> np.ndarray:
+    """(count, 54) facelets of uniformly random reachable cubes"""
+    return cubie_cube.to_facelets(*cubie_cube.random_cubies(count, np.random.default_rng(seed)))
+
+
+def _solve_states(states: np.ndarray, max_length: int) -> List[Optional[List[int]]]:
+    """Scramble moves for each state, or None for the rare state too close to solved"""
+    solver = two_phase.get_solver()
+    scrambles = []
+    for state in states:
+        solution = solver.solve(state, max_length)
+        scrambles.append(inverse(solution) if len(solution) >= MIN_DISTANCE else None)
+    return scrambles
+
+
+def _solve_chunk(args) -> List[Optional[List[int]]]:
+    return _solve_states(*args)
+
+
+def random_state_moves(count: int, seed: Seed = None, max_length: int = 21,
+                       processes: Optional[int] = 1, chunk_size: int = 16) -> List[List[int]]:
+    """``count`` random-state scrambles as move lists
+
+    A scramble is at most ``max_length`` moves; raising it to 22-25 makes
+    each solve two to three times faster. ``processes=None`` uses every core.
+    """
+    rng = np.random.default_rng(seed)
+    processes = processes or os.cpu_count() or 1
+    # Map (or build) the tables once here, so workers never race to generate them
+    two_phase.load_tables()
+    scrambles: List[List[int]] = []
+    while len(scrambles) < count:
+        states = random_states(count - len(scrambles), rng)
+        chunks = [(states[i:i + chunk_size], max_length) for i in range(0, len(states), chunk_size)]
+        if processes == 1 or len(chunks) == 1:
+            results = [_solve_chunk(chunk) for chunk in chunks]
+        else:
+            with multiprocessing.Pool(min(processes, len(chunks))) as pool:
+                results = pool.map(_solve_chunk, chunks)
+        scrambles.extend(s for chunk in results for s in chunk if s is not None)
+    return scrambles
+
+
+def random_state_scrambles(count: int, seed: Seed = None, max_length: int = 21,
+                           processes: Optional[int] = 1) -> List[str]:
+    """``count`` random-state scrambles in notation form; see random_state_moves"""
+    return [cube_state.format_moves(m) for m in random_state_moves(count, seed, max_length, processes)]
+
+
+def scrambles(count: int, mode: str = 'random-state', length: int = 25, seed: Seed = None,
+              max_length: int = 21, processes: Optional[int] = 1) -> List[str]:
+    """``count`` scrambles of either mode in notation form
+
+    ``length`` applies to random-move scrambles, ``max_length`` and
+    ``processes`` to random-state ones.
+    """
+    if mode == 'random-move':
+        return random_move_scrambles(count, length, seed)
+    if mode == 'random-state':
+        return random_state_scrambles(count, seed, max_length, processes)
+    raise ValueError(f"Unknown scramble mode {mode!r}, expected one of {MODES}")
+
+
+def main(argv: Optional[List[str]] = None):
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Generate scrambles, one per line")
+    parser.add_argument('count', type=int)
+    parser.add_argument('--mode', choices=MODES, default='random-state')
+    parser.add_argument('--length', type=int, default=25, help="moves per random-move scramble (default: 25)")
+    parser.add_argument('--max-length', type=int, default=21,
+                        help="longest random-state scramble; higher is faster (default: 21)")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--processes', type=int, default=1, help="worker processes for random-state (0: all cores)")
+    parser.add_argument('-o', '--output', default='-', help="output file, '-' for stdout (default)")
+    args = parser.parse_args(argv)
+
+    lines = scrambles(args.count, args.mode, args.length, args.seed, args.max_length, args.processes or None)
+    sink = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        sink.writelines(line + '\n' for line in lines)
+    finally:
+        if sink is not sys.stdout:
+            sink.close()
+
+
+if __name__ == '__main__':
+    main()
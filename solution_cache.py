@@ -0,0 +1,104 @@
+"""Bounded LRU cache of solutions, keyed by symmetry class.
+
+Entries are keyed by cube_symmetry.canonical_key, so a state seen from
+another side, in a mirror or with its colors relabelled hits the entry of
+any state in its class. The stored moves solve the class representative;
+they are mapped through the state's symmetry on the way in and out.
+
+    >>> cache = SolutionCache(maxsize=100_000)
+    >>> cache.solve(state)            # miss: runs the two-phase solver
+    >>> cache.solve(mirrored_state)   # hit: microseconds
+    >>> cache.stats()
+    {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1, 'maxsize': 100000, 'hit_rate': 0.5}
+
+Hits, misses and evictions are also counted in the metrics registry
+(``solution_cache_hits`` and so on) for the viewer overlay.
+"""
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+import cube_state
+import cube_symmetry
+import metrics
+
+_HITS = metrics.counter('solution_cache_hits')
+_MISSES = metrics.counter('solution_cache_misses')
+_EVICTIONS = metrics.counter('solution_cache_evictions')
+
+
+def _facelets(state) -> np.ndarray:
+    """Facelet array of a facelet array, facelet string or CubeState"""
+    if isinstance(state, str):
+        return cube_state.from_facelet_string(state)
+    if isinstance(state, cube_state.CubeState):
+        return state.facelets
+    return np.asarray(state)
+
+
+class SolutionCache:
+    """Least-recently-used map from symmetry class to a solution"""
+    def __init__(self, maxsize: int = 100_000, solver: Optional[Callable[..., List[int]]] = None):
+        if maxsize < 1:
+            raise ValueError(f"maxsize must be at least 1, got {maxsize}")
+        self.maxsize = maxsize
+        # solver(facelets, max_length, timeout) -> move list; two_phase.solve by default
+        self.solver = solver
+        self._entries: 'OrderedDict[int, bytes]' = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, state) -> bool:
+        return cube_symmetry.canonical_key(_facelets(state))[0] in self._entries
+
+    def get(self, state, max_length: Optional[int] = None) -> Optional[List[int]]:
+        """Cached solution for ``state``, or None (also if it is longer than ``max_length``)"""
+        key, sym = cube_symmetry.canonical_key(_facelets(state))
+        moves = self._entries.get(key)
+        if moves is None or (max_length is not None and len(moves) > max_length):
+            self.misses += 1
+            _MISSES.inc()
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        _HITS.inc()
+        return cube_symmetry.unmap_moves(list(moves), sym)
+
+    def put(self, state, moves: List[int]):
+        """Store ``moves`` as the solution of ``state`` and of its whole symmetry class"""
+        key, sym = cube_symmetry.canonical_key(_facelets(state))
+        self._entries[key] = bytes(cube_symmetry.map_moves(moves, sym))
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+            _EVICTIONS.inc()
+
+    def solve(self, state, max_length: int = 21, timeout: Optional[float] = None) -> List[int]:
+        """Solution from the cache, or from the solver on a miss (and then cached)"""
+        state = _facelets(state)
+        moves = self.get(state, max_length)
+        if moves is None:
+            if self.solver is None:
+                import two_phase  # builds its tables on first use
+                self.solver = two_phase.solve
+            moves = self.solver(state, max_length, timeout)
+            self.put(state, moves)
+        return moves
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,606 @@
+"""Local solve service: asyncio, JSON lines over a Unix socket or localhost TCP.
+
+Keeps the solver tables mapped and a process pool warm, so other programs
+on the host can solve or manipulate cubes without paying for interpreter
+and table startup on every call. Each request is one JSON object per line,
+and each response echoes its ``id``; responses on a connection may arrive
+out of order:
+
+    {"id": 1, "op": "solve", "scramble": "R U R' U'"}
+    {"id": 1, "solution": "U R U' R'", "length": 4, "cached": false, "seconds": 0.004}
+    {"id": 2, "op": "apply", "facelets": "UUUU...", "moves": "(R U R' U')3"}
+    {"id": 2, "facelets": "UUUU...", "solved": false, "seconds": 0.0003}
+    {"id": 3, "op": "key", "scramble": "R U"}          # canonical symmetry-class key
+    {"id": 4, "op": "stats"}
+    {"id": 5, "op": "solve", "facelets": "UUUX..."}
+    {"id": 5, "error": "Expected 54 characters ..."}
+
+States are given as a ``scramble`` (any move_compiler notation, applied to
+a solved cube) or as 54 URFDLB ``facelets``. ``solve`` also takes
+``max_length`` and ``timeout`` as in TwoPhaseSolver.solve. ``max_length``
+is clamped to 1..MAX_SOLVE_LENGTH, and ``timeout`` must be positive; it is
+capped at the server's ``max_timeout``, which also applies when the client
+sends none, so no request can hold a worker indefinitely.
+
+Requests are collected into micro-batches: the first request of a batch
+waits ``batch_window`` seconds for others, up to ``max_batch``. A batch is
+parsed and stacked into one (N, 54) matrix, ``apply`` and ``key`` requests
+are answered with one vectorized gather and one canonical_keys call, and
+solves are looked up in a solution_cache. Misses go to the process pool in
+chunks, so the event loop only ever does vectorized work and stays
+responsive while searches run.
+
+Backpressure: each connection has at most ``max_in_flight`` requests
+outstanding. Beyond that the server stops reading from the socket, so a
+fast client blocks in its own writes. Across all connections, requests
+beyond ``max_pending`` are answered at once with ``{"error": ..., "busy":
+true}`` instead of queueing without bound.
+
+    python solve_server.py serve --socket /tmp/cube.sock --processes 4
+    python solve_server.py client --socket /tmp/cube.sock scrambles.txt > solutions.jsonl
+    python solve_server.py client --socket /tmp/cube.sock --stats
+
+    >>> async with await SolveClient.connect(path='/tmp/cube.sock') as client:
+    ...     await client.solve(scramble="R U R' U'")
+    {'id': 1, 'solution': "U R U' R'", 'length': 4, ...}
+
+Standard library and numpy only.
+"""
+import asyncio
+import concurrent.futures
+import functools
+import json
+import logging
+import os
+import stat
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import cube_state
+import cube_symmetry
+import metrics
+import move_compiler
+import two_phase
+from solution_cache import SolutionCache
+
+logger = logging.getLogger(__name__)
+
+OPS = ('solve', 'apply', 'key', 'stats', 'ping')
+# Longest accepted request line; longer lines close the connection
+MAX_LINE = 1 << 16
+# Range client max_length values are clamped to
+MAX_SOLVE_LENGTH = 30
+
+
+# -- worker processes -------------------------------------------------------
+
+def _init_worker():
+    """Map the tables once per worker, before the first request arrives"""
+    two_phase.get_solver()
+
+
+def _solve_states(states: np.ndarray, max_lengths: List[int],
+                  timeouts: List[Optional[float]]) -> List[Tuple[Optional[List[int]], Optional[str]]]:
+    """(moves, None) or (None, error) for each state"""
+    solver = two_phase.get_solver()
+    results = []
+    for state, max_length, timeout in zip(states, max_lengths, timeouts):
+        try:
+            results.append((solver.solve(state, max_length, timeout), None))
+        except Exception as e:
+            results.append((None, str(e) or type(e).__name__))
+    return results
+
+
+# -- server -----------------------------------------------------------------
+
+def _remove_stale_socket(path: str):
+    """Unlink a socket left at ``path`` by an earlier server; refuse to remove anything else"""
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"{path} exists and is not a socket")
+    os.unlink(path)
+
+
+class _Pending:
+    """One accepted request waiting for its response"""
+    __slots__ = ('request', 'future', 'start', 'state', 'max_length', 'timeout')
+
+    def __init__(self, request: Dict, future: asyncio.Future):
+        self.request = request
+        self.future = future
+        self.start = time.perf_counter()
+        self.state: Optional[np.ndarray] = None
+        # Solve limits after clamping (see SolveServer._solve_limits)
+        self.max_length = 21
+        self.timeout: Optional[float] = None
+
+
+class SolveServer:
+    """Micro-batching solve service; see the module docstring for the protocol"""
+    def __init__(self, processes: Optional[int] = None, max_batch: int = 256, batch_window: float = 0.002,
+                 max_pending: int = 4096, max_in_flight: int = 128, solve_chunk: int = 4,
+                 cache_size: int = 100_000, max_timeout: float = 10.0):
+        if not max_timeout > 0:
+            raise ValueError(f"max_timeout must be positive, got {max_timeout}")
+        self.processes = processes or os.cpu_count() or 1
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.max_pending = max_pending
+        self.max_in_flight = max_in_flight
+        self.solve_chunk = solve_chunk
+        self.max_timeout = max_timeout
+        self.cache = SolutionCache(maxsize=cache_size)
+        self.metrics = metrics.Registry()
+        self.pending = 0
+        self.connections = 0
+        self.started = time.perf_counter()
+        self._queue: Optional[asyncio.Queue] = None
+        self._pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._path: Optional[str] = None
+        # Solve chunks in the pool, kept referenced until they finish
+        self._solves = set()
+        # Open connections: handler task -> writer, for a clean shutdown
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    async def start(self, path: Optional[str] = None, host: str = '127.0.0.1',
+                    port: int = 0) -> asyncio.AbstractServer:
+        """Warm up the tables and the pool, then listen on ``path`` (Unix socket) or ``host:port``"""
+        loop = asyncio.get_running_loop()
+        # Build or map the tables once here, so workers never race to generate them
+        await loop.run_in_executor(None, two_phase.load_tables)
+        if path is not None:
+            _remove_stale_socket(path)
+        self._pool = concurrent.futures.ProcessPoolExecutor(self.processes, initializer=_init_worker)
+        # Start every worker now rather than on the first solve
+        await asyncio.gather(*(loop.run_in_executor(self._pool, _init_worker) for _ in range(self.processes)))
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._batch_loop())
+        if path is not None:
+            self._path = path
+            self._server = await asyncio.start_unix_server(self._handle, path, limit=MAX_LINE)
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port, limit=MAX_LINE)
+        self.started = time.perf_counter()
+        logger.info("Serving on %s with %d processes", self.address, self.processes)
+        return self._server
+
+    @property
+    def address(self):
+        """Socket path, or (host, port) of the first listening socket"""
+        return self._server.sockets[0].getsockname() if self._server else None
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            if self._path is not None and os.path.exists(self._path):
+                os.unlink(self._path)
+        for writer in self._connections.values():
+            writer.close()
+        if self._connections:
+            await asyncio.gather(*self._connections, return_exceptions=True)
+        if self._batcher is not None:
+            self._batcher.cancel()
+        if self._pool is not None:
+            # shutdown() joins the workers; keep that off the event loop
+            await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(self._pool.shutdown, cancel_futures=True))
+
+    async def __aenter__(self) -> 'SolveServer':
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def stats(self) -> Dict:
+        """Request counts, batch sizes, latency percentiles (seconds) and cache figures"""
+        counters = {name: c.value for name, c in self.metrics.counters.items()}
+        uptime = time.perf_counter() - self.started
+        batches = counters.get('batches', 0)
+        return {
+            'uptime': uptime,
+            'processes': self.processes,
+            'connections': self.connections,
+            'pending': self.pending,
+            'requests': counters.get('requests', 0),
+            'errors': counters.get('errors', 0),
+            'rejected': counters.get('rejected', 0),
+            'batches': batches,
+            'mean_batch': counters.get('batched', 0) / batches if batches else 0.0,
+            'requests_per_second': counters.get('requests', 0) / uptime if uptime else 0.0,
+            'latency': self.metrics.histogram('latency').summary(),
+            'solve_latency': self.metrics.histogram('solve_latency').summary(),
+            'cache': self.cache.stats(),
+        }
+
+    # -- connections
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections[asyncio.current_task()] = writer
+        self.connections += 1
+        slots = asyncio.Semaphore(self.max_in_flight)
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(response: Dict):
+            async with write_lock:
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+
+        async def answer(future: asyncio.Future):
+            try:
+                await respond(await future)
+            except ConnectionError:
+                pass
+            finally:
+                slots.release()
+
+        try:
+            while True:
+                # Stop reading once this connection has max_in_flight requests outstanding
+                await slots.acquire()
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    await respond({'error': f"Request longer than {MAX_LINE} bytes"})
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    slots.release()
+                    continue
+                task = asyncio.create_task(answer(self.submit(line)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except ConnectionError:
+            pass
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            self.connections -= 1
+            del self._connections[asyncio.current_task()]
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    def submit(self, line: bytes) -> asyncio.Future:
+        """Accept one request line; the future resolves to its response dict"""
+        future = asyncio.get_running_loop().create_future()
+        self.metrics.counter('requests').inc()
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("A request must be a JSON object")
+        except ValueError as e:
+            self._fail(future, {}, f"Invalid request: {e}")
+            return future
+        op = request.get('op', 'solve')
+        if op not in OPS:
+            self._fail(future, request, f"Unknown op {op!r}, expected one of {OPS}")
+        elif op == 'stats':
+            future.set_result(self._response(request, **self.stats()))
+        elif op == 'ping':
+            future.set_result(self._response(request))
+        elif self.pending >= self.max_pending:
+            self.metrics.counter('rejected').inc()
+            future.set_result(self._response(request, error="Server busy, try again later", busy=True))
+        else:
+            self.pending += 1
+            future.add_done_callback(self._done)
+            self._queue.put_nowait(_Pending(request, future))
+        return future
+
+    def _done(self, future: asyncio.Future):
+        self.pending -= 1
+
+    @staticmethod
+    def _response(request: Dict, **fields) -> Dict:
+        return {'id': request['id'], **fields} if 'id' in request else fields
+
+    def _fail(self, future: asyncio.Future, request: Dict, message: str):
+        self.metrics.counter('errors').inc()
+        if not future.done():
+            future.set_result(self._response(request, error=message))
+
+    def _finish(self, item: _Pending, **fields):
+        seconds = time.perf_counter() - item.start
+        self.metrics.histogram('latency').observe(seconds)
+        if not item.future.done():
+            item.future.set_result(self._response(item.request, **fields, seconds=round(seconds, 6)))
+
+    # -- batches
+
+    async def _batch_loop(self):
+        while True:
+            batch = [await self._queue.get()]
+            if self.batch_window > 0 and self._queue.qsize() < self.max_batch - 1:
+                # Linger briefly so concurrent requests share the batch
+                await asyncio.sleep(self.batch_window)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                self._process(batch)
+            except Exception as e:
+                logger.exception("Batch failed")
+                for item in batch:
+                    self._fail(item.future, item.request, str(e) or type(e).__name__)
+
+    def _process(self, batch: List[_Pending]):
+        self.metrics.counter('batches').inc()
+        self.metrics.counter('batched').inc(len(batch))
+        # Parse every state; failures are answered here and drop out of the batch
+        parsed = []
+        for item in batch:
+            try:
+                item.state = self._parse(item.request)
+                if item.request.get('op', 'solve') == 'solve':
+                    item.max_length, item.timeout = self._solve_limits(item.request)
+                parsed.append(item)
+            except Exception as e:
+                self._fail(item.future, item.request, str(e) or type(e).__name__)
+        if not parsed:
+            return
+        states = np.stack([item.state for item in parsed])
+        ops = np.array([item.request.get('op', 'solve') for item in parsed])
+
+        apply_rows = np.flatnonzero(ops == 'apply')
+        if apply_rows.size:
+            self._apply(apply_rows, states, parsed)
+
+        key_rows = np.flatnonzero(ops == 'key')
+        if key_rows.size:
+            words, _ = cube_symmetry.canonical_keys(states[key_rows])
+            for row, word in zip(key_rows, words):
+                self._finish(parsed[row], key=format(cube_symmetry.key_from_words(word), 'x'))
+
+        misses = []
+        for row in np.flatnonzero(ops == 'solve'):
+            item = parsed[row]
+            try:
+                moves = self.cache.get(item.state, item.max_length)
+            except Exception as e:
+                self._fail(item.future, item.request, str(e) or type(e).__name__)
+                continue
+            if moves is None:
+                misses.append(item)
+            else:
+                self._finish(item, solution=cube_state.format_moves(moves), length=len(moves), cached=True)
+        for start in range(0, len(misses), self.solve_chunk):
+            task = asyncio.create_task(self._solve(misses[start:start + self.solve_chunk]))
+            self._solves.add(task)
+            task.add_done_callback(self._solves.discard)
+
+    def _parse(self, request: Dict) -> np.ndarray:
+        """Check the request's fields and return its start state; raises ValueError"""
+        for field in ('facelets', 'scramble', 'moves'):
+            if field in request and not isinstance(request[field], str):
+                raise ValueError(f"'{field}' must be a string")
+        if 'facelets' in request:
+            return cube_state.from_facelet_string(request['facelets'])
+        if 'scramble' in request:
+            return cube_state.solved_state()[move_compiler.compile_algorithm(request['scramble']).permutation]
+        if request.get('op', 'solve') == 'apply':
+            return cube_state.solved_state()
+        raise ValueError("The request needs a 'scramble' or 'facelets' field")
+
+    def _solve_limits(self, request: Dict) -> Tuple[int, float]:
+        """(max_length, timeout) for a solve: clamped and capped as the module docstring says"""
+        max_length = request.get('max_length', 21)
+        if isinstance(max_length, bool) or not isinstance(max_length, int):
+            raise ValueError("'max_length' must be an integer")
+        max_length = min(max(max_length, 1), MAX_SOLVE_LENGTH)
+        timeout = request.get('timeout')
+        if timeout is None:
+            return max_length, self.max_timeout
+        if isinstance(timeout, bool) or not isinstance(timeout, (int, float)):
+            raise ValueError("'timeout' must be a number or null")
+        if not timeout > 0:
+            raise ValueError(f"'timeout' must be positive, got {timeout}")
+        return max_length, min(timeout, self.max_timeout)
+
+    def _apply(self, rows: np.ndarray, states: np.ndarray, parsed: List[_Pending]):
+        """Apply each request's moves with one gather over all of them"""
+        permutations = np.empty((len(rows), 54), dtype=np.intp)
+        valid = np.ones(len(rows), dtype=bool)
+        for i, row in enumerate(rows):
+            try:
+                permutations[i] = move_compiler.compile_algorithm(parsed[row].request.get('moves', '')).permutation
+            except Exception as e:
+                valid[i] = False
+                self._fail(parsed[row].future, parsed[row].request, str(e) or type(e).__name__)
+        rows, permutations = rows[valid], permutations[valid]
+        results = np.take_along_axis(states[rows], permutations, axis=1)
+        solved = (results == results[:, 4::9].repeat(9, axis=1)).all(axis=1)
+        for row, result, is_solved in zip(rows, results, solved):
+            self._finish(parsed[row], facelets=cube_state.to_facelet_string(result), solved=bool(is_solved))
+
+    async def _solve(self, items: List[_Pending]):
+        """Run one chunk of solves in the pool and cache the results"""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            results = await loop.run_in_executor(
+                self._pool, _solve_states, np.stack([item.state for item in items]),
+                [item.max_length for item in items], [item.timeout for item in items])
+        except Exception as e:
+            logger.exception("Solve chunk failed")
+            for item in items:
+                self._fail(item.future, item.request, str(e) or type(e).__name__)
+            return
+        self.metrics.histogram('solve_latency').observe(time.perf_counter() - start)
+        for item, (moves, error) in zip(items, results):
+            if error is not None:
+                self._fail(item.future, item.request, error)
+                continue
+            self.cache.put(item.state, moves)
+            self._finish(item, solution=cube_state.format_moves(moves), length=len(moves), cached=False)
+
+
+# -- client -----------------------------------------------------------------
+
+class SolveClient:
+    """Asyncio client for a SolveServer; many requests may be outstanding at once"""
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+        self._next_id = 0
+        self._waiting: Dict[int, asyncio.Future] = {}
+        self._receiver = asyncio.create_task(self._receive())
+
+    @classmethod
+    async def connect(cls, path: Optional[str] = None, host: str = '127.0.0.1',
+                      port: Optional[int] = None) -> 'SolveClient':
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path, limit=MAX_LINE)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE)
+        return cls(reader, writer)
+
+    async def __aenter__(self) -> 'SolveClient':
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def request(self, op: str, **fields) -> Dict:
+        """Send one request and wait for its response (errors come back as an 'error' field)"""
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[request_id] = future
+        self._writer.write(json.dumps({'id': request_id, 'op': op, **fields}).encode() + b'\n')
+        await self._writer.drain()
+        return await future
+
+    async def solve(self, scramble: Optional[str] = None, facelets: Optional[str] = None, **options) -> Dict:
+        return await self.request('solve', **self._state(scramble, facelets), **options)
+
+    async def apply(self, moves: str, scramble: Optional[str] = None, facelets: Optional[str] = None) -> Dict:
+        return await self.request('apply', moves=moves, **self._state(scramble, facelets))
+
+    async def key(self, scramble: Optional[str] = None, facelets: Optional[str] = None) -> Dict:
+        return await self.request('key', **self._state(scramble, facelets))
+
+    async def stats(self) -> Dict:
+        return await self.request('stats')
+
+    @staticmethod
+    def _state(scramble: Optional[str], facelets: Optional[str]) -> Dict:
+        return {'facelets': facelets} if facelets is not None else {'scramble': scramble or ''}
+
+    async def _receive(self):
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self._waiting.pop(response.get('id'), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        finally:
+            for future in self._waiting.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Connection to the solve server closed"))
+            self._waiting.clear()
+
+    async def close(self):
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+        self._receiver.cancel()
+
+
+# -- command line -----------------------------------------------------------
+
+async def _serve(args):
+    server = SolveServer(args.processes, args.max_batch, args.batch_window, args.max_pending, args.max_in_flight,
+                         max_timeout=args.max_timeout)
+    await server.start(args.socket, args.host, args.port)
+    print(f"Serving on {server.address}", file=sys.stderr)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+async def _client(args):
+    import batch_solve
+
+    async with await SolveClient.connect(args.socket, args.host, args.port) as client:
+        if args.stats:
+            print(json.dumps(await client.stats(), indent=2))
+            return
+        source = sys.stdin if args.input == '-' else open(args.input)
+        lines = [line.strip() for line in source if line.strip()]
+        if source is not sys.stdin:
+            source.close()
+
+        async def one(line: str) -> Dict:
+            try:
+                _, state = batch_solve.parse_scramble(line)
+            except ValueError as e:
+                return {'input': line, 'error': str(e)}
+            response = await client.solve(facelets=cube_state.to_facelet_string(state), max_length=args.max_length)
+            response.pop('id', None)
+            return {'input': line, **response}
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one(line) for line in lines))
+        elapsed = time.perf_counter() - start
+        for index, result in enumerate(results):
+            print(json.dumps({'index': index, **result}))
+        print(f"{len(results)} requests in {elapsed:.2f} s ({len(results) / elapsed if elapsed else 0:.1f}/s)",
+              file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local cube solve service and client")
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve = sub.add_parser('serve', help="run the server until interrupted")
+    client = sub.add_parser('client', help="solve scrambles (one per line) through a running server")
+    for p in (serve, client):
+        p.add_argument('--socket', default=None, help="Unix socket path (default: TCP on --host/--port)")
+        p.add_argument('--host', default='127.0.0.1')
+        p.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--processes', type=int, default=None, help="solver processes (default: all cores)")
+    serve.add_argument('--max-batch', type=int, default=256)
+    serve.add_argument('--batch-window', type=float, default=0.002, help="seconds to wait for a batch to fill")
+    serve.add_argument('--max-pending', type=int, default=4096, help="requests queued before 'busy' replies")
+    serve.add_argument('--max-in-flight', type=int, default=128, help="outstanding requests per connection")
+    serve.add_argument('--max-timeout', type=float, default=10.0,
+                       help="longest any solve may search, and the timeout when a request gives none")
+    serve.add_argument('-v', '--verbose', action='store_true')
+    client.add_argument('input', nargs='?', default='-', help="text or JSONL file, '-' for stdin (default)")
+    client.add_argument('--max-length', type=int, default=21)
+    client.add_argument('--stats', action='store_true', help="print the server's stats and exit")
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                            format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+        try:
+            asyncio.run(_serve(args))
+        except KeyboardInterrupt:
+            pass
+    else:
+        asyncio.run(_client(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+"""Compact 9-byte cube states and a memory-mapped bulk state file.
+
+A 3x3x3 state is fully described by its cubie coordinates:
+
+    corners   permutation rank (8!) * 3^7 twists     < 2^27
+    edges     permutation rank (12!) * 2^11 flips    < 2^40
+
+so it packs into 67 bits, stored as one 9-byte record: a little-endian
+uint64 holding the edge coordinate in bits 0-39 and the low 24 bits of the
+corner coordinate above it, then one byte with the top 3 corner bits.
+Records compare equal exactly when the states do (after
+cube_state.normalize_centers), so they also work as set or dict keys via
+``tobytes()``. Every conversion works on a leading batch axis without a
+Python loop.
+
+The state file is a small header followed by packed records, so a file
+of any size can be ``np.memmap``-ed and sliced without parsing:
+
+    offset 0      magic b'RUBIKSTS' + uint32 header length (little-endian)
+    offset 12     JSON header: format version, record size, record count and
+                  optional user metadata
+    4096          count * 9 bytes of records
+
+    with StateWriter('corpus.states', metadata={'source': 'random walk'}) as out:
+        out.write(states)               # (N, 54) facelets, any number of calls
+    records = open_states('corpus.states')   # read-only memmap, shape (count,)
+    facelets = decode(records[1000:2000])
+"""
+import json
+import os
+import struct
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import cube_state
+import cubie_cube
+from cubie_cube import N_FLIP, N_TWIST
+
+RECORD = np.dtype([('low', '<u8'), ('high', 'u1')])
+assert RECORD.itemsize == 9
+
+MAGIC = b'RUBIKSTS'
+FORMAT_VERSION = 1
+DATA_OFFSET = 4096
+_PREFIX = struct.Struct('<8sI')
+_EDGE_BITS = 40
+_EDGE_MASK = (1 << _EDGE_BITS) - 1
+_CORNER_LOW_BITS = 64 - _EDGE_BITS
+
+
+class StateFileError(ValueError):
+    """The file is not a state file this version can read"""
+
+
+# -- records ----------------------------------------------------------------
+
+def encode_cubies(cp: np.ndarray, co: np.ndarray, ep: np.ndarray, eo: np.ndarray) -> np.ndarray:
+    """(N, 8/8/12/12) cubie arrays -> (N,) RECORD array"""
+    cp, co, ep, eo = (np.atleast_2d(a) for a in (cp, co, ep, eo))
+    corner = (cubie_cube.perm_rank(cp) * N_TWIST + cubie_cube.twist(co)).astype(np.uint64)
+    edge = (cubie_cube.perm_rank(ep) * N_FLIP + cubie_cube.flip(eo)).astype(np.uint64)
+    records = np.empty(len(cp), dtype=RECORD)
+    records['low'] = edge | (corner << np.uint64(_EDGE_BITS))
+    records['high'] = corner >> np.uint64(_CORNER_LOW_BITS)
+    return records
+
+
+def decode_cubies(records: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(N,) RECORD array -> cp, co, ep, eo"""
+    records = np.atleast_1d(records)
+    low = records['low'].astype(np.uint64)
+    edge = (low & np.uint64(_EDGE_MASK)).astype(np.int64)
+    corner = ((low >> np.uint64(_EDGE_BITS)) | (records['high'].astype(np.uint64) << np.uint64(_CORNER_LOW_BITS))
+              ).astype(np.int64)
+    corner_perm, twist = np.divmod(corner, N_TWIST)
+    edge_perm, flip = np.divmod(edge, N_FLIP)
+    return (cubie_cube.perm_unrank(corner_perm, 8), cubie_cube.twist_to_co(twist),
+            cubie_cube.perm_unrank(edge_perm, 12), cubie_cube.flip_to_eo(flip))
+
+
+def encode(states: np.ndarray, validate: bool = True) -> np.ndarray:
+    """(N, 54) or (54,) facelet states -> (N,) RECORD array
+
+    Centers are normalized first (see cube_state.normalize_centers). Raises
+    ValueError for facelets that do not describe a reachable cube, unless
+    ``validate`` is false, in which case only the cubie lookup is checked.
+    """
+    states = np.asarray(states, dtype=np.uint8).reshape(-1, 54)
+    centers = states[:, 4::9]
+    if (centers != np.arange(6)).any():
+        states = np.array([cube_state.normalize_centers(s) for s in states])
+    cp, co, ep, eo = cubie_cube.from_facelets(states)
+    if validate:
+        cubie_cube.verify(cp, co, ep, eo)
+    return encode_cubies(cp, co, ep, eo)
+
+
+def decode(records: np.ndarray) -> np.ndarray:
+    """(N,) RECORD array -> (N, 54) uint8 facelet states"""
+    return cubie_cube.to_facelets(*decode_cubies(records))
+
+
+def to_bytes(state) -> bytes:
+    """One state (facelets or a CubeState) as 9 bytes"""
+    if isinstance(state, cube_state.CubeState):
+        state = state.facelets
+    return encode(state).tobytes()
+
+
+def from_bytes(data: bytes) -> np.ndarray:
+    """Facelets of 9 bytes from to_bytes; a multiple of 9 bytes gives (N, 54)"""
+    records = np.frombuffer(data, dtype=RECORD)
+    states = decode(records)
+    return states[0] if len(data) == RECORD.itemsize else states
+
+
+# -- state files ------------------------------------------------------------
+
+def _header_bytes(count: int, metadata: Dict) -> bytes:
+    header = json.dumps({
+        'format': FORMAT_VERSION,
+        'record_size': RECORD.itemsize,
+        'count': count,
+        'metadata': metadata,
+    }, sort_keys=True).encode()
+    prefix = _PREFIX.pack(MAGIC, len(header))
+    if len(prefix) + len(header) > DATA_OFFSET:
+        raise ValueError("State file metadata is too large")
+    return (prefix + header).ljust(DATA_OFFSET, b'\0')
+
+
+class StateWriter:
+    """Streams encoded states into a state file
+
+    Records are appended as they come; the header, with the final count, is
+    written on close, and the file is renamed into place only then, so a
+    reader never sees a partial file.
+    """
+    def __init__(self, path: str, metadata: Optional[Dict] = None, validate: bool = True):
+        self.path = path
+        self.metadata = metadata or {}
+        self.validate = validate
+        self.count = 0
+        self._tmp = f"{path}.{os.getpid()}.tmp"
+        self._file = open(self._tmp, 'wb')
+        self._file.write(_header_bytes(0, self.metadata))
+
+    def __enter__(self) -> 'StateWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, states: np.ndarray):
+        """Append (N, 54) facelet states"""
+        self.write_records(encode(states, self.validate))
+
+    def write_records(self, records: np.ndarray):
+        """Append already encoded records"""
+        records = np.ascontiguousarray(records, dtype=RECORD)
+        self._file.write(records.tobytes())
+        self.count += len(records)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.seek(0)
+        self._file.write(_header_bytes(self.count, self.metadata))
+        self._file.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        """Discard everything written so far"""
+        if not self._file.closed:
+            self._file.close()
+            os.unlink(self._tmp)
+
+
+def write_states(path: str, states: np.ndarray, metadata: Optional[Dict] = None):
+    """Write all ``states`` ((N, 54) facelets) to a state file at once"""
+    with StateWriter(path, metadata) as out:
+        out.write(states)
+
+
+def read_header(path: str) -> Dict:
+    """Header of a state file; raises StateFileError if it is not one"""
+    with open(path, 'rb') as f:
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            raise StateFileError(f"{path}: too short for a state file")
+        magic, length = _PREFIX.unpack(prefix)
+        if magic != MAGIC:
+            raise StateFileError(f"{path}: not a state file")
+        try:
+            header = json.loads(f.read(length))
+        except ValueError as e:
+            raise StateFileError(f"{path}: bad header ({e})") from None
+    if header.get('format') != FORMAT_VERSION or header.get('record_size') != RECORD.itemsize:
+        raise StateFileError(f"{path}: unsupported format {header.get('format')}")
+    if os.path.getsize(path) < DATA_OFFSET + header['count'] * RECORD.itemsize:
+        raise StateFileError(f"{path}: truncated")
+    return header
+
+
+def open_states(path: str) -> np.ndarray:
+    """Read-only (count,) RECORD memmap of a state file; slice it, then decode()"""
+    count = read_header(path)['count']
+    if not count:
+        return np.zeros(0, dtype=RECORD)
+    return np.memmap(path, dtype=RECORD, mode='r', offset=DATA_OFFSET, shape=(count,))
+
+
+def iter_states(path: str, chunk: int = 1 << 16) -> Iterator[np.ndarray]:
+    """Decoded (n, 54) facelet blocks of at most ``chunk`` states, in file order"""
+    records = open_states(path)
+    for start in range(0, len(records), chunk):
+        yield decode(records[start:start + chunk])
+
+
+def main(argv: Optional[List[str]] = None):
+    import argparse
+    import sys
+
+    import batch_solve
+
+    parser = argparse.ArgumentParser(description="Convert between scramble text and packed state files")
+    sub = parser.add_subparsers(dest='command', required=True)
+    pack = sub.add_parser('pack', help="scrambles or facelet strings, one per line -> state file")
+    pack.add_argument('input', nargs='?', help="text file (default: stdin)")
+    pack.add_argument('-o', '--output', required=True)
+    unpack = sub.add_parser('unpack', help="state file -> 54-character facelet strings")
+    unpack.add_argument('input')
+    unpack.add_argument('--start', type=int, default=0)
+    unpack.add_argument('--stop', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == 'pack':
+        lines = open(args.input) if args.input else sys.stdin
+        with lines, StateWriter(args.output) as out:
+            batch = []
+            for number, line in enumerate(lines, 1):
+                if line.strip():
+                    try:
+                        batch.append(batch_solve.parse_scramble(line)[1])
+                    except ValueError as e:
+                        parser.error(f"line {number}: {e}")
+                if len(batch) >= 1 << 14:
+                    out.write(np.array(batch))
+                    batch = []
+            if batch:
+                out.write(np.array(batch))
+        print(f"{args.output}: {out.count} states", file=sys.stderr)
+    else:
+        records = open_states(args.input)[args.start:args.stop]
+        for start in range(0, len(records), 1 << 16):
+            for state in decode(records[start:start + (1 << 16)]):
+                print(cube_state.to_facelet_string(state))
+
+
+if __name__ == '__main__':
+    main()
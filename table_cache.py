@@ -0,0 +1,261 @@
+"""Memory-mapped on-disk cache for solver lookup tables.
+
+Each table set (e.g. the two-phase move and pruning tables) is generated
+once, in parallel across cores, and written to a single versioned file:
+
+    offset 0      magic b'RUBIKTBL' + uint32 header length (little-endian)
+    offset 12     JSON header (utf-8): format version, table set name and version,
+                  layout hash, and for each table its dtype, shape, byte
+                  offset and CRC-32
+    4096-aligned  raw table data starting at the first page boundary after the
+                  header, each table starting on a page boundary
+
+Later processes map the file read-only with np.memmap, so startup is just
+reading the header and every process on the host shares the same physical
+pages. The header records a hash of the expected layout (table names,
+shapes, dtypes and the table set version). Every open checks the header,
+each table's entry against the layout and that the file is exactly as long
+as the header says; any mismatch, or a missing file, regenerates it. The
+per-table CRC-32s are only checked with verify=True, since that reads every
+page. Writes go to a temporary file that is renamed into place, so
+concurrent processes never see a half-written file; the file is made
+readable by everyone (less the umask) so other users can map it too.
+
+Files live in $RUBIKS_TABLE_DIR, else $XDG_CACHE_HOME/rubikscube, else
+~/.cache/rubikscube.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import struct
+import zlib
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+MAGIC = b'RUBIKTBL'
+FORMAT_VERSION = 1
+ALIGNMENT = 4096
+_PREFIX = struct.Struct('<8sI')
+
+Layout = Dict[str, Tuple[Tuple[int, ...], type]]
+Builder = Callable[[str, Dict[str, np.ndarray]], np.ndarray]
+
+
+class TableFileError(ValueError):
+    """A table file is missing, corrupt or was written for another layout"""
+
+
+def cache_dir() -> str:
+    """Directory that holds the table files"""
+    if os.environ.get('RUBIKS_TABLE_DIR'):
+        return os.environ['RUBIKS_TABLE_DIR']
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'rubikscube')
+
+
+def table_path(kind: str, version: int, directory: Optional[str] = None) -> str:
+    return os.path.join(directory or cache_dir(), f'{kind}-v{version}.tbl')
+
+
+def layout_hash(kind: str, version: int, layout: Layout) -> str:
+    """Hash of everything that determines the file contents"""
+    description = [kind, version, FORMAT_VERSION] + [
+        [name, list(shape), np.dtype(dtype).str] for name, (shape, dtype) in sorted(layout.items())
+    ]
+    return hashlib.sha256(json.dumps(description).encode()).hexdigest()
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_tables(path: str, kind: str, version: int, layout: Layout, tables: Dict[str, np.ndarray]):
+    """Write ``tables`` to ``path`` atomically"""
+    entries = {}
+    offset = 0
+    for name, (shape, dtype) in layout.items():
+        array = np.ascontiguousarray(tables[name], dtype=dtype)
+        if array.shape != tuple(shape):
+            raise ValueError(f"Table {name} has shape {array.shape}, layout says {tuple(shape)}")
+        entries[name] = {
+            'dtype': np.dtype(dtype).str,
+            'shape': list(shape),
+            'offset': offset,
+            'nbytes': array.nbytes,
+            'crc32': zlib.crc32(array),
+        }
+        offset = _align(offset + array.nbytes)
+    header = {
+        'format_version': FORMAT_VERSION,
+        'kind': kind,
+        'version': version,
+        'layout_hash': layout_hash(kind, version, layout),
+        'tables': entries,
+    }
+    header_bytes = json.dumps(header).encode()
+    data_start = _align(_PREFIX.size + len(header_bytes))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = _create_temp(directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_PREFIX.pack(MAGIC, len(header_bytes)))
+            f.write(header_bytes)
+            for name, (shape, dtype) in layout.items():
+                f.seek(data_start + entries[name]['offset'])
+                f.write(np.ascontiguousarray(tables[name], dtype=dtype).tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _create_temp(directory: str) -> Tuple[int, str]:
+    """Create a uniquely named 0644 file (less the umask) in ``directory``; return (fd, path)"""
+    # Unlike mkstemp (always 0600), this leaves the umask to the kernel, so
+    # nothing here touches the process-wide umask
+    while True:
+        path = os.path.join(directory, f'.tables-{os.urandom(8).hex()}')
+        try:
+            return os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644), path
+        except FileExistsError:
+            continue
+
+
+def read_header(path: str) -> dict:
+    """Parse and return the JSON header of a table file"""
+    try:
+        with open(path, 'rb') as f:
+            magic, length = _PREFIX.unpack(f.read(_PREFIX.size))
+            if magic != MAGIC:
+                raise TableFileError(f"{path} is not a table file")
+            header = json.loads(f.read(length))
+            header['data_start'] = _align(_PREFIX.size + length)
+            return header
+    except (OSError, struct.error, ValueError) as e:
+        raise TableFileError(f"Cannot read table file {path}: {e}") from e
+
+
+def map_tables(path: str, kind: str, version: int, layout: Layout, verify: bool = False) -> Dict[str, np.ndarray]:
+    """Map a table file read-only; raises TableFileError if it does not match ``layout``
+
+    ``verify`` also checks every table's CRC-32, which reads the whole file.
+    """
+    header = read_header(path)
+    if (header.get('format_version') != FORMAT_VERSION or header.get('kind') != kind
+            or header.get('version') != version or header.get('layout_hash') != layout_hash(kind, version, layout)):
+        raise TableFileError(f"{path} was written for a different table layout")
+    data_start = header['data_start']
+    entries = header.get('tables')
+    if not isinstance(entries, dict) or sorted(entries) != sorted(layout):
+        raise TableFileError(f"{path} has a corrupt table index")
+    for name, (shape, dtype) in layout.items():
+        entry = entries[name]
+        try:
+            valid = (entry['dtype'] == np.dtype(dtype).str and entry['shape'] == list(shape)
+                     and entry['nbytes'] == int(np.prod(shape)) * np.dtype(dtype).itemsize
+                     and isinstance(entry['offset'], int) and entry['offset'] % ALIGNMENT == 0)
+        except (KeyError, TypeError):
+            valid = False
+        if not valid:
+            raise TableFileError(f"{path} has a corrupt entry for table {name}")
+    size = os.path.getsize(path)
+    end = max(data_start + e['offset'] + e['nbytes'] for e in entries.values())
+    if size < end:
+        raise TableFileError(f"{path} is truncated")
+    if size > end:
+        raise TableFileError(f"{path} has {size - end} unexpected trailing bytes")
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    tables = {}
+    for name, entry in entries.items():
+        start = data_start + entry['offset']
+        raw = np.asarray(data[start:start + entry['nbytes']])
+        if verify and zlib.crc32(raw) != entry['crc32']:
+            raise TableFileError(f"Checksum mismatch for table {name} in {path}")
+        tables[name] = raw.view(entry['dtype']).reshape(entry['shape'])
+    return tables
+
+
+def _build_one(args) -> Tuple[str, np.ndarray]:
+    builder, name, deps = args
+    return name, builder(name, deps)
+
+
+def build_parallel(builder: Builder, stages: Sequence[Sequence[str]], processes: Optional[int] = None
+                   ) -> Dict[str, np.ndarray]:
+    """Build tables stage by stage, each stage's tables in parallel
+
+    ``builder(name, tables)`` gets every table from earlier stages. Inside a
+    daemonic pool worker, which may not start children, tables are built
+    serially.
+    """
+    processes = processes or os.cpu_count() or 1
+    if multiprocessing.current_process().daemon:
+        processes = 1
+    tables: Dict[str, np.ndarray] = {}
+    for stage in stages:
+        tasks = [(builder, name, dict(tables)) for name in stage]
+        if processes > 1 and len(tasks) > 1:
+            with multiprocessing.Pool(min(processes, len(tasks))) as pool:
+                tables.update(pool.map(_build_one, tasks))
+        else:
+            tables.update(_build_one(task) for task in tasks)
+    return tables
+
+
+def open_tables(kind: str, version: int, layout: Layout, builder: Builder, stages: Sequence[Sequence[str]],
+                directory: Optional[str] = None, processes: Optional[int] = None, rebuild: bool = False
+                ) -> Dict[str, np.ndarray]:
+    """Map the cached tables, generating the file first if needed
+
+    If the cache directory is not writable the freshly built in-memory
+    tables are returned instead.
+    """
+    path = table_path(kind, version, directory)
+    if not rebuild:
+        try:
+            return map_tables(path, kind, version, layout)
+        except TableFileError:
+            pass
+    tables = build_parallel(builder, stages, processes)
+    try:
+        write_tables(path, kind, version, layout, tables)
+    except OSError:
+        return tables
+    return map_tables(path, kind, version, layout)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Generate (or regenerate) the table files ahead of time"""
+    import argparse
+    import time
+
+    import two_phase
+
+    parser = argparse.ArgumentParser(description="Build the solver table cache")
+    parser.add_argument('--dir', help="cache directory (default: %(default)s)", default=cache_dir())
+    parser.add_argument('--processes', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--rebuild', action='store_true', help="regenerate even if the file is valid")
+    parser.add_argument('--optimal', action='store_true',
+                        help="also build the optimal solver's pattern databases (~135 MB, a few minutes)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    two_phase.load_tables(args.dir, args.processes, args.rebuild)
+    path = table_path('two_phase', two_phase.TABLE_VERSION, args.dir)
+    print(f"{path}: {os.path.getsize(path) / 1e6:.1f} MB in {time.perf_counter() - start:.1f} s")
+    if args.optimal:
+        import optimal_solver
+
+        start = time.perf_counter()
+        optimal_solver.load_tables(args.dir, args.processes, args.rebuild)
+        path = table_path('optimal', optimal_solver.TABLE_VERSION, args.dir)
+        print(f"{path}: {os.path.getsize(path) / 1e6:.1f} MB in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+"""Shared fixtures: seeded generators and random reachable states"""
+import numpy as np
+import pytest
+
+import cube_state
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(1234)
+
+
+@pytest.fixture
+def scrambles(rng):
+    """Ten random 30-move sequences (MOVE_TABLE indices)"""
+    return [rng.integers(len(cube_state.MOVE_TABLE), size=30).tolist() for _ in range(10)]
+
+
+@pytest.fixture
+def states(scrambles):
+    """(10, 54) facelets reached by the scrambles"""
+    return np.array([cube_state.apply_moves(cube_state.solved_state(), moves) for moves in scrambles])
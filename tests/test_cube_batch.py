@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+import cube_state
+from cube_batch import CubeBatch
+
+
+def test_apply_sequence_matches_each_cube(states):
+    moves = cube_state.parse_moves("R U2 F' L D B2")
+    batch = CubeBatch(states.copy()).apply_sequence(moves)
+    for row, state in zip(batch.states, states):
+        np.testing.assert_array_equal(row, cube_state.apply_moves(state, moves))
+    np.testing.assert_array_equal(CubeBatch(states.copy()).apply_sequence("R U2 F' L D B2").states, batch.states)
+
+
+def test_apply_per_row_matches_each_cube(rng, states):
+    moves = rng.integers(-1, 18, size=len(states))
+    batch = CubeBatch(states.copy()).apply_per_row(moves)
+    for row, state, move in zip(batch.states, states, moves):
+        np.testing.assert_array_equal(row, state if move < 0 else cube_state.apply_move(state, move))
+
+
+def test_apply_sequences_matches_each_cube(rng, states):
+    moves = rng.integers(18, size=(len(states), 70))
+    moves[::2, 50:] = -1  # ragged rows
+    batch = CubeBatch(states.copy()).apply_sequences(moves)
+    for row, state, sequence in zip(batch.states, states, moves):
+        np.testing.assert_array_equal(row, cube_state.apply_moves(state, sequence[sequence >= 0]))
+
+
+def test_solved_and_equals(states):
+    batch = CubeBatch.solved(3)
+    assert batch.is_solved().all()
+    batch.apply_per_row([0, -1, 5])
+    assert batch.is_solved().tolist() == [False, True, False]
+    assert CubeBatch(states.copy()).equals(states).all()
+
+
+def test_facelet_strings_round_trip(states):
+    batch = CubeBatch.from_facelet_strings(CubeBatch(states.copy()).facelet_strings())
+    np.testing.assert_array_equal(batch.states, states)
+
+
+def test_apply_per_row_rejects_bad_moves():
+    with pytest.raises(ValueError):
+        CubeBatch.solved(2).apply_per_row([0, 18])
+    with pytest.raises(ValueError):
+        CubeBatch.solved(2).apply_per_row([0])
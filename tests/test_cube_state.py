@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+import cube_state
+from cube_state import CubeState, apply_moves, parse_moves, solved_state
+
+
+def replay(state, moves):
+    for move in moves:
+        state = state[cube_state.MOVE_TABLE[move]]
+    return state
+
+
+def test_sexy_move_has_order_six():
+    moves = parse_moves("R U R' U'")
+    state = solved_state()
+    for repeat in range(1, 7):
+        state = apply_moves(state, moves)
+        assert cube_state.is_solved(state) == (repeat == 6)
+
+
+def test_every_move_has_order_four_and_an_inverse():
+    for move in range(len(cube_state.MOVE_TABLE)):
+        once = cube_state.apply_move(solved_state(), move)
+        assert not cube_state.is_solved(once)
+        assert cube_state.is_solved(once[cube_state.MOVE_TABLE[cube_state.INVERSE_MOVE[move]]])
+        assert cube_state.is_solved(apply_moves(solved_state(), [move] * 4))
+
+
+@pytest.mark.parametrize('length', [0, 1, 10, 63, 64, 65, 66, 200])
+def test_apply_moves_matches_step_by_step_replay(rng, length):
+    # 64 moves and up go through the triple table
+    start = replay(solved_state(), rng.integers(18, size=25).tolist())
+    moves = rng.integers(18, size=length)
+    expected = replay(start, moves.tolist())
+    np.testing.assert_array_equal(apply_moves(start, moves), expected)
+    np.testing.assert_array_equal(apply_moves(start, moves.tolist()), expected)
+    np.testing.assert_array_equal(start[cube_state.compose_moves(moves)], expected)
+
+
+def test_notation_and_facelet_string_round_trip(scrambles, states):
+    for moves, state in zip(scrambles, states):
+        assert parse_moves(cube_state.format_moves(moves)) == moves
+        np.testing.assert_array_equal(cube_state.from_facelet_string(cube_state.to_facelet_string(state)), state)
+
+
+def test_invalid_input_raises_value_error():
+    with pytest.raises(ValueError):
+        parse_moves("R X")
+    with pytest.raises(ValueError):
+        cube_state.from_facelet_string("U" * 53)
+
+
+def test_cube_state_scramble_and_bytes(rng):
+    cube = CubeState()
+    moves = cube.scramble(40)
+    np.testing.assert_array_equal(cube.facelets, replay(solved_state(), moves))
+    assert CubeState.from_bytes(cube.to_bytes()).facelet_string() == cube.facelet_string()
+    cube.apply_moves(cube_state.INVERSE_MOVE[moves[::-1]])
+    assert cube.is_solved()
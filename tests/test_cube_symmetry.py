@@ -0,0 +1,39 @@
+import numpy as np
+
+import cube_state
+import cube_symmetry
+
+
+def test_key_is_shared_by_every_symmetric_image(states):
+    for state in states[:3]:
+        key, sym = cube_symmetry.canonical_key(state)
+        for other in range(48):
+            assert cube_symmetry.canonical_key(cube_symmetry.transform(state, other))[0] == key
+        # The returned symmetry produces the class representative
+        assert cube_symmetry.canonical_key(cube_symmetry.transform(state, sym))[0] == key
+
+
+def test_batch_keys_match_single_keys(states):
+    words, syms = cube_symmetry.canonical_keys(states, chunk=4)
+    for state, row in zip(states, words):
+        assert cube_symmetry.key_from_words(row) == cube_symmetry.canonical_key(state)[0]
+
+
+def test_different_positions_get_different_keys():
+    solved = cube_state.solved_state()
+    one_turn = cube_symmetry.canonical_key(cube_state.apply_move(solved, 0))[0]
+    half_turn = cube_symmetry.canonical_key(cube_state.apply_move(solved, 1))[0]
+    assert len({cube_symmetry.canonical_key(solved)[0], one_turn, half_turn}) == 3
+    # Every quarter turn is the same position seen from another side
+    assert {cube_symmetry.canonical_key(cube_state.apply_move(solved, m))[0] for m in range(0, 18, 3)} == {one_turn}
+
+
+def test_mapped_moves_solve_the_transformed_state(scrambles):
+    moves = scrambles[0]
+    state = cube_state.apply_moves(cube_state.solved_state(), moves)
+    solution = cube_state.INVERSE_MOVE[moves[::-1]].tolist()
+    for sym in range(48):
+        image = cube_symmetry.transform(state, sym)
+        assert cube_state.is_solved(cube_state.apply_moves(image, cube_symmetry.map_moves(solution, sym)))
+        np.testing.assert_array_equal(cube_symmetry.unmap_moves(cube_symmetry.map_moves(solution, sym), sym),
+                                      solution)
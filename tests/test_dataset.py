@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+import cube_state
+import dataset
+import state_codec
+
+
+def test_walk_depths_and_faces(rng):
+    walks, max_depth = 50, 12
+    facelets, depths = dataset.random_walks(walks, max_depth, rng)
+    assert facelets.shape == (walks * max_depth, 54)
+    np.testing.assert_array_equal(depths, np.repeat(np.arange(1, max_depth + 1), walks))
+    # Recover each walk's moves from consecutive states
+    moves = np.empty((walks, max_depth), dtype=np.intp)
+    previous = np.tile(cube_state.solved_state(), (walks, 1))
+    for step in range(max_depth):
+        current = facelets[step * walks:(step + 1) * walks]
+        candidates = previous[:, cube_state.MOVE_TABLE]  # (walks, 18, 54)
+        matches = (candidates == current[:, None]).all(axis=2)
+        assert matches.sum(axis=1).tolist() == [1] * walks
+        moves[:, step] = matches.argmax(axis=1)
+        previous = current
+    faces = moves // 3
+    assert not (faces[:, 1:] == faces[:, :-1]).any()
+    assert not (faces[:, 1:] == faces[:, :-1] - 3).any()
+
+
+def test_uniform_states_are_reachable(rng):
+    states = dataset.uniform_states(500, rng)
+    np.testing.assert_array_equal(state_codec.decode(state_codec.encode(states)), states)
+
+
+def test_shards_are_reproducible_and_skipped(tmp_path):
+    first = sorted(dataset.generate(str(tmp_path / 'a'), 'walk', shards=3, shard_size=1000, seed=2, processes=1))
+    assert [written for _, _, written in first] == [True] * 3
+    again = list(dataset.generate(str(tmp_path / 'a'), 'walk', shards=3, shard_size=1000, seed=2, processes=1))
+    assert [written for _, _, written in again] == [False] * 3
+    list(dataset.generate(str(tmp_path / 'b'), 'walk', shards=3, shard_size=1000, seed=2, processes=2))
+    for a, b in zip(dataset.load(str(tmp_path / 'a')), dataset.load(str(tmp_path / 'b'))):
+        np.testing.assert_array_equal(a, b)
+        assert a['depth'].min() >= 1 and a['depth'].max() <= 30
+
+
+def test_changed_settings_are_refused(tmp_path):
+    list(dataset.generate(str(tmp_path), 'walk', shards=1, shard_size=100, seed=1, processes=1))
+    with pytest.raises(ValueError):
+        list(dataset.generate(str(tmp_path), 'walk', shards=1, shard_size=100, seed=2, processes=1))
+
+
+def test_failed_shard_write_leaves_no_temporary_file(tmp_path, monkeypatch):
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(dataset.os, 'replace', fail)
+    with pytest.raises(OSError, match="disk full"):
+        dataset.write_shard(str(tmp_path), 'uniform', 0, 100, seed=0)
+    assert list(tmp_path.iterdir()) == []
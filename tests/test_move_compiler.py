@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+import cube_state
+from move_compiler import Algorithm, compile_algorithm
+
+
+@pytest.mark.parametrize('notation', ["R R'", "R L R' L'", "R U U' R'", "R4", "x x'", "M M'"])
+def test_cancelling_sequences_compile_to_nothing(notation):
+    alg = compile_algorithm(notation)
+    assert alg.moves == []
+    np.testing.assert_array_equal(alg.permutation, np.arange(54))
+
+
+@pytest.mark.parametrize('notation, simplified', [
+    ("R R", ['R2']),
+    ("R R R", ["R'"]),
+    ("U R R' U", ['U2']),
+    ("R L R", ['R2', 'L']),
+])
+def test_same_axis_runs_merge(notation, simplified):
+    assert compile_algorithm(notation).moves == simplified
+
+
+def test_repeated_group_is_identity_permutation():
+    alg = compile_algorithm("(R U R' U')6")
+    assert len(alg.moves) == 24
+    np.testing.assert_array_equal(alg.permutation, np.arange(54))
+    assert alg == compile_algorithm("")
+
+
+def test_permutation_matches_face_turns(scrambles):
+    for moves in scrambles:
+        alg = compile_algorithm(cube_state.format_moves(moves))
+        np.testing.assert_array_equal(alg.apply(cube_state.solved_state()),
+                                      cube_state.apply_moves(cube_state.solved_state(), moves))
+        np.testing.assert_array_equal(alg.permutation, cube_state.compose_moves(alg.face_moves))
+
+
+def test_inverse_power_and_order():
+    alg = compile_algorithm("R U R' U'")
+    assert alg.order == 6
+    assert alg.then(alg.inverse()).moves == []
+    assert alg.power(6) == Algorithm.from_permutation(np.arange(54))
+    assert alg.power(-1) == alg.inverse()
+    assert compile_algorithm("R U R' U' R' F R2 U' R' U' R U R' F'").order == 2
+
+
+def test_slice_moves_carry_centers():
+    alg = compile_algorithm("M")
+    state = alg.apply(cube_state.solved_state())
+    assert (state[4::9] != np.arange(6)).any()
+    assert compile_algorithm("M'") == alg.inverse()
+
+
+def test_bad_notation_raises_value_error():
+    with pytest.raises(ValueError):
+        compile_algorithm("R Q")
+    with pytest.raises(ValueError):
+        compile_algorithm("(R U")
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+import cube_state
+from move_history import MoveHistory
+
+
+def states_along(moves):
+    """State after each prefix of ``moves``, from 0 to len(moves) moves"""
+    states = [cube_state.solved_state()]
+    for move in moves:
+        states.append(cube_state.apply_move(states[-1], move))
+    return states
+
+
+def test_undo_and_redo_step_one_ply():
+    moves = cube_state.parse_moves("R U R' U' F2")
+    expected = states_along(moves)
+    history = MoveHistory()
+    history.extend(moves)
+    np.testing.assert_array_equal(history.state, expected[5])
+    assert history.undo() == cube_state.MOVE_INDEX['F2']
+    np.testing.assert_array_equal(history.state, expected[4])
+    assert history.undo() == cube_state.MOVE_INDEX['U']
+    assert history.redo() == cube_state.MOVE_INDEX["U'"]
+    np.testing.assert_array_equal(history.state, expected[4])
+    assert history.redo() == cube_state.MOVE_INDEX['F2']
+    assert history.redo() is None and not history.can_redo
+
+
+def test_undo_at_start_returns_none():
+    history = MoveHistory()
+    assert history.undo() is None and not history.can_undo
+
+
+def test_recording_after_undo_drops_redo_tail():
+    history = MoveHistory(interval=4)
+    history.extend(range(10))
+    history.seek(3)
+    history.record(17)
+    assert len(history) == 4 and history.moves() == [0, 1, 2, 17]
+    np.testing.assert_array_equal(history.state, states_along([0, 1, 2, 17])[-1])
+    # Checkpoints past the cut were dropped too
+    history.extend([5] * 6)
+    np.testing.assert_array_equal(history.seek(10), states_along([0, 1, 2, 17] + [5] * 6)[-1])
+
+
+@pytest.mark.parametrize('interval', [1, 7, 64])
+def test_seek_matches_replay(rng, interval):
+    moves = rng.integers(18, size=500).tolist()
+    expected = states_along(moves)
+    history = MoveHistory(interval=interval)
+    for start in range(0, len(moves), 37):  # several extend calls, not aligned to the interval
+        history.extend(moves[start:start + 37])
+    for ply in [0, 499, 1, 63, 64, 65, 250, 128, 500, 3]:
+        np.testing.assert_array_equal(history.seek(ply), expected[ply])
+        assert history.position == ply
+    history.seek(200)
+    for ply in range(199, 150, -1):
+        history.undo()
+        np.testing.assert_array_equal(history.state, expected[ply])
+
+
+def test_seek_out_of_range_raises():
+    history = MoveHistory()
+    history.extend([0, 1])
+    with pytest.raises(IndexError):
+        history.seek(3)
+    with pytest.raises(ValueError):
+        history.extend([18])
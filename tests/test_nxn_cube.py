@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+import cube_state
+from nxn_cube import NxNCube
+
+
+def test_three_by_three_matches_cube_state(scrambles):
+    cube = NxNCube(3)
+    cube.apply_moves(scrambles[0])
+    np.testing.assert_array_equal(cube.facelets, cube_state.apply_moves(cube_state.solved_state(), scrambles[0]))
+
+
+@pytest.mark.parametrize('n, depth', [(1, 0), (3, 0), (3, 1), (4, 1), (4, 3)])
+def test_layer_indices_are_the_stickers_a_turn_moves(n, depth):
+    cube = NxNCube(n)
+    # Distinct labels, so every moved sticker changes its slot
+    cube.faces = np.arange(6 * n * n).reshape(6, n, n).astype(np.uint8)
+    for face in range(6):
+        before = cube.facelets.copy()
+        cube.turn(face, depth)
+        moved = np.flatnonzero(cube.facelets != before)
+        cube.turn(face, depth, -1)
+        layer = cube.layer_indices(face, depth)
+        # Centers of odd faces stay put, so they may be missing from ``moved``
+        assert set(moved) <= set(layer) and len(layer) - len(moved) <= 2
+    with pytest.raises(ValueError):
+        cube.layer_indices(0, n)
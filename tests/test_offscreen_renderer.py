@@ -0,0 +1,47 @@
+import struct
+import zlib
+
+import numpy as np
+
+import cube_state
+from offscreen_renderer import OffscreenRenderer, encode_png
+
+
+def test_png_encodes_the_image():
+    image = np.random.default_rng(0).integers(256, size=(5, 7, 4), dtype=np.uint8)
+    data = encode_png(image)
+    assert data[:8] == b'\x89PNG\r\n\x1a\n'
+    width, height = struct.unpack('>II', data[16:24])
+    assert (width, height) == (7, 5)
+    # One IDAT chunk: filter byte 0 before every row
+    length = struct.unpack('>I', data[33:37])[0]
+    raw = zlib.decompress(data[41:41 + length])
+    np.testing.assert_array_equal(np.frombuffer(raw, np.uint8).reshape(5, 29)[:, 1:].reshape(5, 7, 4), image)
+
+
+def test_batch_render_matches_single_renders(states):
+    renderer = OffscreenRenderer(size=48)
+    images = renderer.render(states[:4])
+    assert images.shape == (4, 48, 48, 4) and images.dtype == np.uint8
+    for image, state in zip(images, states):
+        np.testing.assert_array_equal(image, renderer.render(state))
+
+
+def test_net_view_shows_each_face_color():
+    renderer = OffscreenRenderer(size=120, view='net', antialias=1)
+    solved = renderer.render(cube_state.solved_state())
+    turned = renderer.render(cube_state.apply_move(cube_state.solved_state(), 0))
+    assert len(np.unique(solved.reshape(-1, 4), axis=0)) >= 7  # six faces plus background or body
+    assert (solved != turned).any()
+
+
+def test_export_writes_one_file_per_state(tmp_path, states):
+    paths = OffscreenRenderer(size=24).export(states[:3], str(tmp_path), chunk=2)
+    assert [p.rsplit('/', 1)[1] for p in paths] == ['cube-000000.png', 'cube-000001.png', 'cube-000002.png']
+
+
+def test_high_antialias_does_not_overflow():
+    # 17 x 17 samples of 255 no longer fit a uint16 sum
+    renderer = OffscreenRenderer(size=12, antialias=17, background=(1, 1, 1, 1))
+    image = renderer.render(cube_state.solved_state())
+    assert (image[..., 3] == 255).all()
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+import cube_state
+import scrambler
+
+
+def assert_filtered(moves):
+    """No face turned twice in a row, opposite faces only in U/R/F-before-D/L/B order"""
+    faces = np.asarray(moves) // 3
+    first, second = faces[..., :-1], faces[..., 1:]
+    assert not (first == second).any()
+    assert not (second == first - 3).any()
+
+
+def test_random_moves_are_filtered_and_seeded():
+    moves = scrambler.random_moves(2000, 25, seed=4)
+    assert moves.shape == (2000, 25) and moves.min() >= 0 and moves.max() < 18
+    assert_filtered(moves)
+    np.testing.assert_array_equal(moves, scrambler.random_moves(2000, 25, seed=4))
+    expected = [cube_state.format_moves(m) for m in scrambler.random_moves(3, 25, seed=4)]
+    assert scrambler.random_move_scrambles(3, seed=4) == expected
+
+
+def test_inverse_undoes_a_sequence(scrambles):
+    for moves in scrambles:
+        state = cube_state.apply_moves(cube_state.solved_state(), moves)
+        assert cube_state.is_solved(cube_state.apply_moves(state, scrambler.inverse(moves)))
+
+
+def test_random_state_scrambles_reach_the_drawn_states():
+    moves = scrambler.random_state_moves(4, seed=7)
+    states = scrambler.random_states(4, seed=7)
+    assert len(moves) == 4
+    for sequence, state in zip(moves, states):
+        assert scrambler.MIN_DISTANCE <= len(sequence) <= 21
+        assert not (np.diff(np.asarray(sequence) // 3) == 0).any()
+        np.testing.assert_array_equal(cube_state.apply_moves(cube_state.solved_state(), sequence), state)
+
+
+def test_unknown_mode_raises():
+    with pytest.raises(ValueError):
+        scrambler.scrambles(1, mode='random-walk')
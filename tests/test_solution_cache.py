@@ -0,0 +1,41 @@
+import cube_state
+import cube_symmetry
+from solution_cache import SolutionCache
+
+
+def test_symmetric_states_share_an_entry(scrambles):
+    calls = []
+
+    def solver(state, max_length, timeout):
+        calls.append(state)
+        return cube_state.INVERSE_MOVE[moves[::-1]].tolist()
+
+    moves = scrambles[0]
+    state = cube_state.apply_moves(cube_state.solved_state(), moves)
+    cache = SolutionCache(solver=solver)
+    cache.solve(state, max_length=30)
+    for sym in (1, 17, 40):
+        image = cube_symmetry.transform(state, sym)
+        solution = cache.solve(image, max_length=30)
+        assert cube_state.is_solved(cube_state.apply_moves(image, solution))
+    assert len(calls) == 1 and cache.hits == 3
+
+
+def test_lru_eviction_and_max_length(scrambles):
+    cache = SolutionCache(maxsize=2)
+    states = [cube_state.apply_moves(cube_state.solved_state(), m) for m in scrambles[:3]]
+    for moves, state in zip(scrambles, states):
+        cache.put(state, cube_state.INVERSE_MOVE[moves[::-1]].tolist())
+    assert len(cache) == 2 and states[0] not in cache and states[2] in cache
+    assert cache.get(states[2], max_length=29) is None
+    assert len(cache.get(states[2], max_length=30)) == 30
+
+
+def test_facelet_strings_and_cube_states(scrambles):
+    moves = scrambles[0]
+    state = cube_state.apply_moves(cube_state.solved_state(), moves)
+    cache = SolutionCache(solver=lambda *args: cube_state.INVERSE_MOVE[moves[::-1]].tolist())
+    solution = cache.solve(cube_state.to_facelet_string(state), max_length=30)
+    assert cube_state.is_solved(cube_state.apply_moves(state, solution))
+    assert cube_state.CubeState(state) in cache
+    assert cache.solve(cube_state.CubeState(state), max_length=30) == solution and cache.hits == 1
@@ -0,0 +1,122 @@
+import asyncio
+import socket
+import time
+
+import pytest
+
+import cube_state
+import move_compiler
+from scrambler import random_states
+from solve_server import SolveClient, SolveServer
+
+
+def run_with_server(tmp_path, test, **options):
+    """Start a one-process server on a Unix socket, run ``test(server, client)`` and shut down"""
+    async def main():
+        server = SolveServer(processes=1, **options)
+        path = str(tmp_path / 'cube.sock')
+        await server.start(path)
+        try:
+            async with await SolveClient.connect(path) as client:
+                return await test(server, client)
+        finally:
+            await server.close()
+    return asyncio.run(main())
+
+
+def solves(scramble, solution):
+    state = move_compiler.compile_algorithm(scramble).apply(cube_state.solved_state())
+    return cube_state.is_solved(cube_state.apply_moves(state, cube_state.parse_moves(solution)))
+
+
+def test_solve_apply_and_key(tmp_path):
+    async def test(server, client):
+        solved = await client.solve(scramble="R U R' U'")
+        again = await client.solve(scramble="R U R' U'")
+        applied = await client.apply("(R U R' U')6", scramble="")
+        keys = await asyncio.gather(client.key(scramble="R"), client.key(scramble="U'"), client.key(scramble="R U"))
+        assert solves("R U R' U'", solved['solution']) and not solved['cached']
+        assert again['cached'] and again['solution'] == solved['solution']
+        assert applied['solved'] and applied['facelets'] == cube_state.to_facelet_string(cube_state.solved_state())
+        assert keys[0]['key'] == keys[1]['key'] != keys[2]['key']
+        assert (await client.request('ping')) == {'id': 7}
+
+    run_with_server(tmp_path, test)
+
+
+def test_bad_request_fails_alone_in_its_batch(tmp_path):
+    async def test(server, client):
+        requests = [
+            ('solve', {'scramble': "R U"}),
+            ('solve', {'scramble': 7}),
+            ('apply', {'scramble': "R", 'moves': "R'"}),
+            ('apply', {'moves': 5}),
+            ('key', {'facelets': ['U'] * 54}),
+            ('solve', {'scramble': "F2 D", 'max_length': "21"}),
+            ('solve', {'scramble': "F2 D", 'timeout': "soon"}),
+            ('solve', {'scramble': "F2 D"}),
+            ('key', {'scramble': "L"}),
+            ('solve', {'facelets': "U" * 54}),
+        ]
+        responses = await asyncio.gather(*(client.request(op, **fields) for op, fields in requests))
+        assert server.stats()['batches'] == 1
+        return responses
+
+    responses = run_with_server(tmp_path, test, batch_window=0.2)
+    failed = [i for i, response in enumerate(responses) if 'error' in response]
+    assert failed == [1, 3, 4, 5, 6, 9]
+    assert solves("R U", responses[0]['solution'])
+    assert responses[2]['solved']
+    assert solves("F2 D", responses[7]['solution'])
+    assert 'key' in responses[8]
+    assert "'scramble' must be a string" in responses[1]['error']
+    assert "'max_length' must be an integer" in responses[5]['error']
+
+
+def test_unknown_op_and_invalid_json(tmp_path):
+    async def test(server, client):
+        response = await client.request('rotate', scramble="R")
+        assert 'Unknown op' in response['error']
+        future = server.submit(b'[1, 2]')
+        assert 'Invalid request' in (await future)['error']
+
+    run_with_server(tmp_path, test)
+
+
+def test_solve_limits_are_clamped(tmp_path):
+    state = cube_state.to_facelet_string(random_states(1, seed=3)[0])
+
+    async def test(server, client):
+        start = time.perf_counter()
+        # Unreachable without a timeout: the server's max_timeout still ends the search
+        hard = await client.solve(facelets=state, max_length=15, timeout=None)
+        elapsed = time.perf_counter() - start
+        short = await client.solve(facelets=state, max_length=-5)
+        long = await client.solve(scramble="R U", max_length=1000)
+        zero = await client.solve(scramble="R U", timeout=0)
+        negative = await client.solve(scramble="R U", timeout=-1.5)
+        return hard, elapsed, short, long, zero, negative
+
+    hard, elapsed, short, long, zero, negative = run_with_server(tmp_path, test, max_timeout=0.5)
+    assert 'solution' in hard and elapsed < 5
+    assert 'solution' in short and 'solution' in long
+    assert "'timeout' must be positive" in zero['error']
+    assert "'timeout' must be positive" in negative['error']
+
+
+def test_max_timeout_must_be_positive():
+    with pytest.raises(ValueError):
+        SolveServer(max_timeout=0)
+
+
+def test_start_replaces_only_a_stale_socket(tmp_path):
+    path = tmp_path / 'cube.sock'
+    stale = socket.socket(socket.AF_UNIX)
+    stale.bind(str(path))
+    stale.close()
+    assert run_with_server(tmp_path, lambda server, client: client.request('ping')) == {'id': 1}
+
+    path.write_text('not a socket')
+    with pytest.raises(FileExistsError):
+        asyncio.run(SolveServer(processes=1).start(str(path)))
+    assert path.read_text() == 'not a socket'
@@ -0,0 +1,110 @@
+import time
+
+import numpy as np
+import pytest
+
+import cube_state
+import move_compiler
+import optimal_solver
+import table_cache
+import two_phase
+
+
+def solves(state, moves):
+    return cube_state.is_solved(cube_state.apply_moves(state, moves))
+
+
+@pytest.fixture(scope='module')
+def solver():
+    return two_phase.get_solver()
+
+
+def test_two_phase_solves_short_scrambles(solver, rng):
+    for length in range(0, 8):
+        moves = rng.integers(18, size=length).tolist()
+        state = cube_state.apply_moves(cube_state.solved_state(), moves)
+        solution = solver.solve(state)
+        assert solves(state, solution)
+        assert len(solution) <= 21
+
+
+def test_two_phase_respects_max_length(solver, states):
+    for state in states[:5]:
+        solution = solver.solve(state, max_length=21)
+        assert solves(state, solution) and len(solution) <= 21
+
+
+def test_two_phase_accepts_strings_and_slice_moves(solver):
+    state = cube_state.solved_state()[move_compiler.compile_algorithm("M2 E2 S2 R U").permutation]
+    assert solves(cube_state.normalize_centers(state), solver.solve(state))
+    assert solver.solve(cube_state.to_facelet_string(cube_state.solved_state())) == []
+
+
+def test_unreachable_max_length_without_timeout_terminates(solver, states):
+    state = states[0]
+    start = time.perf_counter()
+    solution = solver.solve(state, max_length=1, timeout=None)
+    assert time.perf_counter() - start < 10
+    assert solves(state, solution)
+
+
+def test_two_phase_rejects_unreachable_states(solver):
+    state = cube_state.solved_state()
+    state[[7, 19]] = state[[19, 7]]
+    with pytest.raises(ValueError):
+        solver.solve(state)
+    with pytest.raises(ValueError):
+        solver.solve(np.zeros(54, dtype=np.uint8))
+
+
+@pytest.fixture(scope='module')
+def optimal():
+    path = table_cache.table_path('optimal', optimal_solver.TABLE_VERSION)
+    try:
+        # Building them takes minutes, so only test against a cache that already exists
+        table_cache.map_tables(path, 'optimal', optimal_solver.TABLE_VERSION, optimal_solver.TABLE_LAYOUT)
+    except table_cache.TableFileError:
+        pytest.skip("optimal pattern databases not built; run python table_cache.py --optimal")
+    with optimal_solver.OptimalSolver() as solver:
+        yield solver
+
+
+@pytest.mark.parametrize('notation, distance', [
+    ("", 0), ("R", 1), ("R U", 2), ("R U R' U'", 4), ("R U R' U' R' F R F'", 8), ("R L U2 F' B D2", 6),
+])
+def test_optimal_finds_shortest_solution(optimal, notation, distance):
+    state = cube_state.apply_moves(cube_state.solved_state(), cube_state.parse_moves(notation))
+    solution = optimal.solve(state)
+    assert solves(state, solution)
+    assert len(solution) == distance
+
+
+@pytest.fixture(scope='module')
+def unit_tables():
+    """The optimal solver's tables with stand-in pattern databases: 0 at the goal, 1 everywhere else
+
+    That bound is admissible, so the search stays exact, just slow past a few
+    moves; unlike the real databases these take no time to build.
+    """
+    tables = dict(two_phase.load_tables())
+    tables['edge6_move'] = optimal_solver.build_table('edge6_move')
+    solved = np.arange(12)
+    goals = {'corner_pdb': 0}
+    for name, edges in optimal_solver.EDGE_GROUPS.items():
+        goals[name] = int(optimal_solver.edge6_coord(solved, np.zeros(12, dtype=np.intp), edges))
+    for name, goal in goals.items():
+        pdb = np.full(optimal_solver.TABLE_LAYOUT[name][0], 0x11, dtype=np.uint8)
+        pdb[goal >> 1] &= 0xf0 if goal % 2 == 0 else 0x0f
+        tables[name] = pdb
+    return tables
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_optimal_search_with_stand_in_tables(unit_tables, processes):
+    # The two-process solver splits bound 4 (> SPLIT_DEPTH) across workers that get these tables
+    with optimal_solver.OptimalSolver(unit_tables, processes=processes) as solver:
+        for notation, distance in [("", 0), ("R", 1), ("R U2", 2), ("R U R' U'", 4)]:
+            state = cube_state.apply_moves(cube_state.solved_state(), cube_state.parse_moves(notation))
+            solution = solver.solve(state)
+            assert solves(state, solution)
+            assert len(solution) == distance
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+import cube_state
+import state_codec
+from cube_batch import CubeBatch
+
+
+def random_states(count, seed):
+    moves = np.random.default_rng(seed).integers(18, size=(count, 40))
+    return CubeBatch.solved(count).apply_sequences(moves).states
+
+
+def test_encode_decode_round_trip():
+    states = random_states(1000, seed=5)
+    records = state_codec.encode(states)
+    assert records.dtype == state_codec.RECORD and records.shape == (1000,)
+    np.testing.assert_array_equal(state_codec.decode(records), states)
+
+
+def test_bytes_round_trip(states):
+    for state in states:
+        data = state_codec.to_bytes(state)
+        assert len(data) == 9
+        np.testing.assert_array_equal(state_codec.from_bytes(data), state)
+    np.testing.assert_array_equal(state_codec.from_bytes(state_codec.encode(states).tobytes()), states)
+
+
+def test_equal_records_mean_equal_states():
+    solved = cube_state.solved_state()
+    assert state_codec.to_bytes(solved) == state_codec.to_bytes(cube_state.apply_moves(solved, [0, 2]))
+    assert state_codec.to_bytes(solved) != state_codec.to_bytes(cube_state.apply_move(solved, 0))
+
+
+def test_unreachable_state_raises():
+    state = cube_state.solved_state()
+    state[[7, 19]] = state[[19, 7]]  # the UF edge flipped in place
+    with pytest.raises(ValueError):
+        state_codec.encode(state)
+
+
+def test_state_file_round_trip(tmp_path):
+    states = random_states(300, seed=9)
+    path = str(tmp_path / 'corpus.states')
+    with state_codec.StateWriter(path, metadata={'source': 'test'}) as out:
+        out.write(states[:100])
+        out.write(states[100:])
+    header = state_codec.read_header(path)
+    assert header['count'] == 300 and header['metadata'] == {'source': 'test'}
+    np.testing.assert_array_equal(state_codec.decode(state_codec.open_states(path)[50:70]), states[50:70])
+    np.testing.assert_array_equal(np.concatenate(list(state_codec.iter_states(path, chunk=64))), states)
+
+
+def test_truncated_state_file_is_rejected(tmp_path):
+    path = str(tmp_path / 'corpus.states')
+    state_codec.write_states(path, random_states(10, seed=1))
+    with open(path, 'r+b') as f:
+        f.truncate(state_codec.DATA_OFFSET + 5 * 9)
+    with pytest.raises(state_codec.StateFileError):
+        state_codec.open_states(path)
@@ -0,0 +1,38 @@
+import os
+import stat
+
+import numpy as np
+import pytest
+
+import table_cache
+
+LAYOUT = {'a': ((3, 4), np.int8), 'b': ((5,), np.uint32)}
+
+
+def write(path):
+    tables = {'a': np.arange(12, dtype=np.int8).reshape(3, 4), 'b': np.arange(5, dtype=np.uint32)}
+    table_cache.write_tables(str(path), 'test', 1, LAYOUT, tables)
+    return tables
+
+
+def test_round_trip_and_permissions(tmp_path):
+    path = tmp_path / 'test.tbl'
+    tables = write(path)
+    mapped = table_cache.map_tables(str(path), 'test', 1, LAYOUT, verify=True)
+    for name in LAYOUT:
+        np.testing.assert_array_equal(mapped[name], tables[name])
+    umask = os.umask(0o022)
+    os.umask(umask)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644 & ~umask
+    assert os.listdir(tmp_path) == ['test.tbl']
+
+
+def test_mismatched_or_damaged_files_are_rejected(tmp_path):
+    path = tmp_path / 'test.tbl'
+    write(path)
+    with pytest.raises(table_cache.TableFileError):
+        table_cache.map_tables(str(path), 'test', 2, LAYOUT)
+    with open(path, 'ab') as f:
+        f.write(b'\0')
+    with pytest.raises(table_cache.TableFileError):
+        table_cache.map_tables(str(path), 'test', 1, LAYOUT)
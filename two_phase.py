@@ -0,0 +1,399 @@
+"""Kociemba two-phase solver for the 3x3x3 cube.
+
+Phase 1 brings the cube into the subgroup G1 = <U, D, R2, L2, F2, B2>, where
+all corners and edges are oriented and the four FR/FL/BL/BR edges sit in the
+middle slice. Phase 2 solves the rest using only G1 moves. Both phases are
+IDA* searches over small coordinates (see cubie_cube) with precomputed move
+tables and BFS pruning tables:
+
+    phase 1: twist x slice, flip x slice, twist x flip
+    phase 2: corner perm x slice perm, UD edge perm x slice perm
+
+The tables take several seconds to build and about 11 MB; they are generated
+once, cached on disk and memory-mapped by every later process (see
+table_cache).
+
+    >>> from two_phase import solve
+    >>> from cube_state import CubeState, format_moves
+    >>> cube = CubeState(); cube.scramble(30)
+    >>> format_moves(solve(cube.facelets))          # doctest: +SKIP
+    "R2 D' B U2 L' D' F2 R ..."
+"""
+import time
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+import cube_state
+import cubie_cube
+import metrics
+import table_cache
+from cubie_cube import (N_CORNER_PERM, N_FLIP, N_SLICE, N_SLICE_PERM, N_TWIST,
+                        N_UD_EDGE_PERM)
+
+# Moves that keep a cube inside G1, as indices into cube_state.MOVE_TABLE:
+# U U2 U' R2 F2 D D2 D' L2 B2
+PHASE2_MOVES = [0, 1, 2, 4, 7, 9, 10, 11, 13, 16]
+SLICE_SOLVED = int(cubie_cube.slice_coord(np.arange(12)))
+
+# Layout of every table: name -> (shape, dtype); bump TABLE_VERSION when it changes
+TABLE_LAYOUT = {
+    'twist_move': ((N_TWIST, 18), np.uint16),
+    'flip_move': ((N_FLIP, 18), np.uint16),
+    'slice_move': ((N_SLICE, 18), np.uint16),
+    'corner_perm_move': ((N_CORNER_PERM, 18), np.uint16),
+    'ud_edge_perm_move': ((N_UD_EDGE_PERM, len(PHASE2_MOVES)), np.uint16),
+    'slice_perm_move': ((N_SLICE_PERM, len(PHASE2_MOVES)), np.uint16),
+    'twist_slice_prune': ((N_TWIST * N_SLICE,), np.uint8),
+    'flip_slice_prune': ((N_FLIP * N_SLICE,), np.uint8),
+    'corner_slice_prune': ((N_CORNER_PERM * N_SLICE_PERM,), np.uint8),
+    'edge_slice_prune': ((N_UD_EDGE_PERM * N_SLICE_PERM,), np.uint8),
+    'twist_flip_prune': ((N_TWIST * N_FLIP,), np.uint8),
+}
+TABLE_VERSION = 1
+# Build order: pruning tables are generated from the move tables
+TABLE_STAGES = (
+    ('twist_move', 'flip_move', 'slice_move', 'corner_perm_move', 'ud_edge_perm_move', 'slice_perm_move'),
+    ('twist_slice_prune', 'flip_slice_prune', 'twist_flip_prune', 'corner_slice_prune', 'edge_slice_prune'),
+)
+
+
+# -- table generation -------------------------------------------------------
+
+def _twist_move_table() -> np.ndarray:
+    co = cubie_cube.twist_to_co(np.arange(N_TWIST))
+    columns = [(co[:, cubie_cube.MOVE_CP[m]] + cubie_cube.MOVE_CO[m]) % 3 for m in range(18)]
+    return np.stack([cubie_cube.twist(c) for c in columns], axis=1).astype(np.uint16)
+
+
+def _flip_move_table() -> np.ndarray:
+    eo = cubie_cube.flip_to_eo(np.arange(N_FLIP))
+    columns = [(eo[:, cubie_cube.MOVE_EP[m]] + cubie_cube.MOVE_EO[m]) % 2 for m in range(18)]
+    return np.stack([cubie_cube.flip(c) for c in columns], axis=1).astype(np.uint16)
+
+
+def _slice_move_table() -> np.ndarray:
+    # Representative cube for each slice coordinate: slice edges 8..11 at the
+    # chosen positions, U/D edges 0..7 in the others
+    mask = np.zeros((N_SLICE, 12), dtype=bool)
+    mask[np.arange(N_SLICE)[:, None], cubie_cube.SLICE_COMBINATIONS] = True
+    ep = np.zeros((N_SLICE, 12), dtype=np.intp)
+    ep[mask] = np.tile(np.arange(8, 12), N_SLICE)
+    ep[~mask] = np.tile(np.arange(8), N_SLICE)
+    return np.stack([cubie_cube.slice_coord(ep[:, cubie_cube.MOVE_EP[m]]) for m in range(18)], axis=1).astype(np.uint16)
+
+
+def _corner_perm_move_table() -> np.ndarray:
+    cp = cubie_cube.perm_unrank(np.arange(N_CORNER_PERM), 8)
+    return np.stack([cubie_cube.corner_perm(cp[:, cubie_cube.MOVE_CP[m]]) for m in range(18)], axis=1).astype(np.uint16)
+
+
+def _ud_edge_perm_move_table() -> np.ndarray:
+    perm = cubie_cube.perm_unrank(np.arange(N_UD_EDGE_PERM), 8)
+    ep = np.concatenate([perm, np.tile(np.arange(8, 12), (N_UD_EDGE_PERM, 1))], axis=1)
+    return np.stack([cubie_cube.ud_edge_perm(ep[:, cubie_cube.MOVE_EP[m]]) for m in PHASE2_MOVES], axis=1).astype(np.uint16)
+
+
+def _slice_perm_move_table() -> np.ndarray:
+    perm = cubie_cube.perm_unrank(np.arange(N_SLICE_PERM), 4)
+    ep = np.concatenate([np.tile(np.arange(8), (N_SLICE_PERM, 1)), perm + 8], axis=1)
+    return np.stack([cubie_cube.slice_perm(ep[:, cubie_cube.MOVE_EP[m]]) for m in PHASE2_MOVES], axis=1).astype(np.uint16)
+
+
+def prune_table(move_a: np.ndarray, move_b: np.ndarray, goal: int) -> np.ndarray:
+    """Breadth-first distance to ``goal`` over the product coordinate a * len(move_b) + b
+
+    Each BFS level expands the whole frontier with all moves in one
+    vectorized step, so building a million-entry table takes well under a
+    second.
+    """
+    n_b = len(move_b)
+    dist = np.full(len(move_a) * n_b, 255, dtype=np.uint8)
+    dist[goal] = 0
+    frontier = np.array([goal], dtype=np.int64)
+    depth = 0
+    while frontier.size:
+        a, b = np.divmod(frontier, n_b)
+        neighbours = (move_a[a].astype(np.int64) * n_b + move_b[b]).ravel()
+        neighbours = np.unique(neighbours[dist[neighbours] == 255])
+        depth += 1
+        dist[neighbours] = depth
+        frontier = neighbours
+    return dist
+
+
+def build_table(name: str, tables: Optional[Dict[str, np.ndarray]] = None) -> np.ndarray:
+    """Build one table by name; pruning tables reuse move tables from ``tables``"""
+    tables = {} if tables is None else tables
+
+    def get(dep):
+        if dep not in tables:
+            tables[dep] = build_table(dep, tables)
+        return tables[dep]
+
+    builders = {
+        'twist_move': _twist_move_table,
+        'flip_move': _flip_move_table,
+        'slice_move': _slice_move_table,
+        'corner_perm_move': _corner_perm_move_table,
+        'ud_edge_perm_move': _ud_edge_perm_move_table,
+        'slice_perm_move': _slice_perm_move_table,
+    }
+    if name in builders:
+        return builders[name]()
+    if name == 'twist_slice_prune':
+        return prune_table(get('twist_move'), get('slice_move'), SLICE_SOLVED)
+    if name == 'flip_slice_prune':
+        return prune_table(get('flip_move'), get('slice_move'), SLICE_SOLVED)
+    if name == 'twist_flip_prune':
+        return prune_table(get('twist_move'), get('flip_move'), 0)
+    if name == 'corner_slice_prune':
+        return prune_table(get('corner_perm_move')[:, PHASE2_MOVES], get('slice_perm_move'), 0)
+    if name == 'edge_slice_prune':
+        return prune_table(get('ud_edge_perm_move'), get('slice_perm_move'), 0)
+    raise KeyError(f"Unknown table: {name}")
+
+
+def build_tables() -> Dict[str, np.ndarray]:
+    """Build every table in TABLE_LAYOUT in memory, in this process"""
+    tables: Dict[str, np.ndarray] = {}
+    for name in TABLE_LAYOUT:
+        if name not in tables:
+            tables[name] = build_table(name, tables)
+    return tables
+
+
+def load_tables(directory: Optional[str] = None, processes: Optional[int] = None,
+                rebuild: bool = False) -> Dict[str, np.ndarray]:
+    """Read-only memory-mapped tables from the on-disk cache, generating the file if needed"""
+    return table_cache.open_tables('two_phase', TABLE_VERSION, TABLE_LAYOUT, build_table, TABLE_STAGES,
+                                   directory, processes, rebuild)
+
+
+# -- search -----------------------------------------------------------------
+
+# Phase-1 frontiers are expanded depth-first in chunks of this many nodes,
+# which bounds memory no matter how deep the search goes
+CHUNK = 1 << 16
+# No phase-2 position needs more than 18 moves
+MAX_PHASE2_LENGTH = 18
+
+_FACE = np.arange(18) // 3
+# ALLOWED[last_face, move]: skip turning the same face twice in a row, and
+# only turn opposite faces in U/R/F-before-D/L/B order (they commute). Row 6
+# is "no previous move".
+ALLOWED = np.ones((7, 18), dtype=bool)
+for _last in range(6):
+    ALLOWED[_last] = ~((_FACE == _last) | (_FACE == _last - 3))
+ALLOWED_PHASE2 = ALLOWED[:, PHASE2_MOVES]
+IS_PHASE2_MOVE = np.isin(np.arange(18), PHASE2_MOVES)
+_PHASE2_MOVES = np.array(PHASE2_MOVES)
+
+
+class TwoPhaseSolver:
+    """Two-phase solver over a fixed set of tables
+
+    The searches are level-synchronous IDA*: for a given depth bound, every
+    node of a level is expanded with every move in one numpy step and
+    children whose pruning-table distance exceeds the remaining depth are
+    dropped. Phase 2 starts from all phase-1 solutions of a depth at once and
+    merges duplicate positions, so a solve costs tens of array operations per
+    level instead of millions of Python calls.
+    """
+    def __init__(self, tables: Optional[Dict[str, np.ndarray]] = None):
+        self.tables = load_tables() if tables is None else tables
+
+    def solve(self, state: Union[np.ndarray, str, 'cube_state.CubeState'], max_length: int = 21,
+              timeout: Optional[float] = None) -> List[int]:
+        """Moves (cube_state.MOVE_TABLE indices) that solve ``state``
+
+        The search keeps looking for shorter solutions until it finds one of
+        at most ``max_length`` moves or ``timeout`` seconds have passed, and
+        then returns the shortest found so far. Lower ``max_length`` gives
+        shorter solutions, a short ``timeout`` caps latency; the first
+        solution is always returned even if it takes longer than the timeout.
+        The search also stops once the phase-1 depth alone exceeds
+        ``max_length``, since no longer phase-1 path can meet it, so an
+        unreachable ``max_length`` without a timeout still terminates.
+        Raises ValueError for states that are not reachable by turning.
+        """
+        with metrics.histogram('solve_time').time():
+            search = _Search(self.tables, _facelets(state), max_length, timeout)
+            solution = search.run()
+        metrics.counter('solver_nodes').inc(search.nodes)
+        return solution
+
+
+def _facelets(state) -> np.ndarray:
+    if isinstance(state, str):
+        state = cube_state.from_facelet_string(state)
+    elif isinstance(state, cube_state.CubeState):
+        state = state.facelets
+    # Slice and rotation moves carry the centers along; solve in the fixed-center frame
+    return cube_state.normalize_centers(np.asarray(state, dtype=np.uint8))
+
+
+class _Search:
+    """One solve: the start position, best solution so far and the deadline"""
+    def __init__(self, tables: Dict[str, np.ndarray], facelets: np.ndarray, max_length: int,
+                 timeout: Optional[float]):
+        if facelets.shape != (54,) or np.bincount(facelets, minlength=6).tolist() != [9] * 6:
+            raise ValueError("Each color must appear on exactly 9 of the 54 facelets")
+        cp, co, ep, eo = cubie_cube.from_facelets(facelets)
+        cubie_cube.verify(cp, co, ep, eo)
+        self.t = tables
+        self.cp, self.ep = cp, ep
+        self.twist = cubie_cube.twist(co)
+        self.flip = cubie_cube.flip(eo)
+        self.slice = cubie_cube.slice_coord(ep)
+        self.max_length = max_length
+        self.deadline = None if timeout is None else time.perf_counter() + timeout
+        self.best: Optional[List[int]] = None
+        self.depth = 0
+        self.nodes = 0
+        self.done = False
+
+    def run(self) -> List[int]:
+        self.depth = int(self.phase1_distance(self.twist, self.flip, self.slice)[0])
+        while not self.done and (self.best is None or self.depth < len(self.best)):
+            start = np.zeros((1, 0), dtype=np.intp)
+            for paths in self.phase1(self.twist, self.flip, self.slice, start, self.depth):
+                self.phase2(paths)
+                if self.done:
+                    break
+            self.depth += 1
+            self.check_done()
+        return self.best
+
+    def check_done(self):
+        if self.best is not None:
+            if len(self.best) <= self.max_length:
+                self.done = True
+            elif self.depth > self.max_length:
+                # Every solution from here on is at least depth moves long
+                self.done = True
+            elif self.deadline is not None and time.perf_counter() > self.deadline:
+                self.done = True
+
+    def phase1_distance(self, twist, flip, slc) -> np.ndarray:
+        """Admissible lower bound on the moves left to reach G1"""
+        t = self.t
+        return np.maximum.reduce([
+            t['twist_slice_prune'][twist * N_SLICE + slc],
+            t['flip_slice_prune'][flip * N_SLICE + slc],
+            t['twist_flip_prune'][twist * N_FLIP + flip],
+        ])
+
+    def phase1(self, twist, flip, slc, paths: np.ndarray, depth: int) -> Iterator[np.ndarray]:
+        """Yield (n, depth) arrays of move sequences that reach G1 in exactly depth moves"""
+        done = paths.shape[1]
+        if done == depth:
+            yield paths
+            return
+        togo = depth - done
+        t = self.t
+        last_face = paths[:, -1] // 3 if done else np.full(len(paths), 6)
+        twist = t['twist_move'][twist].astype(np.int64)
+        flip = t['flip_move'][flip].astype(np.int64)
+        slc = t['slice_move'][slc].astype(np.int64)
+        keep = ALLOWED[last_face] & (self.phase1_distance(twist, flip, slc) < togo)
+        if togo == 1:
+            # A path ending in a G1 move was already tried one depth shorter
+            keep &= ~IS_PHASE2_MOVE
+        parent, move = np.nonzero(keep)
+        self.nodes += len(parent)
+        twist, flip, slc = twist[parent, move], flip[parent, move], slc[parent, move]
+        paths = np.concatenate([paths[parent], move[:, None]], axis=1)
+        for i in range(0, len(parent), CHUNK):
+            chunk = slice(i, i + CHUNK)
+            yield from self.phase1(twist[chunk], flip[chunk], slc[chunk], paths[chunk], depth)
+            self.check_done()
+            if self.done:
+                return
+
+    def phase2(self, paths: np.ndarray):
+        """Finish the phase-1 solutions in ``paths``, keeping the best total"""
+        t = self.t
+        depth = paths.shape[1]
+        cp = np.repeat(self.cp, len(paths), axis=0)
+        ep = np.repeat(self.ep, len(paths), axis=0)
+        for k in range(depth):
+            cp = np.take_along_axis(cp, cubie_cube.MOVE_CP[paths[:, k]], axis=1)
+            ep = np.take_along_axis(ep, cubie_cube.MOVE_EP[paths[:, k]], axis=1)
+        corner = cubie_cube.corner_perm(cp)
+        edge = cubie_cube.ud_edge_perm(ep)
+        slc = cubie_cube.slice_perm(ep)
+        # Different phase-1 paths often end in the same position
+        _, first = np.unique((corner * N_UD_EDGE_PERM + edge) * N_SLICE_PERM + slc, return_index=True)
+        paths, corner, edge, slc = paths[first], corner[first], edge[first], slc[first]
+        last_face = paths[:, -1] // 3 if depth else np.full(len(paths), 6)
+
+        limit = MAX_PHASE2_LENGTH if self.best is None else len(self.best) - 1 - depth
+        lowest = int(self.phase2_distance(corner, edge, slc).min())
+        for bound in range(lowest, limit + 1):
+            found = self.phase2_bounded(corner, edge, slc, last_face, bound)
+            if found is not None:
+                source, moves = found
+                self.best = paths[source].tolist() + moves
+                break
+            self.check_done()
+            if self.done:
+                break
+        self.check_done()
+
+    def phase2_distance(self, corner, edge, slc) -> np.ndarray:
+        """Admissible lower bound on the G1 moves left to solve"""
+        t = self.t
+        return np.maximum(t['corner_slice_prune'][corner * N_SLICE_PERM + slc],
+                          t['edge_slice_prune'][edge * N_SLICE_PERM + slc])
+
+    def phase2_bounded(self, corner, edge, slc, last_face, bound: int):
+        """Search at most ``bound`` G1 moves from all starts at once
+
+        Returns (start index, moves) for the first solved position, or None.
+        """
+        t = self.t
+        levels = []
+        for level in range(bound + 1):
+            solved = np.flatnonzero((corner == 0) & (edge == 0) & (slc == 0))
+            if len(solved):
+                index, moves = solved[0], []
+                for parent, move in reversed(levels):
+                    moves.append(int(move[index]))
+                    index = parent[index]
+                return int(index), moves[::-1]
+            if level == bound:
+                return None
+            togo = bound - level
+            corner = t['corner_perm_move'][corner][:, PHASE2_MOVES].astype(np.int64)
+            edge = t['ud_edge_perm_move'][edge].astype(np.int64)
+            slc = t['slice_perm_move'][slc].astype(np.int64)
+            keep = ALLOWED_PHASE2[last_face] & (self.phase2_distance(corner, edge, slc) < togo)
+            parent, j = np.nonzero(keep)
+            corner, edge, slc = corner[parent, j], edge[parent, j], slc[parent, j]
+            # Merge transpositions: keep one path to each distinct position
+            _, first = np.unique((corner * N_UD_EDGE_PERM + edge) * N_SLICE_PERM + slc, return_index=True)
+            parent, move = parent[first], _PHASE2_MOVES[j[first]]
+            corner, edge, slc = corner[first], edge[first], slc[first]
+            last_face = move // 3
+            levels.append((parent, move))
+            self.nodes += len(parent)
+            if not len(parent):
+                return None
+        return None
+
+
+_default_solver: Optional[TwoPhaseSolver] = None
+
+
+def get_solver() -> TwoPhaseSolver:
+    """Process-wide solver, mapping (or generating) the cached tables on first use"""
+    global _default_solver
+    if _default_solver is None:
+        _default_solver = TwoPhaseSolver()
+    return _default_solver
+
+
+def solve(state, max_length: int = 21, timeout: Optional[float] = None) -> List[int]:
+    """Solve with the process-wide solver; see TwoPhaseSolver.solve"""
+    return get_solver().solve(state, max_length, timeout)